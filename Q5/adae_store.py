@@ -0,0 +1,134 @@
+"""
+Columnar snapshot cache for the ADAE source CSV.
+The first load parses the CSV and writes an uncompressed Feather (Arrow IPC) file
+with low-cardinality text columns as categoricals; later loads read that file
+instead. Snapshots are keyed by the CSV's path, size and mtime, so editing or
+replacing the CSV triggers a rebuild.
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+import pandas as pd
+
+# Bump when the snapshot layout changes so stale files are ignored
+SNAPSHOT_FORMAT = 1
+
+# Text columns with fewer distinct values than this fraction of rows become categoricals
+CATEGORY_MAX_RATIO = 0.5
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow.feather  # noqa: F401  (only checks that pyarrow is installed)
+    except ImportError:
+        return False
+    return True
+
+
+def read_snapshot(path: str, zero_copy: bool = False) -> pd.DataFrame:
+    """
+    Memory-map a snapshot file and convert it to a DataFrame. With zero_copy the
+    columns stay Arrow-backed views of the mapped file (shared between processes)
+    instead of being copied into numpy/pandas memory.
+    """
+    from pyarrow import feather
+    table = feather.read_table(path, memory_map=True)
+    if zero_copy:
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def snapshot_key(csv_path: str, size: int, mtime_ns: int) -> str:
+    """Short digest identifying one state (path, size, mtime) of the CSV."""
+    key = f"{os.path.abspath(csv_path)}|{size}|{mtime_ns}|{SNAPSHOT_FORMAT}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def cache_dir_for(csv_path: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), ".cache")
+
+
+def snapshot_path(csv_path: str, cache_dir: Optional[str] = None) -> str:
+    """Snapshot file for the current state of csv_path (changes when the CSV does)."""
+    st = os.stat(csv_path)
+    digest = snapshot_key(csv_path, st.st_size, st.st_mtime_ns)
+    if cache_dir is None:
+        cache_dir = cache_dir_for(csv_path)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{stem}.{digest}.feather")
+
+
+def to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """Store repetitive text columns (AESEV, AESER, AESOC, ...) as categoricals."""
+    n = len(df)
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if series.nunique(dropna=True) < max(1, n * CATEGORY_MAX_RATIO):
+            df[col] = series.astype("category")
+    return df
+
+
+def _write_snapshot(df: pd.DataFrame, path: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write then rename so concurrent workers never read a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_feather(tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    # Drop snapshots of earlier versions of the same CSV
+    prefix = os.path.basename(path).split(".")[0] + "."
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(prefix) and name.endswith(".feather") and name != os.path.basename(path):
+            try:
+                os.unlink(os.path.join(os.path.dirname(path), name))
+            except OSError:
+                pass
+
+
+def load_adae(csv_path: str, cache_dir: Optional[str] = None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Load the ADAE CSV, via the columnar snapshot when it is current.
+    Falls back to a plain CSV parse when pyarrow is unavailable or the cache dir is read-only.
+    """
+    if not use_cache or not _has_pyarrow():
+        return pd.read_csv(csv_path)
+
+    path = snapshot_path(csv_path, cache_dir)
+    if os.path.exists(path):
+        try:
+            return read_snapshot(path)
+        except (OSError, ValueError):
+            pass  # truncated or corrupt snapshot: rebuild it below
+
+    df = to_columnar(pd.read_csv(csv_path))
+    try:
+        _write_snapshot(df, path)
+    except OSError:
+        pass
+    return df
+
+
+def append_rows(df: pd.DataFrame, tail: pd.DataFrame) -> pd.DataFrame:
+    """
+    New frame with tail's rows after df's. Categorical columns stay categorical
+    (tail values are added to the categories) instead of decaying to object.
+    """
+    columns = {}
+    for col in df.columns:
+        old, new = df[col], tail[col].reset_index(drop=True)
+        if isinstance(old.dtype, pd.CategoricalDtype):
+            if not pd.api.types.is_string_dtype(new):
+                new = new.map(str, na_action="ignore")
+            extra = pd.Index(new.dropna().unique()).difference(old.cat.categories)
+            if len(extra):
+                old = old.cat.add_categories(extra)
+            new = new.astype(old.dtype)
+        columns[col] = pd.concat([old, new], ignore_index=True)
+    return pd.DataFrame(columns)
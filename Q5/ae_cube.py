@@ -0,0 +1,184 @@
+"""
+Materialized AE summary cube over ACTARM x AESEV x AESOC x AEDECOD.
+For every subset of the dimensions (every roll-up) the cube stores, per group,
+the number of events and the number of distinct subjects. Distinct counts do not
+add up across groups, so roll-ups are computed from a (group, subject) -> events
+pair table rather than from finer roll-ups; appending rows only touches that
+pair table, never the full row table. Dimension values are stripped and
+upper-cased, as AEIndex keys are, so "Mild" and "MILD" are one group.
+Pairs and roll-ups are plain integer arrays (label codes and counts), so a saved
+cube can be memory-mapped and shared between processes like the AEIndex.
+"""
+
+import json
+import os
+from itertools import combinations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ["ACTARM", "AESEV", "AESOC", "AEDECOD"]
+
+# One roll-up: (label codes per group, one column per dimension; event counts; subject counts)
+Rollup = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _normalize(values: pd.Series) -> pd.Series:
+    """Stripped, upper-cased text; missing values stay missing."""
+    values = values.astype(object)  # categoricals cannot take the new spellings
+    return values.where(values.isna(), values.astype(str).str.strip().str.upper())
+
+
+def _extend_labels(labels: np.ndarray, values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Codes for normalized values against labels, appending unseen values; returns (labels, codes)."""
+    local, uniques = pd.factorize(_normalize(values), use_na_sentinel=False)
+    uniques = np.asarray(uniques, dtype=object)
+    known = pd.Index(labels).get_indexer(uniques) if len(labels) else np.full(len(uniques), -1)
+    fresh = known < 0
+    known[fresh] = len(labels) + np.arange(int(fresh.sum()))
+    return np.concatenate([labels, uniques[fresh]]), known[local]
+
+
+class AECube:
+
+    def __init__(self, dimensions: Sequence[str]):
+        self.dimensions = list(dimensions)
+        self.labels: Dict[str, np.ndarray] = {d: np.empty(0, dtype=object) for d in self.dimensions}
+        # Pair table columns: a label code per dimension, "_subject" ordinal, "events"
+        self.pairs: Dict[str, np.ndarray] = {
+            c: np.empty(0, dtype=np.int64) for c in self.dimensions + ["_subject", "events"]
+        }
+        self.rollups: Dict[Tuple[str, ...], Rollup] = {}
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, subject_codes: np.ndarray) -> "AECube":
+        """Cube over the CUBE_DIMENSIONS present in df; subject_codes gives each row's subject ordinal."""
+        cube = cls([d for d in CUBE_DIMENSIONS if d in df.columns])
+        return cube.extend(df, subject_codes)
+
+    @property
+    def n_pairs(self) -> int:
+        return len(self.pairs["events"])
+
+    @property
+    def nbytes(self) -> int:
+        n = sum(a.nbytes for a in self.pairs.values())
+        return n + sum(a.nbytes for rollup in self.rollups.values() for a in rollup)
+
+    def extend(self, rows: pd.DataFrame, subject_codes: np.ndarray) -> "AECube":
+        """New cube including rows (subject_codes must use the same ordinals as earlier rows)."""
+        new = AECube(self.dimensions)
+        codes = {}
+        for d in self.dimensions:
+            new.labels[d], codes[d] = _extend_labels(self.labels[d], rows[d])
+        keys = self.dimensions + ["_subject"]
+        tail = pd.DataFrame({**codes, "_subject": np.asarray(subject_codes, dtype=np.int64)})
+        tail = tail.groupby(keys, sort=False).size().rename("events").reset_index()
+        if self.n_pairs:
+            pairs = pd.concat([pd.DataFrame(self.pairs), tail], ignore_index=True)
+            tail = pairs.groupby(keys, sort=False)["events"].sum().reset_index()
+        new.pairs = {c: tail[c].to_numpy(dtype=np.int64) for c in keys + ["events"]}
+        new._materialize()
+        return new
+
+    def save(self, directory: str) -> None:
+        """Persist as .npy arrays (memory-mappable) plus cube.json."""
+        meta = {
+            "dimensions": self.dimensions,
+            "labels": {d: [None if pd.isna(v) else v for v in labels.tolist()] for d, labels in self.labels.items()},
+        }
+        for column, values in self.pairs.items():
+            np.save(os.path.join(directory, f"cube_pairs_{column}.npy"), values)
+        for dims, rollup in self.rollups.items():
+            for part, values in zip(("codes", "events", "subjects"), rollup):
+                np.save(os.path.join(directory, f"cube_{self._rollup_name(dims)}_{part}.npy"), values)
+        with open(os.path.join(directory, "cube.json"), "w") as fh:
+            json.dump(meta, fh)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "AECube":
+        """
+        Cube written by save(). With mmap_mode="r" the pair table and roll-ups are
+        read-only views of the files, so processes loading the same directory share them.
+        """
+        with open(os.path.join(directory, "cube.json")) as fh:
+            meta = json.load(fh)
+        cube = cls(meta["dimensions"])
+        cube.labels = {
+            d: np.asarray([np.nan if v is None else v for v in labels], dtype=object)
+            for d, labels in meta["labels"].items()
+        }
+        cube.pairs = {
+            column: np.load(os.path.join(directory, f"cube_pairs_{column}.npy"), mmap_mode=mmap_mode)
+            for column in cube.pairs
+        }
+        for dims in cube._rollup_dims():
+            cube.rollups[dims] = tuple(
+                np.load(os.path.join(directory, f"cube_{cube._rollup_name(dims)}_{part}.npy"), mmap_mode=mmap_mode)
+                for part in ("codes", "events", "subjects")
+            )
+        return cube
+
+    def _rollup_dims(self) -> List[Tuple[str, ...]]:
+        return [dims for k in range(len(self.dimensions) + 1) for dims in combinations(self.dimensions, k)]
+
+    def _rollup_name(self, dims: Tuple[str, ...]) -> str:
+        return "rollup_" + "".join("1" if d in dims else "0" for d in self.dimensions)
+
+    def _materialize(self) -> None:
+        pairs = pd.DataFrame(self.pairs)
+        for dims in self._rollup_dims():
+            if not dims:
+                self.rollups[()] = (
+                    np.zeros((1, 0), dtype=np.int64),
+                    np.asarray([pairs["events"].sum()], dtype=np.int64),
+                    np.asarray([pairs["_subject"].nunique()], dtype=np.int64),
+                )
+                continue
+            dims_list = list(dims)
+            per_subject = pairs
+            if len(dims) < len(self.dimensions):
+                per_subject = pairs.groupby(dims_list + ["_subject"], sort=False)["events"].sum().reset_index()
+            grouped = per_subject.groupby(dims_list, sort=False)["events"].agg(["sum", "size"])
+            codes = np.column_stack([grouped.index.get_level_values(d).to_numpy(dtype=np.int64) for d in dims])
+            self.rollups[dims] = (
+                codes.reshape(len(grouped), len(dims)),
+                grouped["sum"].to_numpy(dtype=np.int64),
+                grouped["size"].to_numpy(dtype=np.int64),
+            )
+
+    def query(
+        self,
+        group_by: Sequence[str],
+        filters: Optional[Dict[str, str]] = None,
+    ) -> List[Dict]:
+        """
+        Groups along group_by, restricted to rows whose filtered dimensions equal the
+        given values (case-insensitive). Group labels are upper-cased. Sorted by
+        subject count, then event count.
+        """
+        filters = {d: str(v).strip().upper() for d, v in (filters or {}).items()}
+        unknown = [d for d in [*group_by, *filters] if d not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Unknown summary dimension(s): {unknown}")
+        dims = tuple(d for d in self.dimensions if d in group_by or d in filters)
+        positions = {d: i for i, d in enumerate(dims)}
+        codes, events, subjects = self.rollups[dims]
+        keep = np.ones(len(events), dtype=bool)
+        for d, v in filters.items():
+            wanted = [i for i, label in enumerate(self.labels[d].tolist()) if str(label).upper() == v]
+            keep &= np.isin(codes[:, positions[d]], wanted)
+        groups = np.flatnonzero(keep)
+        groups = groups[np.lexsort((-events[groups], -subjects[groups]))]
+        out = []
+        for g in groups.tolist():
+            row = {d: _label(self.labels[d][codes[g, positions[d]]]) for d in group_by}
+            row["event_count"] = int(events[g])
+            row["subject_count"] = int(subjects[g])
+            out.append(row)
+        return out
+
+
+def _label(value):
+    return None if isinstance(value, float) and np.isnan(value) else value
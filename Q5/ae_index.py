@@ -0,0 +1,368 @@
+"""
+Precomputed lookup structures for the Clinical Trial Data API.
+Built once per loaded dataset so request handlers never copy or re-normalize the table.
+"""
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from metrics import stage
+
+
+def _positions_by_value(values: pd.Series) -> Dict[str, np.ndarray]:
+    """Map each distinct non-null value to the sorted row positions holding it."""
+    return {
+        key: np.asarray(pos, dtype=np.int64)
+        for key, pos in values.groupby(values, sort=False).indices.items()
+    }
+
+
+def _merge_positions(
+    head: Dict[str, np.ndarray], tail: Dict[str, np.ndarray], offset: int
+) -> Dict[str, np.ndarray]:
+    """Combine two position tables where tail's positions start at row `offset`."""
+    merged = dict(head)
+    for key, pos in tail.items():
+        shifted = pos + offset
+        merged[key] = np.concatenate([head[key], shifted]) if key in head else shifted
+    return merged
+
+
+def _save_positions(table: Dict[str, np.ndarray], path: str) -> Dict[str, List]:
+    """Write a position table as one concatenated array; returns its keys/offsets."""
+    keys = list(table)
+    parts = [table[k] for k in keys]
+    np.save(path, np.concatenate(parts) if parts else np.empty(0, dtype=np.int64))
+    offsets = np.cumsum([0] + [len(p) for p in parts]).tolist()
+    return {"keys": keys, "offsets": offsets}
+
+
+def _load_positions(meta: Dict[str, List], path: str, mmap_mode: Optional[str]) -> Dict[str, np.ndarray]:
+    flat = np.load(path, mmap_mode=mmap_mode)
+    offsets = meta["offsets"]
+    return {k: flat[offsets[i]:offsets[i + 1]] for i, k in enumerate(meta["keys"])}
+
+
+class AEIndex:
+    """
+    Inverted index over an ADAE frame.
+    severity / arm: stripped, upper-cased value -> sorted row positions.
+    subject_codes: per-row ordinal into subject_ids (row -> USUBJID).
+    Subject lookups use a hash index built on first use; an index loaded from disk
+    instead binary-searches a saved sorted copy of the ids, so nothing per subject is
+    built in (or private to) the loading process.
+    """
+
+    def __init__(self, df: pd.DataFrame, has_arm: bool = True):
+        self.n_rows = len(df)
+        self.severity = _positions_by_value(df["AESEV"].str.strip().str.upper())
+        self.arm = (
+            _positions_by_value(df["ACTARM"].astype(str).str.strip().str.upper())
+            if has_arm else {}
+        )
+        self.has_arm = has_arm
+        codes, uniques = pd.factorize(df["USUBJID"], use_na_sentinel=False)
+        self.subject_codes = codes
+        self.subject_ids = np.asarray(uniques, dtype=object)
+        self._ordinals: Optional[pd.Index] = None  # built on first subject_ordinal()
+        self._sorted: Optional[Tuple[np.ndarray, np.ndarray]] = None  # (sorted ids, their ordinals)
+
+    def extend(self, tail: pd.DataFrame) -> "AEIndex":
+        """New index covering this index's rows followed by tail's rows."""
+        tail_index = AEIndex(tail, has_arm=self.has_arm)
+        offset = self.n_rows
+        new = AEIndex.__new__(AEIndex)
+        new.n_rows = offset + tail_index.n_rows
+        new.has_arm = self.has_arm
+        new.severity = _merge_positions(self.severity, tail_index.severity, offset)
+        new.arm = _merge_positions(self.arm, tail_index.arm, offset)
+        # Tail subject ordinals -> existing ordinals, new subjects numbered after them
+        mapping = pd.Index(self.subject_ids).get_indexer(tail_index.subject_ids)
+        fresh = mapping < 0
+        mapping[fresh] = len(self.subject_ids) + np.arange(int(fresh.sum()))
+        new.subject_ids = np.concatenate([self.subject_ids, tail_index.subject_ids[fresh]])
+        new.subject_codes = np.concatenate([self.subject_codes, mapping[tail_index.subject_codes]])
+        new._ordinals = None
+        new._sorted = None
+        return new
+
+    def save(self, directory: str) -> None:
+        """
+        Persist as .npy arrays (memory-mappable) plus index.json. Text subject ids are
+        saved as fixed-width arrays with a sorted copy for lookups; ids with missing
+        values go to index.json.
+        """
+        ids = self.subject_ids.tolist()
+        meta = {
+            "n_rows": self.n_rows,
+            "has_arm": self.has_arm,
+            "severity": _save_positions(self.severity, os.path.join(directory, "severity.npy")),
+            "arm": _save_positions(self.arm, os.path.join(directory, "arm.npy")),
+            "subject_ids": None,
+        }
+        if all(isinstance(s, str) for s in ids):
+            text = np.asarray(ids, dtype=str)
+            order = np.argsort(text, kind="stable")
+            np.save(os.path.join(directory, "subject_ids.npy"), text)
+            np.save(os.path.join(directory, "subject_sorted.npy"), text[order])
+            np.save(os.path.join(directory, "subject_order.npy"), order.astype(np.int64))
+        else:
+            meta["subject_ids"] = [None if pd.isna(s) else s for s in ids]
+        np.save(os.path.join(directory, "subject_codes.npy"), self.subject_codes)
+        with open(os.path.join(directory, "index.json"), "w") as fh:
+            json.dump(meta, fh)
+
+    @classmethod
+    def load(cls, directory: str, mmap_mode: Optional[str] = "r") -> "AEIndex":
+        """
+        Index written by save(). With mmap_mode="r" the arrays are read-only views of
+        the files, so processes loading the same directory share their pages.
+        """
+        with open(os.path.join(directory, "index.json")) as fh:
+            meta = json.load(fh)
+        index = cls.__new__(cls)
+        index.n_rows = meta["n_rows"]
+        index.has_arm = meta["has_arm"]
+        index.severity = _load_positions(meta["severity"], os.path.join(directory, "severity.npy"), mmap_mode)
+        index.arm = _load_positions(meta["arm"], os.path.join(directory, "arm.npy"), mmap_mode)
+        index.subject_codes = np.load(os.path.join(directory, "subject_codes.npy"), mmap_mode=mmap_mode)
+        index._ordinals = None
+        index._sorted = None
+        if meta["subject_ids"] is None:
+            index.subject_ids = np.load(os.path.join(directory, "subject_ids.npy"), mmap_mode=mmap_mode)
+            index._sorted = (
+                np.load(os.path.join(directory, "subject_sorted.npy"), mmap_mode=mmap_mode),
+                np.load(os.path.join(directory, "subject_order.npy"), mmap_mode=mmap_mode),
+            )
+        else:
+            index.subject_ids = np.asarray(meta["subject_ids"], dtype=object)
+        return index
+
+    def _union(self, table: Dict[str, np.ndarray], keys: Iterable[str]) -> np.ndarray:
+        parts = [table[k] for k in dict.fromkeys(keys) if k in table]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        if len(parts) == 1:
+            return parts[0]
+        # Positions of distinct values are disjoint, so a sort is a union
+        return np.sort(np.concatenate(parts))
+
+    def match_rows(
+        self,
+        severity: Optional[List[str]] = None,
+        treatment_arm: Optional[str] = None,
+    ) -> np.ndarray:
+        """Sorted row positions matching the severity list (any) and treatment arm."""
+        return next(self.match_many([(severity, treatment_arm)]))
+
+    def estimate_rows(
+        self,
+        severity: Optional[List[str]] = None,
+        treatment_arm: Optional[str] = None,
+    ) -> int:
+        """Upper bound on len(match_rows(...)) from posting-list sizes, without matching."""
+        n = self.n_rows
+        if severity:
+            n = min(n, sum(len(self.severity.get(s, ())) for s in {s.strip().upper() for s in severity}))
+        if treatment_arm and self.has_arm:
+            n = min(n, len(self.arm.get(treatment_arm.strip().upper(), ())))
+        return n
+
+    def match_many(
+        self, queries: Iterable[Tuple[Optional[List[str]], Optional[str]]]
+    ) -> Iterator[np.ndarray]:
+        """
+        match_rows for each (severity, treatment_arm) pair. Severity unions and
+        final row sets are computed once per distinct normalized filter and shared.
+        """
+        severity_rows: Dict[frozenset, np.ndarray] = {}
+        matched: Dict[tuple, np.ndarray] = {}
+        empty = np.empty(0, dtype=np.int64)
+        for severity, treatment_arm in queries:
+            sev_key = frozenset(s.strip().upper() for s in severity) if severity else None
+            arm_key = treatment_arm.strip().upper() if treatment_arm and self.has_arm else None
+            rows = matched.get((sev_key, arm_key))
+            if rows is None:
+                if sev_key is not None and sev_key not in severity_rows:
+                    with stage("severity_mask"):
+                        severity_rows[sev_key] = self._union(self.severity, sev_key)
+                rows = severity_rows.get(sev_key)
+                if arm_key is not None:
+                    with stage("arm_mask"):
+                        arm_rows = self.arm.get(arm_key, empty)
+                        rows = arm_rows if rows is None else np.intersect1d(rows, arm_rows, assume_unique=True)
+                if rows is None:
+                    rows = np.arange(self.n_rows, dtype=np.int64)
+                matched[(sev_key, arm_key)] = rows
+            yield rows
+
+    def subject_codes_for(self, rows: np.ndarray) -> np.ndarray:
+        """Distinct subject ordinals for the given rows, in order of first appearance."""
+        with stage("unique"):
+            return pd.unique(self.subject_codes[rows])
+
+    def subjects_for(self, rows: np.ndarray) -> List[str]:
+        """Distinct USUBJIDs for the given rows, in order of first appearance."""
+        return self.labels(self.subject_codes_for(rows))
+
+    def labels(self, codes: np.ndarray) -> List[str]:
+        return self.subject_ids[codes].tolist()
+
+    def _ordinal_index(self) -> pd.Index:
+        lookup = self._ordinals
+        if lookup is None:
+            lookup = self._ordinals = pd.Index(self.subject_ids)
+        return lookup
+
+    def _search_sorted(self, subject_ids: Sequence[str]) -> np.ndarray:
+        keys, order = self._sorted
+        wanted = np.asarray(subject_ids, dtype=str)
+        if not len(keys):
+            return np.full(len(wanted), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        return np.where(keys[pos] == wanted, order[pos], -1)
+
+    def subject_ordinal(self, subject_id: str) -> Optional[int]:
+        """Position of subject_id in subject_ids (its order of first appearance), or None."""
+        if self._sorted is not None:
+            code = int(self._search_sorted([subject_id])[0])
+            return code if code >= 0 else None
+        try:
+            return int(self._ordinal_index().get_loc(subject_id))
+        except KeyError:
+            return None
+
+    def subject_ordinals(self, subject_ids: Sequence[str]) -> np.ndarray:
+        """Vectorized subject_ordinal; -1 for unknown subjects."""
+        if self._sorted is not None:
+            return self._search_sorted(subject_ids)
+        return self._ordinal_index().get_indexer(subject_ids)
+
+    def subject_page(
+        self,
+        rows: np.ndarray,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> Tuple[np.ndarray, int, bool]:
+        """
+        Ordinals of subjects in rows, ascending (a stable order across append reloads),
+        starting after ordinal `after`. Returns (page, distinct subjects in rows, more_remaining).
+        """
+        with stage("unique"):
+            codes = np.unique(self.subject_codes[rows])
+        total = len(codes)
+        if after is not None:
+            codes = codes[np.searchsorted(codes, after, side="right"):]
+        if limit is not None and len(codes) > limit:
+            return codes[:limit], total, True
+        return codes, total, False
+
+
+class RiskTable:
+    """
+    Per-subject risk scores computed in one vectorized pass over an AEIndex.
+    totals: score per subject ordinal; category_codes: per subject ordinal, an index
+    into category_labels (the category of each distinct score). Lookups go through
+    the index's subject ordinals, so the table is arrays only and can be saved and
+    memory-mapped next to the index.
+    weights_key identifies the SEVERITY_WEIGHTS the table was built with.
+    """
+
+    def __init__(
+        self,
+        index: AEIndex,
+        weights: Dict[str, int],
+        categorize: Callable[[int], str],
+    ):
+        self.index = index
+        self.weights_key = tuple(sorted(weights.items()))
+        row_weights = np.zeros(index.n_rows, dtype=np.int64)
+        for sev, rows in index.severity.items():
+            row_weights[rows] = weights.get(sev, 0)
+        totals = np.bincount(
+            index.subject_codes, weights=row_weights, minlength=len(index.subject_ids)
+        ).astype(np.int64)
+        # Categorize each distinct score once, then broadcast to subjects
+        distinct, inverse = np.unique(totals, return_inverse=True)
+        self.totals = totals
+        self.distinct_totals = distinct
+        self.category_codes = inverse.astype(np.int64)
+        self.category_labels = np.asarray([categorize(int(v)) for v in distinct], dtype=object)
+
+    @property
+    def categories(self) -> np.ndarray:
+        return self.category_labels[self.category_codes]
+
+    def save(self, directory: str, name: str) -> None:
+        """Write <name>_*.npy and <name>.json (last, so a reader never sees a partial table)."""
+        for part in ("totals", "distinct_totals", "category_codes"):
+            tmp = os.path.join(directory, f"{name}_{part}.{os.getpid()}.tmp.npy")
+            np.save(tmp, getattr(self, part))
+            os.replace(tmp, os.path.join(directory, f"{name}_{part}.npy"))
+        meta = {"weights": self.weights_key, "labels": self.category_labels.tolist()}
+        tmp = os.path.join(directory, f"{name}.{os.getpid()}.tmp")
+        with open(tmp, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp, os.path.join(directory, f"{name}.json"))
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        name: str,
+        index: AEIndex,
+        weights: Dict[str, int],
+        categorize: Callable[[int], str],
+        mmap_mode: Optional[str] = "r",
+    ) -> Optional["RiskTable"]:
+        """
+        Table written by save() for index, or None when there is none for these weights
+        or categorize now labels its scores differently.
+        """
+        try:
+            with open(os.path.join(directory, f"{name}.json")) as fh:
+                meta = json.load(fh)
+        except OSError:
+            return None
+        table = cls.__new__(cls)
+        table.index = index
+        table.weights_key = tuple(sorted(weights.items()))
+        if [tuple(w) for w in meta["weights"]] != list(table.weights_key):
+            return None
+        for part in ("totals", "distinct_totals", "category_codes"):
+            setattr(table, part, np.load(os.path.join(directory, f"{name}_{part}.npy"), mmap_mode=mmap_mode))
+        if meta["labels"] != [categorize(int(v)) for v in table.distinct_totals]:
+            return None
+        table.category_labels = np.asarray(meta["labels"], dtype=object)
+        return table
+
+    def is_current(self, index: AEIndex, weights: Dict[str, int]) -> bool:
+        return self.index is index and self.weights_key == tuple(sorted(weights.items()))
+
+    def lookup(self, subject_id: str) -> Optional[Tuple[int, str]]:
+        code = self.index.subject_ordinal(subject_id)
+        if code is None:
+            return None
+        return int(self.totals[code]), self.category_labels[self.category_codes[code]]
+
+    def lookup_many(
+        self, subject_ids: Optional[Sequence[str]] = None
+    ) -> Tuple[List[str], List[int], List[str], List[str]]:
+        """
+        Scores for many subjects in one vectorized pass (all subjects when None).
+        Returns (found ids, scores, categories, ids not in the dataset).
+        """
+        if subject_ids is None:
+            return (self.index.subject_ids.tolist(), self.totals.tolist(),
+                    self.categories.tolist(), [])
+        ids = np.asarray(subject_ids, dtype=object)
+        codes = self.index.subject_ordinals(ids)
+        found = codes >= 0
+        codes = codes[found]
+        return (ids[found].tolist(), self.totals[codes].tolist(),
+                self.category_labels[self.category_codes[codes]].tolist(), ids[~found].tolist())
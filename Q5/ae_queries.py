@@ -0,0 +1,67 @@
+"""
+Response bodies of the /ae-query endpoints as plain functions of a snapshot.
+They take only picklable arguments, so the same code runs in the API process
+or in a query-pool worker (see query_pool.py).
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dataset import DatasetSnapshot
+from metrics import record_size
+
+# (severity, treatment_arm, count_only, limit, after ordinal)
+AEQueryArgs = Tuple[Optional[List[str]], Optional[str], bool, Optional[int], Optional[int]]
+
+
+def ae_query_body(
+    snap: DatasetSnapshot,
+    rows: np.ndarray,
+    count_only: bool = False,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+) -> Dict[str, Any]:
+    body = {"matching_record_count": len(rows)}
+
+    if count_only:
+        body["unique_subject_count"] = len(snap.index.subject_codes_for(rows))
+    elif limit is not None or after is not None:
+        codes, total, more = snap.index.subject_page(rows, limit, after)
+        page = snap.index.labels(codes)
+        body["unique_subject_count"] = total
+        body["subjects"] = page
+        body["next_after"] = page[-1] if more else None
+    else:
+        unique_subjects = snap.index.subjects_for(rows)
+        body["unique_subject_count"] = len(unique_subjects)
+        body["subjects"] = unique_subjects
+
+    body["dataset_version"] = snap.version
+    return body
+
+
+def ae_query_job(
+    snap: DatasetSnapshot,
+    severity: Optional[List[str]],
+    treatment_arm: Optional[str],
+    count_only: bool = False,
+    limit: Optional[int] = None,
+    after: Optional[int] = None,
+) -> Dict[str, Any]:
+    rows = snap.index.match_rows(severity, treatment_arm)
+    body = ae_query_body(snap, rows, count_only, limit, after)
+    # Recorded here too, as a query-pool worker hands back rendered bytes
+    record_size("records", body["matching_record_count"])
+    record_size("subjects", body["unique_subject_count"])
+    return body
+
+
+def ae_query_batch_job(snap: DatasetSnapshot, queries: Sequence[AEQueryArgs]) -> Dict[str, Any]:
+    """All queries against the one snapshot, sharing matches between equal filters."""
+    matches = snap.index.match_many((q[0], q[1]) for q in queries)
+    results = [
+        {"query_index": i, **ae_query_body(snap, rows, *q[2:])}
+        for i, (q, rows) in enumerate(zip(queries, matches))
+    ]
+    return {"results": results, "dataset_version": snap.version}
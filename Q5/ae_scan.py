@@ -0,0 +1,372 @@
+"""
+Out-of-core evaluation of the API's queries, for ADAE files larger than memory.
+The source file (CSV, or Parquet read one row group at a time) is read in chunks
+of only the columns a query needs, each chunk sized so that it and the arrays
+derived from it fit a memory budget. Every chunk is filtered with the semantics of
+AEIndex (severity in an upper-cased set, treatment arm equal ignoring case, arm
+ignored when the file has no ACTARM) and folded into per-subject accumulators.
+State kept between chunks grows with the number of distinct subjects, never with
+rows, and is charged against the same budget: chunks shrink as it grows.
+The chunk reader (iter_chunks and its helpers) has a counterpart in Q6's
+filter_scan.py; the apps share no code (see the README's notes).
+"""
+
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset import REQUIRED_COLUMNS, SourceState
+
+# Rows per chunk even when the per-subject accumulators have used up the budget
+MIN_CHUNK_ROWS = 10_000
+
+# Peak bytes while a chunk is folded into the accumulators, per byte of the parsed
+# chunk: parser buffers, factorized AESEV/ACTARM and subject codes, row masks
+CHUNK_OVERHEAD = 4
+
+# Rows of the query's columns parsed before the scan to price one row
+SAMPLE_ROWS = 1_000
+
+# Bytes of cross-chunk state per distinct subject (id string and its dict slot)
+SUBJECT_BYTES = 160
+
+
+class SourceChanged(RuntimeError):
+    """The file was rewritten after its snapshot was scanned; reload before querying."""
+
+
+def is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def source_columns(path: str) -> List[str]:
+    """Column names of the file, as written."""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Non-null values as str, as read_csv(dtype=str) reads them."""
+    for col in df.columns:
+        if df[col].dtype != object:
+            text = df[col].astype(object).where(df[col].notna(), np.nan).map(str, na_action="ignore")
+            df[col] = text.astype(object)
+    return df
+
+
+def _read_sample(path: str, usecols: List[str]) -> pd.DataFrame:
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        batch = next(pq.ParquetFile(path).iter_batches(batch_size=SAMPLE_ROWS, columns=usecols), None)
+        return _as_text(batch.to_pandas()) if batch is not None else pd.DataFrame(columns=usecols)
+    return pd.read_csv(path, usecols=usecols, nrows=SAMPLE_ROWS, dtype=str)
+
+
+def iter_chunks(
+    path: str,
+    columns: Sequence[str],
+    budget_bytes: int,
+    reserved: Callable[[], int] = lambda: 0,
+    nrows: Optional[int] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Frames of the given (upper-case) columns of path, values as text, covering its first
+    nrows rows (all when None). Each chunk is sized when it is read: budget_bytes less
+    reserved() (the caller's accumulated state), over the estimated cost of a row.
+    """
+    names = {c.upper(): c for c in source_columns(path)}
+    usecols = [names[c] for c in columns]
+    sample = _read_sample(path, usecols)
+    row_bytes = CHUNK_OVERHEAD * max(1.0, sample.memory_usage(deep=True, index=False).sum() / max(1, len(sample)))
+    rename = {names[c]: c for c in columns}
+
+    def chunk_rows(remaining: Optional[int]) -> int:
+        rows = max(MIN_CHUNK_ROWS, int((budget_bytes - reserved()) / row_bytes))
+        return rows if remaining is None else min(rows, remaining)
+
+    remaining = nrows
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        for group in range(pf.num_row_groups):
+            if remaining is not None and remaining <= 0:
+                return
+            for batch in pf.iter_batches(batch_size=chunk_rows(remaining), row_groups=[group], columns=usecols):
+                if remaining is not None:
+                    batch = batch.slice(0, max(0, remaining))
+                    remaining -= batch.num_rows
+                yield _as_text(batch.to_pandas()).rename(columns=rename)
+        return
+
+    with pd.read_csv(path, usecols=usecols, dtype=str, iterator=True) as reader:
+        while remaining is None or remaining > 0:
+            try:
+                chunk = reader.get_chunk(chunk_rows(remaining))
+            except StopIteration:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk.rename(columns=rename)
+
+
+class SubjectDirectory:
+    """
+    USUBJID -> ordinal by order of first appearance, built chunk by chunk; stands in
+    for AEIndex's subject lookups (subject_ordinal, labels) on a scanned snapshot.
+    """
+
+    def __init__(self):
+        self.ordinals: Dict[Optional[str], int] = {}
+        self.subject_ids: List[Optional[str]] = []
+
+    def __len__(self) -> int:
+        return len(self.subject_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.subject_ids) * SUBJECT_BYTES
+
+    def codes(self, subjects: pd.Series, add: bool = True) -> np.ndarray:
+        """Ordinal per row; unseen subjects are numbered after the known ones (or raise if not add)."""
+        local, uniques = pd.factorize(subjects, use_na_sentinel=False)
+        mapped = np.empty(len(uniques), dtype=np.int64)
+        for i, s in enumerate(uniques.tolist()):
+            if s != s:
+                s = None  # NaN USUBJID: one subject, rendered as null
+            code = self.ordinals.get(s)
+            if code is None:
+                if not add:
+                    raise SourceChanged(f"Subject {s!r} was not in the file when it was loaded.")
+                code = self.ordinals[s] = len(self.subject_ids)
+                self.subject_ids.append(s)
+            mapped[i] = code
+        return mapped[local]
+
+    def subject_ordinal(self, subject_id: str) -> Optional[int]:
+        return self.ordinals.get(subject_id)
+
+    def subject_ordinals(self, subject_ids: Sequence[str]) -> np.ndarray:
+        """Vectorized subject_ordinal; -1 for unknown subjects."""
+        return np.fromiter((self.ordinals.get(s, -1) for s in subject_ids), dtype=np.int64, count=len(subject_ids))
+
+    def labels(self, codes: Iterable[int]) -> List[Optional[str]]:
+        return [self.subject_ids[c] for c in codes]
+
+
+class ScanSnapshot:
+    """
+    A dataset answered by scanning its file instead of holding it: where the file
+    stood when loaded, its row count and subjects (index: SubjectDirectory). Scans
+    read only the rows counted here, so appended rows wait for a reload.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        budget_bytes: int,
+        version: int,
+        source: SourceState,
+        n_rows: int,
+        has_arm: bool,
+        index: SubjectDirectory,
+    ):
+        self.path = path
+        self.budget_bytes = budget_bytes
+        self.version = version
+        self.source = source
+        self.n_rows = n_rows
+        self.has_arm = has_arm
+        self.index = index
+        self.appended_rows = 0
+        self.risk_table = None
+
+    @property
+    def source_id(self) -> str:
+        return self.source.identity
+
+    def check_source(self) -> None:
+        """Raise SourceChanged if the rows this snapshot covers were rewritten."""
+        intact = not self.source.changed() if is_parquet(self.path) else self.source.is_append_only()
+        if not intact:
+            raise SourceChanged(f"{self.path} changed since version {self.version} was loaded.")
+
+    def chunks(self, columns: Sequence[str], reserved: Callable[[], int] = lambda: 0) -> Iterator[pd.DataFrame]:
+        self.check_source()
+        yield from iter_chunks(self.path, columns, self.budget_bytes, reserved, nrows=self.n_rows)
+        self.check_source()
+
+
+def load_scan_snapshot(path: str, budget_bytes: int, version: int = 1) -> ScanSnapshot:
+    """One pass over USUBJID numbering the subjects; nothing else is kept."""
+    columns = [c.upper() for c in source_columns(path)]
+    for col in REQUIRED_COLUMNS:
+        if col not in columns:
+            raise ValueError(f"Missing required column: {col}")
+    # Retry if the file changes while it is being read, so the source state matches the rows counted
+    for _ in range(3):
+        before = os.stat(path)
+        index, n_rows = SubjectDirectory(), 0
+        for chunk in iter_chunks(path, ["USUBJID"], budget_bytes, lambda: index.nbytes):
+            index.codes(chunk["USUBJID"])
+            n_rows += len(chunk)
+        after = os.stat(path)
+        if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+            break
+    else:
+        raise SourceChanged(f"{path} kept changing during 3 scans; try again once writes settle.")
+    source = SourceState.read(path, after.st_size, after.st_mtime_ns)
+    return ScanSnapshot(path, budget_bytes, version, source, n_rows, "ACTARM" in columns, index)
+
+
+def refresh_scan_snapshot(snapshot: ScanSnapshot, full: bool = False) -> ScanSnapshot:
+    """Snapshot of the file's current contents (a new scan), or snapshot itself if unchanged."""
+    if not full and not snapshot.source.changed():
+        return snapshot
+    return load_scan_snapshot(snapshot.path, snapshot.budget_bytes, version=snapshot.version + 1)
+
+
+def _upper_values(values: pd.Series, na_text: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """(code per row, stripped upper-cased distinct values); NaN codes -1 unless na_text ("NAN" as astype(str) gives)."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=not na_text)
+    return codes, np.asarray([str(u).strip().upper() for u in uniques], dtype=object)
+
+
+class QueryScan:
+    """Answer of one (severity, treatment_arm) query, accumulated over the chunks of a scan."""
+
+    def __init__(self, severity: Optional[Iterable[str]], arm: Optional[str]):
+        self.severity = frozenset(s.strip().upper() for s in severity) if severity else None
+        self.arm = arm.strip().upper() if arm else None
+        self.records = 0
+        self._seen = np.zeros(0, dtype=bool)           # per subject ordinal
+        self._order: List[np.ndarray] = []            # newly matched ordinals, chunk by chunk
+
+    @property
+    def nbytes(self) -> int:
+        return self._seen.nbytes + sum(o.nbytes for o in self._order)
+
+    def add(self, rows: np.ndarray, codes: np.ndarray, n_subjects: int) -> None:
+        """Fold in one chunk: rows is its match mask, codes its subject ordinals."""
+        self.records += int(rows.sum())
+        if len(self._seen) < n_subjects:
+            self._seen = np.concatenate([self._seen, np.zeros(n_subjects - len(self._seen), dtype=bool)])
+        matched = pd.unique(codes[rows])
+        fresh = matched[~self._seen[matched]]
+        if len(fresh):
+            self._seen[fresh] = True
+            self._order.append(fresh)
+
+    def subject_codes(self) -> np.ndarray:
+        """Distinct matching subject ordinals, in order of first matching row."""
+        return np.concatenate(self._order) if self._order else np.empty(0, dtype=np.int64)
+
+    def body(
+        self,
+        snap: ScanSnapshot,
+        count_only: bool = False,
+        limit: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> Dict:
+        """The /ae-query body, as ae_queries.ae_query_body renders it from an in-memory snapshot."""
+        body = {"matching_record_count": self.records}
+        codes = self.subject_codes()
+        if count_only:
+            body["unique_subject_count"] = len(codes)
+        elif limit is not None or after is not None:
+            codes = np.sort(codes)
+            total = len(codes)
+            if after is not None:
+                codes = codes[np.searchsorted(codes, after, side="right"):]
+            more = limit is not None and len(codes) > limit
+            page = snap.index.labels(codes[:limit] if more else codes)
+            body["unique_subject_count"] = total
+            body["subjects"] = page
+            body["next_after"] = page[-1] if more else None
+        else:
+            body["unique_subject_count"] = len(codes)
+            body["subjects"] = snap.index.labels(codes)
+        body["dataset_version"] = snap.version
+        return body
+
+
+def scan_ae_queries(
+    snap: ScanSnapshot,
+    queries: Sequence[Tuple[Optional[List[str]], Optional[str]]],
+) -> List[QueryScan]:
+    """Every (severity, treatment_arm) query in one pass; equal queries share one QueryScan."""
+    states: Dict[tuple, QueryScan] = {}
+    answers = []
+    for severity, arm in queries:
+        q = QueryScan(severity, arm if snap.has_arm else None)
+        answers.append(states.setdefault((q.severity, q.arm), q))
+    columns = ["USUBJID", "AESEV"] + (["ACTARM"] if snap.has_arm else [])
+    n_subjects = len(snap.index)
+    reserved = lambda: snap.index.nbytes + sum(s.nbytes for s in states.values())  # noqa: E731
+
+    for chunk in snap.chunks(columns, reserved):
+        codes = snap.index.codes(chunk["USUBJID"], add=False)
+        sev_codes, sev_values = _upper_values(chunk["AESEV"], na_text=False)
+        arm_codes, arm_values = _upper_values(chunk["ACTARM"], na_text=True) if snap.has_arm else (None, None)
+        for q in states.values():
+            rows = np.ones(len(chunk), dtype=bool)
+            if q.severity is not None:
+                # Code -1 (NaN severity) indexes the appended False
+                hits = np.append(np.isin(sev_values, list(q.severity)), False)
+                rows &= hits[sev_codes]
+            if q.arm is not None:
+                rows &= (arm_values == q.arm)[arm_codes]
+            q.add(rows, codes, n_subjects)
+    return answers
+
+
+class ScanRiskTable:
+    """
+    RiskTable computed in one pass over a ScanSnapshot's file: per subject, the sum of
+    its rows' severity weights. Holds one total and category per subject.
+    """
+
+    def __init__(
+        self,
+        snap: ScanSnapshot,
+        weights: Dict[str, int],
+        categorize: Callable[[int], str],
+    ):
+        self.snap = snap
+        self.weights_key = tuple(sorted(weights.items()))
+        index = snap.index
+        totals = np.zeros(len(index), dtype=np.int64)
+        for chunk in snap.chunks(["USUBJID", "AESEV"], lambda: index.nbytes + totals.nbytes * 2):
+            codes = index.codes(chunk["USUBJID"], add=False)
+            sev_codes, sev_values = _upper_values(chunk["AESEV"], na_text=False)
+            row_weights = np.append([weights.get(s, 0) for s in sev_values], 0).astype(np.int64)[sev_codes]
+            totals += np.bincount(codes, weights=row_weights, minlength=len(index)).astype(np.int64)
+        distinct, inverse = np.unique(totals, return_inverse=True)
+        labels = np.asarray([categorize(int(v)) for v in distinct], dtype=object)
+        self.totals = totals
+        self.categories = labels[inverse]
+
+    def is_current(self, snap: ScanSnapshot, weights: Dict[str, int]) -> bool:
+        return self.snap is snap and self.weights_key == tuple(sorted(weights.items()))
+
+    def lookup(self, subject_id: str) -> Optional[Tuple[int, str]]:
+        code = self.snap.index.subject_ordinal(subject_id)
+        if code is None:
+            return None
+        return int(self.totals[code]), self.categories[code]
+
+    def lookup_many(
+        self, subject_ids: Optional[Sequence[str]] = None
+    ) -> Tuple[List[str], List[int], List[str], List[str]]:
+        """Scores for many subjects (all when None): (found ids, scores, categories, ids not in the dataset)."""
+        if subject_ids is None:
+            return (list(self.snap.index.subject_ids), self.totals.tolist(), self.categories.tolist(), [])
+        ids = np.asarray(subject_ids, dtype=object)
+        codes = self.snap.index.subject_ordinals(ids)
+        found = codes >= 0
+        codes = codes[found]
+        return (ids[found].tolist(), self.totals[codes].tolist(),
+                self.categories[codes].tolist(), ids[~found].tolist())
@@ -0,0 +1,91 @@
+"""
+Benchmark: /ae-query filtering via AEIndex vs the original copy-and-scan path.
+Run from the Q5 folder:  python benchmarks/bench_ae_query.py [n_rows ...]
+Defaults to 1k, 100k and 10M rows synthesized from data/adae.csv.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _q5)
+
+from ae_index import AEIndex  # noqa: E402
+
+ARMS = ["Placebo", "Xanomeline High Dose", "Xanomeline Low Dose"]
+QUERIES = [
+    (["SEVERE"], None),
+    (["MILD", "moderate"], None),
+    (None, "Placebo"),
+    (["SEVERE"], "Xanomeline High Dose"),
+]
+
+
+def synthesize(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """USUBJID/AESEV/ACTARM frame with adae.csv's severity mix and events per subject."""
+    src = pd.read_csv(os.path.join(_q5, "data", "adae.csv"), usecols=["USUBJID", "AESEV"])
+    rng = np.random.default_rng(seed)
+    rows_per_subject = len(src) / src["USUBJID"].nunique()
+    n_subjects = max(1, int(n_rows / rows_per_subject))
+    subj = rng.integers(0, n_subjects, n_rows)
+    return pd.DataFrame({
+        "USUBJID": pd.Series(subj).map("SYN-{:07d}".format),
+        "AESEV": rng.choice(src["AESEV"].dropna().to_numpy(), n_rows),
+        "ACTARM": np.asarray(ARMS, dtype=object)[subj % len(ARMS)],
+    })
+
+
+def legacy_ae_query(df: pd.DataFrame, severity, treatment_arm):
+    """The pre-index implementation of ae_query, kept verbatim for comparison."""
+    filtered_df = df.copy()
+    if severity:
+        severity_values = [s.upper() for s in severity]
+        filtered_df = filtered_df[filtered_df["AESEV"].str.upper().isin(severity_values)]
+    if treatment_arm:
+        arm_vals = filtered_df["ACTARM"].astype(str).str.upper()
+        filtered_df = filtered_df[arm_vals == treatment_arm.upper()]
+    unique_subjects = filtered_df["USUBJID"].unique().tolist()
+    return len(filtered_df), unique_subjects
+
+
+def indexed_ae_query(index: AEIndex, severity, treatment_arm):
+    rows = index.match_rows(severity, treatment_arm)
+    return len(rows), index.subjects_for(rows)
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(sizes):
+    print(f"{'rows':>10}  {'query':<50} {'legacy ms':>10} {'indexed ms':>11} {'speedup':>8}")
+    for n in sizes:
+        df = synthesize(n)
+        t0 = time.perf_counter()
+        index = AEIndex(df)
+        build = time.perf_counter() - t0
+        repeat = 5 if n <= 1_000_000 else 2
+        for severity, arm in QUERIES:
+            legacy = legacy_ae_query(df, severity, arm)
+            indexed = indexed_ae_query(index, severity, arm)
+            assert legacy == indexed, (severity, arm)
+            t_legacy = _time(lambda: legacy_ae_query(df, severity, arm), repeat)
+            t_indexed = _time(lambda: indexed_ae_query(index, severity, arm), repeat)
+            label = f"severity={severity} arm={arm}"
+            print(f"{n:>10}  {label:<50} {t_legacy * 1e3:>10.2f} {t_indexed * 1e3:>11.2f} "
+                  f"{t_legacy / t_indexed:>7.1f}x")
+        print(f"{n:>10}  index build: {build * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000, 100_000, 10_000_000]
+    main(sizes)
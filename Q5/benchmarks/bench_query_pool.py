@@ -0,0 +1,109 @@
+"""
+Harness: point-lookup latency while broad queries run, in-process vs QUERY_WORKERS.
+Run from the Q5 folder:  python benchmarks/bench_query_pool.py [n_rows] [query_workers ...]
+Starts `uvicorn main:app` on a synthetic CSV (data/adae.csv tiled to n_rows, default 1M)
+with the response cache off. Client threads keep full-subject-list /ae-query requests
+in flight while another thread times /subject-risk lookups; reports lookup p50/p99 and
+how many broad queries were answered or shed with 503. Worker count 0 = in-process.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+
+from bench_startup import write_synthetic_csv
+from bench_workers import _free_port, _request
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BROAD_CLIENTS = 6
+DURATION = 15.0
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def measure(csv_path: str, query_workers: int, timeout: float = 600) -> dict:
+    port = _free_port()
+    env = dict(os.environ, ADAE_DATA_PATH=csv_path, RESPONSE_CACHE_SIZE="0",
+               QUERY_WORKERS=str(query_workers), QUERY_QUEUE_SIZE="2")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=_q5, env=env,
+    )
+    try:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                _request(port, "/")
+                break
+            except OSError:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.5)
+        # Let pool workers attach before timing
+        _request(port, "/ae-query", {"severity": ["MILD", "MODERATE", "SEVERE"]})
+
+        stop = threading.Event()
+        counts = {"ok": 0, "shed": 0}
+        lock = threading.Lock()
+
+        def broad():
+            while not stop.is_set():
+                try:
+                    _request(port, "/ae-query", {"severity": ["MILD", "MODERATE", "SEVERE"]})
+                    outcome = "ok"
+                except urllib.error.HTTPError as e:
+                    if e.code != 503:
+                        raise
+                    outcome = "shed"
+                    time.sleep(0.05)
+                with lock:
+                    counts[outcome] += 1
+
+        threads = [threading.Thread(target=broad) for _ in range(BROAD_CLIENTS)]
+        for t in threads:
+            t.start()
+        latencies = []
+        end = time.time() + DURATION
+        while time.time() < end:
+            t0 = time.perf_counter()
+            _request(port, "/subject-risk/01-701-1015-00000")
+            latencies.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.02)
+        stop.set()
+        for t in threads:
+            t.join()
+        return {
+            "p50": _percentile(latencies, 0.50),
+            "p99": _percentile(latencies, 0.99),
+            "lookups": len(latencies),
+            **counts,
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(n_rows: int, worker_counts):
+    print(f"{'query_workers':>13} {'lookup p50 ms':>14} {'lookup p99 ms':>14} {'lookups':>8} "
+          f"{'broad ok':>9} {'broad 503':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "adae.csv")
+        write_synthetic_csv(n_rows, csv_path)
+        for n in worker_counts:
+            r = measure(csv_path, n)
+            print(f"{n:>13} {r['p50']:>14.1f} {r['p99']:>14.1f} {r['lookups']:>8} "
+                  f"{r['ok']:>9} {r['shed']:>10}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    n_rows = args[0] if args else 1_000_000
+    main(n_rows, args[1:] or [0, 1, 2])
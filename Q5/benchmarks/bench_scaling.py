@@ -0,0 +1,275 @@
+"""
+Benchmark suite: Q5 endpoints and Q6 agent stages on synthetic ADAE data across sizes.
+Run from the Q5 folder:
+  python benchmarks/bench_scaling.py [n_rows ...] [--subjects N] [--seed S] [--term-scale K]
+                                     [--repeat N] [--json OUT] [--compare OLD.json]
+For each size, synth_adae.py writes a seeded dataset (with ACTARM, so arm filters
+have work to do), then fresh interpreters measure:
+  api    main.py through FastAPI's TestClient with the response cache off:
+         /ae-query (severity, arm, both, count_only, a 100-subject page),
+         /subject-risk (random subjects), /subject-risk/batch (1000 subjects),
+         /ae-summary (by AESEV, by AEDECOD);
+  agent  Q6: apply_filter on each labeled question's filters,
+         _get_sample_values_for_column on the MedDRA columns, and
+         clinical_trial_data_agent on the labeled questions, LLM replayed from
+         the synthetic benchmarks/llm_fixture_synthetic.json (replies are the
+         labels; no network), one entry per stage.
+Each operation reports its first (cold) call, then p50/p99/mean over --repeat calls
+(default 50) and throughput (calls per second, one at a time); each process reports
+its load time and peak RSS, also net of an interpreter that only imports the
+libraries. Defaults to 100k and 1M rows; 10M rows over 100k subjects:
+  python benchmarks/bench_scaling.py 10000000 --subjects 100000
+--json writes every result with the settings and git commit; --compare prints the
+p50 ratio of each operation against an earlier --json file.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_q6 = os.path.join(os.path.dirname(_q5), "Q6")
+sys.path.insert(0, os.path.join(_q5, "benchmarks"))
+
+from synth_adae import ARMS, write_synthetic_adae  # noqa: E402
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(first_ms, latencies_ms):
+    return {
+        "calls": len(latencies_ms),
+        "first_ms": None if first_ms is None else round(first_ms, 3),
+        "p50_ms": round(statistics.median(latencies_ms), 3),
+        "p99_ms": round(_percentile(latencies_ms, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies_ms), 3),
+        "throughput_per_s": round(1000 * len(latencies_ms) / max(1e-9, sum(latencies_ms)), 1),
+    }
+
+
+def time_op(fn, repeat: int):
+    """fn(i) once cold, then repeat times; (first ms, [ms, ...])."""
+    t0 = time.perf_counter()
+    fn(0)
+    first = (time.perf_counter() - t0) * 1000
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - t0) * 1000)
+    return first, times
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ============================================================
+# Child processes (one per component and size)
+# ============================================================
+
+def child_baseline(_path: str, _repeat: int) -> dict:
+    import fastapi.testclient  # noqa: F401
+    import numpy  # noqa: F401
+    import pandas  # noqa: F401
+    return {"load_seconds": 0.0, "ops": {}}
+
+
+def child_api(path: str, repeat: int) -> dict:
+    os.environ["ADAE_DATA_PATH"] = path
+    os.environ["RESPONSE_CACHE_SIZE"] = "0"  # time the work, not the cache
+    sys.path.insert(0, _q5)
+    t0 = time.perf_counter()
+    import main
+    load = time.perf_counter() - t0
+    from fastapi.testclient import TestClient
+
+    client = TestClient(main.app)
+    subjects = main._snapshot.index.subject_ids.tolist()
+    rng = random.Random(0)
+
+    def post(path, body):
+        def call(_):
+            r = client.post(path, json=body)
+            assert r.status_code == 200, (path, r.status_code, r.text[:200])
+        return call
+
+    def get(path, **params):
+        def call(_):
+            r = client.get(path, params=params)
+            assert r.status_code == 200, (path, r.status_code, r.text[:200])
+        return call
+
+    def risk(_):
+        r = client.get(f"/subject-risk/{rng.choice(subjects)}")
+        assert r.status_code == 200, r.text[:200]
+
+    ops = {
+        "ae_query severity": post("/ae-query", {"severity": ["SEVERE"]}),
+        "ae_query severity x2": post("/ae-query", {"severity": ["MILD", "MODERATE"]}),
+        "ae_query arm": post("/ae-query", {"treatment_arm": ARMS[0]}),
+        "ae_query severity+arm": post("/ae-query", {"severity": ["SEVERE"], "treatment_arm": ARMS[1]}),
+        "ae_query count_only": post("/ae-query", {"severity": ["MILD", "MODERATE"], "count_only": True}),
+        "ae_query page 100": post("/ae-query", {"severity": ["MODERATE"], "limit": 100}),
+        "subject_risk": risk,
+        "subject_risk batch 1000": post("/subject-risk/batch", {"subject_ids": subjects[:1000]}),
+        "ae_summary AESEV": get("/ae-summary", group_by="AESEV"),
+        "ae_summary AEDECOD": get("/ae-summary", group_by="AEDECOD"),
+    }
+    return {
+        "load_seconds": round(load, 3),
+        "ops": {name: summarize(*time_op(fn, repeat)) for name, fn in ops.items()},
+        "rows": int(main._snapshot.n_rows),
+        "subjects": len(subjects),
+    }
+
+
+def child_agent(path: str, repeat: int) -> dict:
+    os.chdir(_q6)
+    os.environ["ADAE_DATA_PATH"] = path
+    os.environ["ADAE_LLM_BACKEND"] = "replay"
+    os.environ.setdefault("ADAE_LLM_FIXTURE", os.path.join("benchmarks", "llm_fixture_synthetic.json"))
+    os.environ["ADAE_LLM_REPLAY_LATENCY"] = "0"
+    os.environ["ADAE_PARSE_CACHE"] = "off"
+    sys.path.insert(0, _q6)
+    with open(os.path.join("benchmarks", "labeled_questions.json")) as fh:
+        labeled = json.load(fh)
+    import ADAE_ClinicalTrialDataAgent as agent
+    from stage_timer import STAGES
+
+    t0 = time.perf_counter()
+    df = agent.get_adae()
+    load = time.perf_counter() - t0
+
+    filter_sets = [{"filters": item["filters"]} for item in labeled]
+    columns = [c for c in ("AEDECOD", "AETERM", "AELLT", "AESOC") if c in df.columns]
+    ops = {
+        "apply_filter": lambda i: agent.apply_filter(filter_sets[i % len(filter_sets)], df),
+        "_get_sample_values_for_column": lambda i: agent._get_sample_values_for_column(
+            columns[i % len(columns)], df, near="HEADACHE"),
+    }
+    results = {name: summarize(*time_op(fn, repeat)) for name, fn in ops.items()}
+
+    # Whole agent per labeled question; stage timings come from each response
+    stages = {stage: [] for stage in (*STAGES, "total")}
+    first = agent.clinical_trial_data_agent(labeled[0]["question"])["timings"]["total"]
+    rounds = max(1, repeat // len(labeled))
+    for _ in range(rounds):
+        for item in labeled:
+            timings = agent.clinical_trial_data_agent(item["question"])["timings"]
+            for stage in stages:
+                stages[stage].append(timings[stage])
+    for stage, values in stages.items():
+        results[f"agent {stage}"] = summarize(first if stage == "total" else None, values)
+    return {"load_seconds": round(load, 3), "ops": results, "rows": len(df)}
+
+
+CHILDREN = {"baseline": child_baseline, "api": child_api, "agent": child_agent}
+
+
+def run_child(component: str, path: str, repeat: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", component, path, "--repeat", str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+# ============================================================
+# Suite
+# ============================================================
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=_q5, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, old_path: str):
+    with open(old_path) as fh:
+        old = {(r["rows"], r["component"]): r["ops"] for r in json.load(fh)["results"]}
+    print(f"\np50 vs {old_path} (new / old)")
+    for r in results:
+        before = old.get((r["rows"], r["component"]))
+        if before is None:
+            continue
+        for op, s in r["ops"].items():
+            if op in before and before[op]["p50_ms"] > 0:
+                print(f"{r['rows']:>10}  {r['component']:<6} {op:<32} "
+                      f"{before[op]['p50_ms']:>9.3f} -> {s['p50_ms']:>9.3f} ms  x{s['p50_ms'] / before[op]['p50_ms']:.2f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[100_000, 1_000_000])
+    ap.add_argument("--subjects", type=int)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--term-scale", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=50)
+    ap.add_argument("--components", nargs="+", default=["api", "agent"])
+    ap.add_argument("--json")
+    ap.add_argument("--compare")
+    ap.add_argument("--child", nargs=2, metavar=("COMPONENT", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        result = CHILDREN[args.child[0]](args.child[1], args.repeat)
+        result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+        print(json.dumps(result))
+        return
+
+    started = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    base = run_child("baseline", "", 0)["peak_rss_mb"]
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, f"adae_{n}.csv")
+            t0 = time.perf_counter()
+            data = write_synthetic_adae(path, n, n_subjects=args.subjects, seed=args.seed,
+                                        term_scale=args.term_scale, arms=ARMS)
+            print(f"\n{n} rows, {data['subjects']} subjects, {data['distinct_aedecod']} AEDECOD terms "
+                  f"(generated in {time.perf_counter() - t0:.1f} s)")
+            for component in args.components:
+                r = run_child(component, path, args.repeat)
+                r.update(component=component, rows=n, subjects=data["subjects"],
+                         net_rss_mb=round(r["peak_rss_mb"] - base, 1))
+                results.append(r)
+                print(f"  {component}: load {r['load_seconds']:.2f} s, peak RSS {r['peak_rss_mb']:.0f} MB "
+                      f"({r['net_rss_mb']:.0f} MB net)")
+                print(f"  {'operation':<32} {'first ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'per s':>9}")
+                for op, s in r["ops"].items():
+                    first = "" if s["first_ms"] is None else f"{s['first_ms']:.2f}"
+                    print(f"  {op:<32} {first:>9} {s['p50_ms']:>9.2f} {s['p99_ms']:>9.2f} "
+                          f"{s['throughput_per_s']:>9.1f}")
+            os.unlink(path)
+
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({
+                "settings": {k: v for k, v in vars(args).items() if k not in ("child", "json", "compare")},
+                "started": started,
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "baseline_rss_mb": base,
+                "results": results,
+            }, fh, indent=2)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: multi-study shards (study_shards.py), cold loads, routed vs fan-out queries,
+parallel vs one-at-a-time fan-out, and LRU eviction under a memory cap.
+Run from the Q5 folder:  python benchmarks/bench_shards.py [n_studies] [rows_per_study]
+Each study is data/adae.csv tiled to rows_per_study with its own USUBJIDs. Defaults to
+8 studies of 200k rows. The capped run holds about half of the studies, so visiting
+them round-robin reloads a shard on most accesses (the worst case for the LRU).
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_startup import write_synthetic_csv  # noqa: E402
+from study_shards import StudyShards, snapshot_nbytes  # noqa: E402
+
+QUERY = (["SEVERE", "MODERATE"], None)
+
+
+def fan_out(shards: StudyShards, studies) -> int:
+    parts = shards.map(lambda study, snap: len(snap.index.match_rows(*QUERY)), studies)
+    return sum(parts)
+
+
+def _ms(fn, repeat: int = 20) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def main(n_studies: int, rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "base.csv")
+        write_synthetic_csv(rows, base)
+        df = pd.read_csv(base)
+        studies = [f"STUDY{i:02d}" for i in range(n_studies)]
+        for study in studies:
+            df.assign(USUBJID=study + "-" + df["USUBJID"].astype(str)).to_csv(
+                os.path.join(tmp, f"{study}.csv"), index=False)
+        os.unlink(base)
+
+        shards = StudyShards(data_dir=tmp, workers=4)
+        t0 = time.perf_counter()
+        records = fan_out(shards, studies)
+        cold = time.perf_counter() - t0
+        shard_mb = snapshot_nbytes(shards.get(studies[0])) / 2 ** 20
+        print(f"{n_studies} studies x {rows} rows, ~{shard_mb:.0f} MB per shard, {records} matching records")
+        print(f"cold fan-out (loads every shard):  {cold:8.2f} s")
+        print(f"routed query, one study:           {_ms(lambda: fan_out(shards, studies[:1])):8.2f} ms")
+        print(f"fan-out, all studies, 4 workers:   {_ms(lambda: fan_out(shards, studies)):8.2f} ms")
+        serial = StudyShards(data_dir=tmp, workers=1)
+        fan_out(serial, studies)
+        print(f"fan-out, all studies, 1 worker:    {_ms(lambda: fan_out(serial, studies)):8.2f} ms")
+        shards.shutdown()
+        serial.shutdown()
+
+        capped = StudyShards(data_dir=tmp, memory_cap_bytes=int(shard_mb * 2 ** 20 * n_studies / 2), workers=4)
+        t0 = time.perf_counter()
+        for _ in range(2):
+            for study in studies:
+                fan_out(capped, [study])
+        per_access = (time.perf_counter() - t0) / (2 * n_studies)
+        stats = capped.stats()
+        print(f"capped at half, round-robin:       {per_access * 1000:8.2f} ms per access, "
+              f"{stats['loads']} loads, {stats['evictions']} evictions, "
+              f"{stats['loaded_bytes'] / 2 ** 20:.0f} MB held")
+        capped.shutdown()
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 200_000
+    main(n, rows)
@@ -0,0 +1,96 @@
+"""
+Benchmark: cold-start load time and peak RSS, CSV parse vs columnar snapshot.
+Run from the Q5 folder:  python benchmarks/bench_startup.py [n_rows ...]
+Each size tiles data/adae.csv (with fresh USUBJIDs) into a temporary CSV; every
+measurement runs in a fresh interpreter so RSS reflects a real process start.
+Defaults to 100k, 1M and 10M rows (10M needs ~3.5 GB of temp disk). RSS is also
+reported net of an interpreter that only imports pandas/pyarrow. The CSV parse and
+the snapshot build hold the whole parsed CSV (~0.8 GB per million rows); a
+measurement whose process dies (e.g. killed when out of memory) is reported as
+failed and the remaining ones still run.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Optional
+
+import pandas as pd
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, {q5!r})
+t0 = time.perf_counter()
+import pandas as pd
+import pyarrow.feather
+from adae_store import load_adae
+mode, path = sys.argv[1], sys.argv[2]
+if mode == "baseline":
+    df = pd.DataFrame()
+else:
+    df = pd.read_csv(path) if mode == "csv" else load_adae(path)
+elapsed = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": elapsed, "peak_rss_mb": rss_kb / 1024, "rows": len(df)}}))
+"""
+
+
+def write_synthetic_csv(n_rows: int, path: str) -> None:
+    """Tile adae.csv up to n_rows, giving each copy its own USUBJIDs."""
+    src = pd.read_csv(os.path.join(_q5, "data", "adae.csv"))
+    header = True
+    written = 0
+    copy = 0
+    with open(path, "w", newline="") as fh:
+        while written < n_rows:
+            block = src.head(n_rows - written).copy()
+            block["USUBJID"] = block["USUBJID"].astype(str) + f"-{copy:05d}"
+            block.to_csv(fh, index=False, header=header)
+            header = False
+            written += len(block)
+            copy += 1
+
+
+def run(mode: str, path: str) -> Optional[dict]:
+    """Measurement in a fresh interpreter, or None if it died (e.g. killed when out of memory)."""
+    code = _CHILD.format(q5=_q5)
+    proc = subprocess.run([sys.executable, "-c", code, mode, path], capture_output=True, text=True)
+    if proc.returncode != 0:
+        reason = "killed" if proc.returncode < 0 else (proc.stderr.strip().splitlines() or [""])[-1]
+        print(f"{'':>10}  {mode} failed: exit {proc.returncode} ({reason})")
+        return None
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main(sizes):
+    print(f"{'rows':>10}  {'mode':<16} {'seconds':>8} {'peak RSS MB':>12} {'net MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = run("baseline", "")
+        for n in sizes:
+            path = os.path.join(tmp, f"adae_{n}.csv")
+            write_synthetic_csv(n, path)
+            results = [
+                ("csv", run("csv", path)),
+                ("snapshot build", run("snapshot", path)),  # first start writes the snapshot
+                ("snapshot", run("snapshot", path)),        # later starts read it
+            ]
+            for label, r in results:
+                if r is None:
+                    print(f"{n:>10}  {label:<16} {'failed':>8}")
+                    continue
+                r["net_mb"] = r["peak_rss_mb"] - base["peak_rss_mb"]
+                print(f"{n:>10}  {label:<16} {r['seconds']:>8.2f} {r['peak_rss_mb']:>12.1f} {r['net_mb']:>8.1f}")
+            csv, snap = results[0][1], results[2][1]
+            if csv and snap:
+                print(f"{n:>10}  load {csv['seconds'] / snap['seconds']:.1f}x faster, "
+                      f"dataset memory {csv['net_mb'] / snap['net_mb']:.1f}x smaller")
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000, 10_000_000]
+    main(sizes)
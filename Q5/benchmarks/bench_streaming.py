@@ -0,0 +1,90 @@
+"""
+Benchmark: peak memory and time of streaming (chunked) evaluation vs the in-memory snapshot.
+Run from the Q5 folder:  python benchmarks/bench_streaming.py [--budget-mb MB ...] [n_rows ...]
+Each size tiles data/adae.csv as in bench_startup.py. In a fresh interpreter per
+measurement, "memory" loads the snapshot (load_snapshot, a first start that also
+writes the columnar cache) and "scan" the file's subject directory
+(load_scan_snapshot); both then compute the risk table and answer two /ae-query
+bodies. Defaults to 100k, 1M and 5M rows at a 64 MB
+budget; peak RSS is also reported net of an interpreter that only imports pandas.
+Memory-mode memory grows with rows; scan memory with the budget and the number of
+subjects only (tiling adds subjects as it adds rows: ~1M at 5M rows, whose
+directory alone outgrows a 16 MB budget, which then falls back to the smallest
+chunks).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(_q5, "benchmarks"))
+
+from bench_startup import write_synthetic_csv  # noqa: E402
+
+_CHILD = r"""
+import json, resource, sys, time
+sys.path.insert(0, {q5!r})
+import pandas as pd
+mode, path, budget_mb = sys.argv[1], sys.argv[2], float(sys.argv[3])
+weights = {{"MILD": 1, "MODERATE": 3, "SEVERE": 5}}
+categorize = lambda s: "Low" if s < 5 else "Medium" if s < 15 else "High"
+t0 = time.perf_counter()
+if mode == "memory":
+    from ae_index import RiskTable
+    from ae_queries import ae_query_job
+    from dataset import load_snapshot
+    snap = load_snapshot(path)
+    load = time.perf_counter() - t0
+    RiskTable(snap.index, weights, categorize)
+    counts = [ae_query_job(snap, ["SEVERE"], None, True)["unique_subject_count"],
+              ae_query_job(snap, ["MILD"], "Placebo", True)["unique_subject_count"]]
+elif mode == "scan":
+    from ae_scan import ScanRiskTable, load_scan_snapshot, scan_ae_queries
+    snap = load_scan_snapshot(path, int(budget_mb * 2 ** 20))
+    load = time.perf_counter() - t0
+    ScanRiskTable(snap, weights, categorize)
+    counts = [q.body(snap, True)["unique_subject_count"]
+              for q in scan_ae_queries(snap, [(["SEVERE"], None), (["MILD"], "Placebo")])]
+else:
+    load, counts = 0.0, []
+elapsed = time.perf_counter() - t0
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"load_seconds": load, "seconds": elapsed, "peak_rss_mb": rss_kb / 1024, "counts": counts}}))
+"""
+
+
+def run(mode: str, path: str, budget_mb: float) -> dict:
+    code = _CHILD.format(q5=_q5)
+    out = subprocess.run([sys.executable, "-c", code, mode, path, str(budget_mb)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("sizes", nargs="*", type=int, default=[100_000, 1_000_000, 5_000_000])
+    ap.add_argument("--budget-mb", type=float, nargs="+", default=[64])
+    args = ap.parse_args()
+
+    print(f"{'rows':>10}  {'mode':<14} {'load s':>7} {'total s':>8} {'peak RSS MB':>12} {'net MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = run("baseline", "", 0)
+        for n in args.sizes:
+            path = os.path.join(tmp, f"adae_{n}.csv")
+            write_synthetic_csv(n, path)
+            results = [("memory", run("memory", path, 0))]
+            results += [(f"scan {b:g} MB", run("scan", path, b)) for b in args.budget_mb]
+            for label, r in results:
+                assert r["counts"] == results[0][1]["counts"], f"{label} answers differ"
+                r["net_mb"] = r["peak_rss_mb"] - base["peak_rss_mb"]
+                print(f"{n:>10}  {label:<14} {r['load_seconds']:>7.2f} {r['seconds']:>8.2f} "
+                      f"{r['peak_rss_mb']:>12.1f} {r['net_mb']:>8.1f}")
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Harness: memory per uvicorn worker, private dataset copies vs ADAE_SHARED_MEMORY=1.
+Run from the Q5 folder:  python benchmarks/bench_workers.py [n_rows] [workers ...]
+Starts `uvicorn main:app --workers N` on a synthetic CSV (data/adae.csv tiled to
+n_rows, default 1M), warms every worker with a few broad queries, then reads each
+worker's RSS, PSS (shared pages split between the processes mapping them) and USS
+(private pages) from /proc/<pid>/smaps_rollup. Linux only.
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from bench_startup import write_synthetic_csv
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid: int):
+    out = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as fh:
+                fields = fh.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) != pid:
+            continue
+        # multiprocessing's resource tracker is a child too, but not a worker
+        with open(f"/proc/{entry}/cmdline", "rb") as fh:
+            if b"resource_tracker" in fh.read():
+                continue
+        out.append(int(entry))
+    return out
+
+
+def _workers(proc: subprocess.Popen):
+    # With --workers 1 uvicorn serves from the launching process itself
+    return _children(proc.pid) or [proc.pid]
+
+
+def memory_kb(pid: int) -> dict:
+    """RSS, PSS and USS of a process in kB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "uss": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def _request(port: int, path: str, body=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data,
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=60) as resp:
+        return resp.read()
+
+
+def measure(csv_path: str, workers: int, shared: bool, timeout: float = 600) -> list:
+    port = _free_port()
+    env = dict(os.environ, ADAE_DATA_PATH=csv_path, ADAE_SHARED_MEMORY="1" if shared else "0",
+               RESPONSE_CACHE_SIZE="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        cwd=_q5, env=env,
+    )
+    try:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                _request(port, "/")
+                break
+            except OSError:
+                if time.time() > deadline or proc.poll() is not None:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.5)
+        # Let every worker finish loading: wait until no worker's memory changes for 3s
+        last, stable_since = None, time.time()
+        while time.time() - stable_since < 3 and time.time() < deadline:
+            pids = sorted(_workers(proc))
+            snapshot = [memory_kb(p)["rss"] // 10240 for p in pids]
+            if snapshot != last or len(pids) < workers:
+                last, stable_since = snapshot, time.time()
+            time.sleep(0.5)
+        # Broad queries spread over the workers so index pages are faulted in
+        for _ in range(4 * workers):
+            _request(port, "/ae-query", {"severity": ["MILD", "MODERATE", "SEVERE"], "count_only": True})
+            _request(port, "/subject-risk/batch", {"subject_ids": "all"})
+        return [memory_kb(p) for p in _workers(proc)]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(n_rows: int, worker_counts):
+    print(f"{'workers':>7}  {'mode':<8} {'RSS/worker MB':>14} {'PSS/worker MB':>14} "
+          f"{'USS/worker MB':>14} {'total PSS MB':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "adae.csv")
+        write_synthetic_csv(n_rows, csv_path)
+        for shared in (False, True):
+            for n in worker_counts:
+                stats = measure(csv_path, n, shared)
+                mean = {k: sum(s[k] for s in stats) / len(stats) / 1024 for k in ("rss", "pss", "uss")}
+                total_pss = sum(s["pss"] for s in stats) / 1024
+                print(f"{n:>7}  {'shared' if shared else 'private':<8} {mean['rss']:>14.1f} "
+                      f"{mean['pss']:>14.1f} {mean['uss']:>14.1f} {total_pss:>13.1f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    n_rows = args[0] if args else 1_000_000
+    main(n_rows, args[1:] or [1, 2, 4, 8])
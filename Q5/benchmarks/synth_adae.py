@@ -0,0 +1,139 @@
+"""
+Seeded synthetic ADAE data at any scale, shaped like data/adae.csv.
+Run from the Q5 folder:
+  python benchmarks/synth_adae.py OUT.csv|OUT.parquet --rows N [--subjects N] [--seed S]
+                                  [--term-scale K] [--arms]
+Same columns and types as adae.csv. Events per subject follow adae.csv's
+distribution, scaled to rows/subjects when --subjects is given (10M rows over 100k
+subjects is ~100 events each, with the same spread); otherwise the subject count
+follows from adae.csv's mean. Every event is an adae.csv event drawn at random with
+its whole row (MedDRA terms, severity, seriousness, outcome, dates), so term
+frequencies and the severity mix match adae.csv; --term-scale K splits each
+AETERM/AELLT/AEDECOD into K variants (" V1", " V2", ...) to multiply MedDRA
+cardinality by K. --arms adds an ACTARM (one of the pilot study's arms per
+subject), which adae.csv lacks. Written in chunks, so 10M+ rows need little
+memory; the same arguments and seed give the same file.
+"""
+
+import argparse
+import os
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+_q5 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(_q5, "data", "adae.csv")
+
+ARMS = ["Placebo", "Xanomeline High Dose", "Xanomeline Low Dose"]
+TERM_COLUMNS = ["AETERM", "AELLT", "AEDECOD"]
+
+
+def events_per_subject(
+    observed: np.ndarray,
+    n_rows: int,
+    n_subjects: Optional[int],
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Events for each subject: drawn from observed, scaled to sum to exactly n_rows."""
+    if n_subjects is None:
+        n_subjects = max(1, round(n_rows / observed.mean()))
+    if n_subjects > n_rows:
+        raise ValueError(f"{n_subjects} subjects need at least as many rows (got {n_rows}).")
+    counts = rng.choice(observed, n_subjects).astype(float)
+    counts *= n_rows / counts.sum()
+    counts = np.maximum(1, np.floor(counts + rng.random(n_subjects))).astype(np.int64)
+    # Rounding leaves the total a little off; spread the difference over random subjects
+    diff = n_rows - int(counts.sum())
+    while diff > 0:
+        np.add.at(counts, rng.integers(0, n_subjects, diff), 1)
+        diff = n_rows - int(counts.sum())
+    while diff < 0:
+        spare = np.flatnonzero(counts > 1)
+        counts[rng.choice(spare, min(-diff, len(spare)), replace=False)] -= 1
+        diff = n_rows - int(counts.sum())
+    return counts
+
+
+def iter_synthetic_adae(
+    n_rows: int,
+    n_subjects: Optional[int] = None,
+    seed: int = 0,
+    term_scale: int = 1,
+    arms: Optional[Sequence[str]] = None,
+    chunk_rows: int = 500_000,
+    source: str = SOURCE,
+) -> Iterator[pd.DataFrame]:
+    """Frames of about chunk_rows rows, whole subjects each, in USUBJID order."""
+    src = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    counts = events_per_subject(src.groupby("USUBJID").size().to_numpy(), n_rows, n_subjects, rng)
+    subject_arms = rng.integers(0, len(arms), len(counts)) if arms else None
+    ends = np.cumsum(counts)
+    cuts = np.searchsorted(ends, np.arange(chunk_rows, n_rows, chunk_rows)) + 1
+    bounds = [0, *sorted(set(cuts.tolist()) - {0, len(counts)}), len(counts)]
+    for first, last in zip(bounds, bounds[1:]):
+        c = counts[first:last]
+        n = int(c.sum())
+        subj = np.repeat(np.arange(first, last), c)
+        block = src.iloc[rng.integers(0, len(src), n)].reset_index(drop=True)
+        block["USUBJID"] = pd.Series(subj).map("SYN-{:07d}".format)
+        block["AESEQ"] = np.arange(n) - np.repeat(np.cumsum(c) - c, c) + 1
+        if term_scale > 1:
+            variant = rng.integers(0, term_scale, n)
+            suffix = pd.Series(np.char.add(" V", variant.astype(str))).where(variant > 0, "")
+            for col in TERM_COLUMNS:
+                block[col] = block[col].where(block[col].isna(), block[col] + suffix)
+        if arms:
+            block["ACTARM"] = np.asarray(arms, dtype=object)[subject_arms[subj]]
+        yield block
+
+
+def write_synthetic_adae(path: str, n_rows: int, **kwargs) -> Dict[str, object]:
+    """Write iter_synthetic_adae(n_rows, **kwargs) to a CSV, or Parquet by extension; returns a summary."""
+    parquet = path.lower().endswith((".parquet", ".pq"))
+    writer = None
+    subjects = 0
+    severity: Dict[str, int] = {}
+    terms = set()
+    for i, block in enumerate(iter_synthetic_adae(n_rows, **kwargs)):
+        if parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            if writer is None:
+                # A text column empty throughout the first chunk is typed null; make it text
+                schema = pa.schema([
+                    f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in table.schema
+                ])
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table.cast(writer.schema))
+        else:
+            block.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+        subjects += block["USUBJID"].nunique()  # chunks hold whole subjects
+        for sev, count in block["AESEV"].value_counts(dropna=False).items():
+            severity[str(sev)] = severity.get(str(sev), 0) + int(count)
+        terms.update(block["AEDECOD"].dropna().unique())
+    if writer is not None:
+        writer.close()
+    return {"rows": n_rows, "subjects": subjects, "distinct_aedecod": len(terms), "severity": severity}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("out")
+    ap.add_argument("--rows", type=int, required=True)
+    ap.add_argument("--subjects", type=int)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--term-scale", type=int, default=1)
+    ap.add_argument("--arms", action="store_true")
+    args = ap.parse_args()
+    summary = write_synthetic_adae(
+        args.out, args.rows, n_subjects=args.subjects, seed=args.seed,
+        term_scale=args.term_scale, arms=ARMS if args.arms else None,
+    )
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""
+Immutable dataset snapshots for the Clinical Trial Data API.
+A snapshot bundles the ADAE frame with the structures derived from it and a
+version number. Reloading never mutates a published snapshot: it builds a new
+one (reading only the bytes appended to the CSV when possible) that the caller
+swaps in with a single assignment.
+"""
+
+import io
+import os
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from adae_store import append_rows, load_adae, to_columnar
+from ae_cube import AECube
+from ae_index import AEIndex
+
+REQUIRED_COLUMNS = ["USUBJID", "AESEV"]
+
+# Bytes just before the ingested offset that must be unchanged for an append-only reload
+_GUARD_BYTES = 4096
+
+
+class SourceState:
+    """Where a snapshot stopped reading its CSV: byte offset plus bytes to detect rewrites."""
+
+    def __init__(self, path: str, offset: int, mtime_ns: int, header: bytes, guard: bytes):
+        self.path = path
+        self.offset = offset
+        self.mtime_ns = mtime_ns
+        self.header = header
+        self.guard = guard
+
+    @classmethod
+    def read(cls, path: str, offset: int, mtime_ns: int) -> "SourceState":
+        with open(path, "rb") as fh:
+            header = fh.readline()
+            start = max(0, offset - _GUARD_BYTES)
+            fh.seek(start)
+            guard = fh.read(offset - start)
+        return cls(path, offset, mtime_ns, header, guard)
+
+    @classmethod
+    def from_bytes(cls, path: str, data: bytes, mtime_ns: int) -> "SourceState":
+        """State after ingesting exactly data, the file's first len(data) bytes."""
+        header = data[:data.find(b"\n") + 1]
+        return cls(path, len(data), mtime_ns, header, data[-_GUARD_BYTES:])
+
+    @property
+    def identity(self) -> str:
+        """The file state this snapshot holds; the same in any process that read the same bytes."""
+        return f"{os.path.abspath(self.path)}:{self.offset}:{self.mtime_ns}"
+
+    def changed(self) -> bool:
+        st = os.stat(self.path)
+        return st.st_size != self.offset or st.st_mtime_ns != self.mtime_ns
+
+    def is_append_only(self) -> bool:
+        """True when the file only grew past offset and the ingested bytes are intact."""
+        st = os.stat(self.path)
+        if st.st_size < self.offset:
+            return False
+        with open(self.path, "rb") as fh:
+            if fh.readline() != self.header:
+                return False
+            fh.seek(self.offset - len(self.guard))
+            return fh.read(len(self.guard)) == self.guard
+
+
+class DatasetSnapshot:
+    """
+    One published state of the dataset. Treat as read-only once handed to requests.
+    Derived per-snapshot structures (risk table, ...) are attached before publishing.
+    shared_dir is the directory of memory-mapped artifacts it was attached from, if any.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        has_arm: bool,
+        index: AEIndex,
+        cube: AECube,
+        version: int,
+        source: SourceState,
+        appended_rows: int = 0,
+    ):
+        self.df = df
+        self.has_arm = has_arm
+        self.index = index
+        self.cube = cube
+        self.version = version
+        self.source = source
+        self.appended_rows = appended_rows
+        self.risk_table = None
+        self.shared_dir: Optional[str] = None
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.df)
+
+    @property
+    def source_id(self) -> str:
+        return self.source.identity
+
+
+def prepare_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, bool]:
+    """Upper-case column names and validate; returns (df, has_actarm)."""
+    df.columns = df.columns.str.upper()
+    for col in REQUIRED_COLUMNS:
+        if col not in df.columns:
+            raise ValueError(f"Missing required column: {col}")
+    has_arm = "ACTARM" in df.columns
+    if not has_arm:
+        df["ACTARM"] = ""
+    return df, has_arm
+
+
+def _ends_with_newline(csv_path: str, size: int) -> bool:
+    with open(csv_path, "rb") as fh:
+        fh.seek(max(0, size - 1))
+        return fh.read(1) == b"\n"
+
+
+def _read_complete_lines(csv_path: str) -> Tuple[pd.DataFrame, SourceState]:
+    """
+    Parse the file through its last newline (a writer may be mid-line), as load_adae
+    would without its cache; the source state is that of the bytes parsed.
+    """
+    with open(csv_path, "rb") as fh:
+        data = fh.read()
+        mtime_ns = os.fstat(fh.fileno()).st_mtime_ns
+    data = data[:data.rfind(b"\n") + 1]
+    return to_columnar(pd.read_csv(io.BytesIO(data))), SourceState.from_bytes(csv_path, data, mtime_ns)
+
+
+def load_snapshot(csv_path: str, version: int = 1) -> DatasetSnapshot:
+    """Full load of csv_path into a new snapshot."""
+    # A complete, unchanging file goes through the columnar cache; a file with a partial
+    # last line or that keeps changing is parsed from one read of its complete lines
+    source = None
+    for _ in range(3):
+        before = os.stat(csv_path)
+        if not _ends_with_newline(csv_path, before.st_size):
+            break
+        df = load_adae(csv_path)
+        after = os.stat(csv_path)
+        if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+            source = SourceState.read(csv_path, after.st_size, after.st_mtime_ns)
+            break
+    if source is None:
+        df, source = _read_complete_lines(csv_path)
+    df, has_arm = prepare_frame(df)
+    index = AEIndex(df, has_arm=has_arm)
+    cube = AECube.build(df, index.subject_codes)
+    return DatasetSnapshot(df, has_arm, index, cube, version, source)
+
+
+def _read_tail(source: SourceState) -> Tuple[Optional[pd.DataFrame], int]:
+    """Parse complete lines appended after source.offset; returns (rows or None, new offset)."""
+    with open(source.path, "rb") as fh:
+        fh.seek(source.offset)
+        data = fh.read()
+    # A writer may be mid-line: only consume through the last newline
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        return None, source.offset
+    tail = pd.read_csv(io.BytesIO(source.header + data[:end]))
+    return tail, source.offset + end
+
+
+def refresh_snapshot(snapshot: DatasetSnapshot, full: bool = False) -> DatasetSnapshot:
+    """
+    Snapshot reflecting the CSV's current contents, or `snapshot` itself if unchanged.
+    Appended rows are ingested incrementally; any other change triggers a full load.
+    """
+    source = snapshot.source
+    if not full and not source.changed():
+        return snapshot
+    # Same size with a new mtime is an in-place rewrite we cannot diff
+    st = os.stat(source.path)
+    if full or st.st_size == source.offset or not source.is_append_only():
+        return load_snapshot(source.path, version=snapshot.version + 1)
+
+    tail, offset = _read_tail(source)
+    if tail is None:
+        return snapshot  # only a partial line so far; pick it up next time
+    st = os.stat(source.path)
+
+    # Same header bytes as the loaded file, so columns and has_arm line up
+    tail, _ = prepare_frame(tail)
+    df = append_rows(snapshot.df, tail)
+    index = snapshot.index.extend(tail)
+    cube = snapshot.cube.extend(tail, index.subject_codes[snapshot.n_rows:])
+    new_source = SourceState.read(source.path, offset, st.st_mtime_ns)
+    return DatasetSnapshot(df, snapshot.has_arm, index, cube, snapshot.version + 1,
+                           new_source, appended_rows=len(tail))
+
@@ -1,40 +1,118 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-import pandas as pd
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Query
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field
+from typing import Any, Callable, Dict, Hashable, List, Literal, Optional, Union
+import inspect
+import itertools
+import json
+import logging
 import os
+import threading
+import time
+
+import numpy as np
+
+from ae_index import RiskTable
+from ae_queries import ae_query_batch_job, ae_query_body, ae_query_job
+from ae_scan import (
+    ScanRiskTable, ScanSnapshot, SourceChanged, load_scan_snapshot, refresh_scan_snapshot, scan_ae_queries,
+)
+from dataset import DatasetSnapshot, load_snapshot, refresh_snapshot
+from metrics import (
+    LOAD_BUCKETS, SIZE_BUCKETS, STAGE_BUCKETS, Counter, Gauge, Histogram, MetricsMiddleware, Registry,
+    SlowRequestProfiler, add_process_metrics, bind_thread, record_size, stage,
+)
+from query_pool import Overloaded, QueryPool
+from response_cache import ResponseCache, etag_matches, make_etag
+from shared_snapshot import attach_snapshot, refresh_shared_snapshot, shared_risk_table
+from study_shards import StudyShards, merge_summaries
 
 # ============================================================
 # 1️⃣ App Initialization
 # ============================================================
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    _start_watcher()
+    if query_pool is not None:
+        query_pool.warm()
+    yield
+    _stop_watcher.set()
+    if query_pool is not None:
+        query_pool.shutdown()
+    if shards is not None:
+        shards.shutdown()
+
+
 app = FastAPI(
     title="Clinical Trial Data API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=_lifespan,
 )
 
+
+class _BoundRoute(APIRoute):
+    """Route whose (sync) endpoint marks its threadpool thread as the request's, for the slow-request profiler."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = bind_thread(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+app.router.route_class = _BoundRoute
+
 # ============================================================
 # 2️⃣ Load Dataset
 # ============================================================
 
-# Path relative to this file so it works from Q5 or project root
+# Path relative to this file so it works from Q5 or project root (ADAE_DATA_PATH overrides)
 _here = os.path.dirname(os.path.abspath(__file__))
-DATA_PATH = os.path.join(_here, "data", "adae.csv")
+DATA_PATH = os.getenv("ADAE_DATA_PATH") or os.path.join(_here, "data", "adae.csv")
 
-if not os.path.exists(DATA_PATH):
-    raise FileNotFoundError("adae.csv not found.")
+# ADAE_SHARED_MEMORY=1: build the table and indexes once and memory-map them in every
+# uvicorn worker (see shared_snapshot.py) instead of each worker loading its own copy
+SHARED_MEMORY = os.getenv("ADAE_SHARED_MEMORY", "0") == "1"
+
+# ADAE_STREAMING=1: never hold the table; every query scans the file (CSV or Parquet) in
+# chunks sized to ADAE_MEMORY_BUDGET_MB (see ae_scan.py and section 10). For files larger
+# than memory; overrides ADAE_SHARED_MEMORY and QUERY_WORKERS.
+STREAMING = os.getenv("ADAE_STREAMING", "0") == "1"
+MEMORY_BUDGET_MB = float(os.getenv("ADAE_MEMORY_BUDGET_MB", "256"))
 
-df = pd.read_csv(DATA_PATH)
-df.columns = df.columns.str.upper()
+# ADAE_DATA_DIR (every *.csv in it, study id = file name) or ADAE_MANIFEST (JSON object
+# {study id: CSV path}): serve many studies, picked per request with study_id. Each study
+# is loaded on first use and the least recently used ones are dropped while the loaded
+# studies exceed ADAE_SHARD_MEMORY_MB (see study_shards.py and section 11). Overrides
+# ADAE_DATA_PATH, ADAE_SHARED_MEMORY, ADAE_STREAMING and QUERY_WORKERS.
+STUDY_DIR = os.getenv("ADAE_DATA_DIR")
+STUDY_MANIFEST = os.getenv("ADAE_MANIFEST")
+SHARDED = bool(STUDY_DIR or STUDY_MANIFEST)
+SHARD_MEMORY_MB = float(os.getenv("ADAE_SHARD_MEMORY_MB", "2048"))
+SHARD_WORKERS = int(os.getenv("ADAE_SHARD_WORKERS", "4"))
 
-# Ensure required columns exist (ACTARM optional - add placeholder if missing)
-REQUIRED_COLUMNS = ["USUBJID", "AESEV"]
-for col in REQUIRED_COLUMNS:
-    if col not in df.columns:
-        raise ValueError(f"Missing required column: {col}")
-HAS_ACTARM = "ACTARM" in df.columns
-if not HAS_ACTARM:
-    df["ACTARM"] = ""
+if not SHARDED and not os.path.exists(DATA_PATH):
+    raise FileNotFoundError("adae.csv not found.")
+
+# Parsed once into a columnar snapshot under data/.cache; later starts read that instead.
+# Column names are upper-cased; ACTARM gets an empty placeholder when missing.
+# Handlers read _snapshot once per request; reloads replace it atomically (section 6).
+_load_started = time.perf_counter()
+shards: Optional[StudyShards] = None
+if SHARDED:
+    shards = StudyShards(STUDY_DIR, STUDY_MANIFEST, int(SHARD_MEMORY_MB * 2 ** 20), SHARD_WORKERS)
+    if not shards.studies():
+        raise FileNotFoundError("No ADAE studies found in ADAE_DATA_DIR / ADAE_MANIFEST.")
+    _snapshot = None
+elif STREAMING:
+    _snapshot: Union[DatasetSnapshot, ScanSnapshot] = load_scan_snapshot(DATA_PATH, int(MEMORY_BUDGET_MB * 2 ** 20))
+elif SHARED_MEMORY:
+    _snapshot = attach_snapshot(DATA_PATH)
+else:
+    _snapshot = load_snapshot(DATA_PATH)
+_load_seconds = time.perf_counter() - _load_started  # reported by /metrics (section 12)
 
 
 # ============================================================
@@ -43,7 +121,16 @@ if not HAS_ACTARM:
 
 @app.get("/")
 def root():
-    return {"message": "Clinical Trial Data API is running"}
+    if SHARDED:
+        return {
+            "message": "Clinical Trial Data API is running",
+            "dataset_version": shards.version,
+            "studies": shards.studies(),
+        }
+    return {
+        "message": "Clinical Trial Data API is running",
+        "dataset_version": _snapshot.version,
+    }
 
 
 # ============================================================
@@ -53,32 +140,141 @@ def root():
 class AEQueryRequest(BaseModel):
     severity: Optional[List[str]] = None
     treatment_arm: Optional[str] = None
+    # Pagination: subjects ordered by first appearance in the dataset; pass the
+    # previous page's next_after as `after` to continue
+    limit: Optional[int] = Field(None, ge=1)
+    after: Optional[str] = None
+    # Counts only, no subject list
+    count_only: bool = False
+    # NDJSON stream of {"subject_id": ...} lines instead of one JSON body
+    stream: bool = False
+    # Sharded mode: one study, a list of studies, or None for every study (section 11)
+    study_id: Optional[Union[str, List[str]]] = None
+
+
+# Subjects rendered per chunk of a streamed response
+STREAM_BATCH_SIZE = 1000
+
+
+def _ae_query_key(request: AEQueryRequest) -> Hashable:
+    """Requests with the same severity set and arm (any case/order) share one result."""
+    severity = tuple(sorted({s.strip().upper() for s in request.severity})) if request.severity else None
+    arm = request.treatment_arm.strip().upper() if request.treatment_arm else None
+    if request.count_only:
+        return ("ae-query", severity, arm, "count")
+    return ("ae-query", severity, arm, request.limit, request.after)
+
+
+def _stream_subjects(snap: DatasetSnapshot, codes):
+    for start in range(0, len(codes), STREAM_BATCH_SIZE):
+        batch = snap.index.labels(codes[start:start + STREAM_BATCH_SIZE])
+        yield "".join(json.dumps({"subject_id": s}) + "\n" for s in batch)
+
+
+def _resolve_after(snap: DatasetSnapshot, request: AEQueryRequest) -> Optional[int]:
+    """Subject ordinal for the request's `after` cursor (400 if the subject is unknown)."""
+    if request.after is None:
+        return None
+    after = snap.index.subject_ordinal(request.after)
+    if after is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown 'after' cursor: subject {request.after!r} not in dataset."
+        )
+    return after
 
 
 @app.post("/ae-query")
-def ae_query(request: AEQueryRequest):
+def ae_query(
+    request: AEQueryRequest,
+    if_none_match: Optional[str] = Header(None),
+):
 
-    filtered_df = df.copy()
+    if SHARDED:
+        return shard_ae_query(request, if_none_match)
+    _single_dataset(request.study_id)
+    if STREAMING:
+        return scan_ae_query(request, if_none_match)
 
-    # Filter by severity (AESEV)
-    if request.severity:
-        severity_values = [s.upper() for s in request.severity]
-        filtered_df = filtered_df[
-            filtered_df["AESEV"].str.upper().isin(severity_values)
-        ]
+    snap = _snapshot
+    after = _resolve_after(snap, request)
 
-    # Filter by treatment arm (ACTARM) only when dataset has real ACTARM data
-    if request.treatment_arm and HAS_ACTARM:
-        arm_vals = filtered_df["ACTARM"].astype(str).str.upper()
-        filtered_df = filtered_df[arm_vals == request.treatment_arm.upper()]
+    # Severity (AESEV) and treatment arm (ACTARM) resolved against the index;
+    # arm is ignored by the index when the dataset has no real ACTARM data
+    if request.stream and not request.count_only:
+        rows = snap.index.match_rows(request.severity, request.treatment_arm)
+        if request.limit is not None or after is not None:
+            codes, _, _ = snap.index.subject_page(rows, request.limit, after)
+        else:
+            codes = snap.index.subject_codes_for(rows)
+        record_size("records", len(rows))
+        record_size("subjects", len(codes))
+        return StreamingResponse(
+            _stream_subjects(snap, codes),
+            media_type="application/x-ndjson",
+            headers={
+                "X-Dataset-Version": str(snap.version),
+                "X-Matching-Record-Count": str(len(rows)),
+            },
+        )
 
-    unique_subjects = filtered_df["USUBJID"].unique().tolist()
+    def compute():
+        # Cost grows with the rows matched; broad queries go to the query pool (section 9)
+        estimate = snap.index.estimate_rows(request.severity, request.treatment_arm)
+        return run_query(
+            snap, estimate, ae_query_job,
+            request.severity, request.treatment_arm, request.count_only, request.limit, after,
+        )
 
-    return {
-        "matching_record_count": len(filtered_df),
-        "unique_subject_count": len(unique_subjects),
-        "subjects": unique_subjects
-    }
+    return cached_response(snap, _ae_query_key(request), if_none_match, compute)
+
+
+class AEQueryBatchRequest(BaseModel):
+    queries: List[AEQueryRequest]
+    # NDJSON, one result line per query as it is evaluated
+    stream: bool = False
+
+
+def _ndjson(items):
+    for item in items:
+        yield json.dumps(item) + "\n"
+
+
+@app.post("/ae-query/batch")
+def ae_query_batch(batch: AEQueryBatchRequest):
+
+    if SHARDED:
+        return shard_ae_query_batch(batch)
+    for q in batch.queries:
+        _single_dataset(q.study_id)
+    if STREAMING:
+        return scan_ae_query_batch(batch)
+
+    # Every query is answered from the same snapshot; severity unions and
+    # arm intersections are shared between queries with the same filters
+    snap = _snapshot
+    queries = [
+        (q.severity, q.treatment_arm, q.count_only, q.limit, _resolve_after(snap, q))
+        for q in batch.queries
+    ]
+
+    if batch.stream:
+        matches = snap.index.match_many((q[0], q[1]) for q in queries)
+
+        def results():
+            for i, (q, rows) in enumerate(zip(queries, matches)):
+                yield {"query_index": i, **ae_query_body(snap, rows, *q[2:])}
+
+        return StreamingResponse(
+            _ndjson(results()),
+            media_type="application/x-ndjson",
+            headers={"X-Dataset-Version": str(snap.version)},
+        )
+    estimate = sum(snap.index.estimate_rows(q[0], q[1]) for q in queries)
+    body = run_query(snap, estimate, ae_query_batch_job, queries)
+    if isinstance(body, bytes):
+        return Response(body, media_type="application/json")
+    return body
 
 
 # ============================================================
@@ -92,32 +288,772 @@ SEVERITY_WEIGHTS = {
 }
 
 
+def categorize_risk(risk_score: int) -> str:
+    if risk_score < 5:
+        return "Low"
+    elif 5 <= risk_score < 15:
+        return "Medium"
+    return "High"
+
+
+def get_risk_table(snap: Union[DatasetSnapshot, ScanSnapshot]) -> Union[RiskTable, ScanRiskTable]:
+    """Scores for every subject in snap; rebuilt when SEVERITY_WEIGHTS change."""
+    table = snap.risk_table
+    if isinstance(snap, ScanSnapshot):
+        if table is None or not table.is_current(snap, SEVERITY_WEIGHTS):
+            table = ScanRiskTable(snap, SEVERITY_WEIGHTS, categorize_risk)  # one pass over the file
+            snap.risk_table = table
+        return table
+    if table is None or not table.is_current(snap.index, SEVERITY_WEIGHTS):
+        if snap.shared_dir is not None:  # built once, memory-mapped by every worker
+            table = shared_risk_table(snap, SEVERITY_WEIGHTS, categorize_risk)
+        else:
+            table = RiskTable(snap.index, SEVERITY_WEIGHTS, categorize_risk)
+        snap.risk_table = table
+    return table
+
+
+if _snapshot is not None:
+    get_risk_table(_snapshot)  # build at startup so the first request is a plain lookup
+
+
 @app.get("/subject-risk/{subject_id}")
-def subject_risk(subject_id: str):
+def subject_risk(
+    subject_id: str,
+    study_id: Optional[List[str]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
+
+    if SHARDED:
+        return shard_subject_risk(subject_id, study_id, if_none_match)
+    _single_dataset(study_id)
+    snap = _snapshot
+    with stage("risk_table"):
+        table = get_risk_table(snap)
+
+    def compute():
+        with stage("lookup"):
+            entry = table.lookup(subject_id)
+
+        if entry is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Subject not found."
+            )
+
+        risk_score, risk_category = entry
+
+        return {
+            "subject_id": subject_id,
+            "risk_score": risk_score,
+            "risk_category": risk_category,
+            "dataset_version": snap.version,
+        }
+
+    key = ("subject-risk", subject_id, table.weights_key)
+    return cached_response(snap, key, if_none_match, compute)
+
+
+class SubjectRiskBatchRequest(BaseModel):
+    # Repeated ids are answered once, in order of first appearance
+    subject_ids: Union[Literal["all"], List[str]]
+    # NDJSON, one line per subject
+    stream: bool = False
+    # Sharded mode: studies searched, in order (None: every study)
+    study_id: Optional[Union[str, List[str]]] = None
+
+
+@app.post("/subject-risk/batch")
+def subject_risk_batch(batch: SubjectRiskBatchRequest):
+
+    if SHARDED:
+        return shard_subject_risk_batch(batch)
+    _single_dataset(batch.study_id)
+    snap = _snapshot
+    ids = None if batch.subject_ids == "all" else list(dict.fromkeys(batch.subject_ids))
+    with stage("lookup"):
+        found, scores, categories, missing = get_risk_table(snap).lookup_many(ids)
+    record_size("subjects", len(found))
+
+    def results():
+        for subject_id, risk_score, risk_category in zip(found, scores, categories):
+            yield {
+                "subject_id": subject_id,
+                "risk_score": risk_score,
+                "risk_category": risk_category,
+            }
+
+    if batch.stream:
+        not_found = ({"subject_id": s, "error": "Subject not found."} for s in missing)
+        return StreamingResponse(
+            _ndjson(itertools.chain(results(), not_found)),
+            media_type="application/x-ndjson",
+            headers={"X-Dataset-Version": str(snap.version)},
+        )
+    return {
+        "results": list(results()),
+        "not_found": missing,
+        "dataset_version": snap.version,
+    }
+
+
+# ============================================================
+# 6️⃣ Dataset Reload
+# ============================================================
+
+# Seconds between checks of adae.csv for changes; 0 disables the watcher
+WATCH_INTERVAL = float(os.getenv("ADAE_WATCH_INTERVAL", "0"))
+
+_reload_lock = threading.Lock()
+_stop_watcher = threading.Event()
+
+logger = logging.getLogger(__name__)
+
+
+def reload_dataset(full: bool = False) -> DatasetSnapshot:
+    """
+    Ingest changes to adae.csv (appended rows only, unless full or the file was rewritten),
+    build the new snapshot's derived tables, then swap it in with one assignment.
+    """
+    global _snapshot
+    with _reload_lock:
+        if SHARDED:
+            _reload_shards(full)
+            return _snapshot
+        if STREAMING:
+            refresh = refresh_scan_snapshot
+        else:
+            refresh = refresh_shared_snapshot if SHARED_MEMORY else refresh_snapshot
+        started = time.perf_counter()
+        try:
+            new = refresh(_snapshot, full=full)
+            if new is not _snapshot:
+                get_risk_table(new)
+        except Exception:
+            dataset_reloads.inc(1, "failed")
+            raise
+        changed = new is not _snapshot
+        _snapshot = new
+        _record_reload(time.perf_counter() - started, changed, new.appended_rows if changed else 0)
+        return _snapshot
+
+
+def _watch():
+    while not _stop_watcher.wait(WATCH_INTERVAL):
+        try:
+            reload_dataset()
+        except Exception:  # keep serving the current snapshot
+            watch_failures.inc()
+            logger.exception("Background dataset reload failed; still serving version %s",
+                             shards.version if SHARDED else _snapshot.version)
+
+
+def _start_watcher():
+    if WATCH_INTERVAL > 0:
+        _stop_watcher.clear()
+        threading.Thread(target=_watch, name="adae-watcher", daemon=True).start()
+
+
+@app.post("/admin/reload")
+def admin_reload(full: bool = False):
+    if SHARDED:
+        return shard_reload(full)
+    previous = _snapshot
+    try:
+        snap = reload_dataset(full=full)
+    except SourceChanged as e:
+        raise HTTPException(status_code=503, detail=f"Reload failed: {e}", headers={"Retry-After": "1"})
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
+    return {
+        "reloaded": snap is not previous,
+        "dataset_version": snap.version,
+        "row_count": snap.n_rows,
+        "appended_rows": snap.appended_rows if snap is not previous else 0,
+    }
+
+
+# ============================================================
+# 7️⃣ Response Cache
+# ============================================================
+
+# Rendered responses kept per dataset version; 0 disables caching (ETags still apply)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+
+response_cache = ResponseCache(RESPONSE_CACHE_SIZE)
+
+
+def cached_response(
+    snap: DatasetSnapshot,
+    key: Hashable,
+    if_none_match: Optional[str],
+    compute: Callable[[], Dict[str, Any]],
+) -> Response:
+    """
+    Serve key's response for snap with an ETag. A matching If-None-Match gets a 304
+    without computing anything; otherwise the rendered body comes from the LRU cache
+    or from compute() (a dict, or JSON bytes already rendered).
+    """
+    etag = make_etag(snap.version, key, snap.source_id)
+    headers = {"ETag": etag}
+    if etag_matches(if_none_match, etag):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    body = response_cache.get(snap.version, key)
+    if body is None:
+        body = compute()
+        if not isinstance(body, bytes):  # already rendered when it came from the query pool
+            _record_result_sizes(body)
+            with stage("serialize"):
+                body = JSONResponse(body).body
+        response_cache.put(snap.version, key, body)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.get("/admin/cache-stats")
+def cache_stats():
+    return response_cache.stats()
+
+
+# ============================================================
+# 8️⃣ AE Summary Endpoint
+# ============================================================
+
+@app.get("/ae-summary")
+def ae_summary(
+    group_by: List[str] = Query([]),
+    actarm: Optional[str] = None,
+    aesev: Optional[str] = None,
+    aesoc: Optional[str] = None,
+    aedecod: Optional[str] = None,
+    study_id: Optional[List[str]] = Query(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    Event and distinct-subject counts grouped by any of ACTARM, AESEV, AESOC, AEDECOD
+    (none = overall totals), optionally restricted to one value per dimension.
+    Answered from the snapshot's precomputed cube (not built in streaming mode); in
+    sharded mode, the involved studies' counts added up.
+    """
+    snap = _snapshot
+    if not SHARDED:
+        _single_dataset(study_id)
+    if STREAMING and not SHARDED:
+        raise HTTPException(
+            status_code=501,
+            detail="AE summary is not available in streaming mode (ADAE_STREAMING=1)."
+        )
+    group_by = [g.upper() for g in group_by]
+    filters = {
+        dim: value
+        for dim, value in (("ACTARM", actarm), ("AESEV", aesev), ("AESOC", aesoc), ("AEDECOD", aedecod))
+        if value is not None
+    }
+    if SHARDED:
+        return shard_ae_summary(group_by, filters, study_id, if_none_match)
+    unknown = [d for d in [*group_by, *filters] if d not in snap.cube.dimensions]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown or unavailable summary dimension(s): {unknown}"
+        )
+
+    def compute():
+        return {
+            "group_by": group_by,
+            "filters": filters,
+            "groups": snap.cube.query(group_by, filters),
+            "dataset_version": snap.version,
+        }
+
+    key = ("ae-summary", tuple(group_by), tuple(sorted((d, v.strip().upper()) for d, v in filters.items())))
+    return cached_response(snap, key, if_none_match, compute)
+
+
+# ============================================================
+# 9️⃣ Query Pool
+# ============================================================
+
+# QUERY_WORKERS > 0 runs queries expected to touch at least OFFLOAD_MIN_ROWS rows in
+# that many worker processes (see query_pool.py); point lookups, cache hits, 304s and
+# streamed responses stay in-process. At most QUERY_QUEUE_SIZE offloaded queries wait
+# for a worker, each for at most QUERY_QUEUE_TIMEOUT seconds; beyond that the request
+# gets a 503 with Retry-After.
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", "0"))
+QUERY_QUEUE_SIZE = int(os.getenv("QUERY_QUEUE_SIZE", "8"))
+QUERY_QUEUE_TIMEOUT = float(os.getenv("QUERY_QUEUE_TIMEOUT", "10"))
+OFFLOAD_MIN_ROWS = int(os.getenv("OFFLOAD_MIN_ROWS", "100000"))
+
+query_pool = (
+    QueryPool(DATA_PATH, QUERY_WORKERS, QUERY_QUEUE_SIZE, QUERY_QUEUE_TIMEOUT)
+    if QUERY_WORKERS > 0 and not STREAMING and not SHARDED else None
+)
+
+
+def run_query(
+    snap: DatasetSnapshot,
+    estimated_rows: int,
+    job: Callable[..., Dict[str, Any]],
+    *args,
+) -> Union[Dict[str, Any], bytes]:
+    """job(snap, *args): rendered by the query pool for broad queries, else computed here."""
+    if query_pool is not None and estimated_rows >= OFFLOAD_MIN_ROWS:
+        try:
+            body = query_pool.run(snap, job, *args)
+        except Overloaded as e:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Server busy: {e}",
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        if body is not None:
+            return body
+    return job(snap, *args)
+
+
+@app.get("/admin/query-pool")
+def query_pool_stats():
+    if query_pool is None:
+        return {"workers": 0}
+    return query_pool.stats()
+
+
+# ============================================================
+# 🔟 Streaming Execution
+# ============================================================
+
+# With ADAE_STREAMING=1 the /ae-query endpoints scan the file once per query (once per
+# batch), holding one chunk plus per-subject state; rendered bodies are cached (section 7)
+# so a repeated query does not scan again. Subject risk is one scan per SEVERITY_WEIGHTS.
+
+def _scan(snap: ScanSnapshot, queries):
+    """scan_ae_queries; a file rewritten under the scan triggers a reload and a 503."""
+    try:
+        return scan_ae_queries(snap, queries)
+    except SourceChanged as e:
+        try:
+            reload_dataset()
+        except SourceChanged:
+            pass  # still being written: keep the current snapshot, the client retries
+        raise HTTPException(
+            status_code=503,
+            detail=f"Dataset changed during the scan, reloaded: {e}",
+            headers={"Retry-After": "1"},
+        )
+
+
+def scan_ae_query(request: AEQueryRequest, if_none_match: Optional[str]) -> Response:
+    snap = _snapshot
+    after = _resolve_after(snap, request)
+
+    if request.stream and not request.count_only:
+        result = _scan(snap, [(request.severity, request.treatment_arm)])[0]
+        codes = result.subject_codes()
+        if request.limit is not None or after is not None:
+            codes = np.sort(codes)
+            if after is not None:
+                codes = codes[np.searchsorted(codes, after, side="right"):]
+            codes = codes[:request.limit]
+        return StreamingResponse(
+            _stream_subjects(snap, codes),
+            media_type="application/x-ndjson",
+            headers={
+                "X-Dataset-Version": str(snap.version),
+                "X-Matching-Record-Count": str(result.records),
+            },
+        )
+
+    def compute():
+        result = _scan(snap, [(request.severity, request.treatment_arm)])[0]
+        return result.body(snap, request.count_only, request.limit, after)
+
+    return cached_response(snap, _ae_query_key(request), if_none_match, compute)
+
+
+def scan_ae_query_batch(batch: AEQueryBatchRequest):
+    snap = _snapshot
+    afters = [_resolve_after(snap, q) for q in batch.queries]
+    results = _scan(snap, [(q.severity, q.treatment_arm) for q in batch.queries])
+    bodies = (
+        {"query_index": i, **result.body(snap, q.count_only, q.limit, after)}
+        for i, (q, after, result) in enumerate(zip(batch.queries, afters, results))
+    )
+    if batch.stream:
+        return StreamingResponse(
+            _ndjson(bodies),
+            media_type="application/x-ndjson",
+            headers={"X-Dataset-Version": str(snap.version)},
+        )
+    return {"results": list(bodies), "dataset_version": snap.version}
+
+
+# ============================================================
+# 1️⃣1️⃣ Study Shards
+# ============================================================
+
+# In sharded mode every endpoint takes study_id: one study, several, or none for every
+# study in the catalog. Each involved shard is matched in parallel on the shard pool and
+# the results merged here; responses carry the catalog version (shards.version), which
+# also keys the response cache and ETags.
+
+def _single_dataset(study_id) -> None:
+    """study_id only means something in sharded mode."""
+    if study_id:
+        raise HTTPException(
+            status_code=400,
+            detail="study_id requires a study catalog (ADAE_DATA_DIR or ADAE_MANIFEST)."
+        )
+
+
+def _studies(study_id: Optional[Union[str, List[str]]]) -> List[str]:
+    """Studies a request covers, in catalog order unless listed (404 for unknown ids)."""
+    if not study_id:
+        return shards.studies()
+    ids = [study_id] if isinstance(study_id, str) else list(dict.fromkeys(study_id))
+    unknown = [s for s in ids if s not in shards.paths]
+    if unknown:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown study_id(s): {unknown}"
+        )
+    return ids
+
+
+def _merge_ae_query(request: AEQueryRequest, studies: List[str], parts) -> Dict[str, Any]:
+    """
+    One ae-query body from each study's (snapshot, matching rows). Pages run through the
+    studies in order, each study's subjects by ordinal; `after` continues in the first
+    study holding that subject.
+    """
+    body = {"matching_record_count": sum(len(rows) for _, rows in parts)}
+    per_study = {}
+    paged = request.limit is not None or request.after is not None
+    subjects, remaining, more = [], request.limit, False
+    started = request.after is None
+    for study, (snap, rows) in zip(studies, parts):
+        if paged:
+            codes = np.unique(snap.index.subject_codes[rows])
+        else:
+            codes = snap.index.subject_codes_for(rows)
+        per_study[study] = {"matching_record_count": len(rows), "unique_subject_count": len(codes)}
+        if request.count_only or more:
+            continue
+        if not started:
+            after = snap.index.subject_ordinal(request.after)
+            if after is None:
+                continue
+            codes = codes[np.searchsorted(codes, after, side="right"):]
+            started = True
+        if remaining is not None:
+            more = len(codes) > remaining
+            codes = codes[:remaining]
+            remaining -= len(codes)
+        subjects += snap.index.labels(codes)
+    if not started:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown 'after' cursor: subject {request.after!r} not in the selected studies."
+        )
+    body["unique_subject_count"] = sum(s["unique_subject_count"] for s in per_study.values())
+    if not request.count_only:
+        body["subjects"] = subjects
+        if paged:
+            body["next_after"] = subjects[-1] if more else None
+    body["studies"] = per_study
+    body["dataset_version"] = shards.version
+    return body
+
+
+def shard_ae_query(request: AEQueryRequest, if_none_match: Optional[str]) -> Response:
+    studies = _studies(request.study_id)
+
+    def compute():
+        parts = shards.map(
+            lambda study, snap: (snap, snap.index.match_rows(request.severity, request.treatment_arm)),
+            studies,
+        )
+        return _merge_ae_query(request, studies, parts)
 
-    subject_df = df[df["USUBJID"] == subject_id]
+    if request.stream and not request.count_only:
+        body = compute()
+        return StreamingResponse(
+            _ndjson({"subject_id": s} for s in body["subjects"]),
+            media_type="application/x-ndjson",
+            headers={
+                "X-Dataset-Version": str(body["dataset_version"]),
+                "X-Matching-Record-Count": str(body["matching_record_count"]),
+            },
+        )
+    key = (*_ae_query_key(request), tuple(studies))
+    return cached_response(shards, key, if_none_match, compute)
+
+
+def shard_ae_query_batch(batch: AEQueryBatchRequest):
+    # Each shard matches all of its queries together, sharing equal filters
+    plans = [_studies(q.study_id) for q in batch.queries]
+    involved = list(dict.fromkeys(s for studies in plans for s in studies))
+
+    def match(study, snap):
+        mine = [i for i, studies in enumerate(plans) if study in studies]
+        matches = snap.index.match_many(
+            (batch.queries[i].severity, batch.queries[i].treatment_arm) for i in mine
+        )
+        return snap, dict(zip(mine, matches))
+
+    matched = dict(zip(involved, shards.map(match, involved)))
+
+    # Merged up front so a bad cursor fails the whole batch with a 400, as in one dataset
+    results = [
+        {"query_index": i, **_merge_ae_query(q, studies, [(matched[s][0], matched[s][1][i]) for s in studies])}
+        for i, (q, studies) in enumerate(zip(batch.queries, plans))
+    ]
 
-    if subject_df.empty:
+    if batch.stream:
+        return StreamingResponse(
+            _ndjson(results),
+            media_type="application/x-ndjson",
+            headers={"X-Dataset-Version": str(shards.version)},
+        )
+    return {"results": results, "dataset_version": shards.version}
+
+
+def shard_subject_risk(subject_id: str, study_id: Optional[List[str]], if_none_match: Optional[str]) -> Response:
+    studies = _studies(study_id)
+
+    def compute():
+        # Looked up in every study at once; the first study (in order) holding it answers
+        entries = shards.map(lambda study, snap: get_risk_table(snap).lookup(subject_id), studies)
+        for study, entry in zip(studies, entries):
+            if entry is not None:
+                return {
+                    "subject_id": subject_id,
+                    "study_id": study,
+                    "risk_score": entry[0],
+                    "risk_category": entry[1],
+                    "dataset_version": shards.version,
+                }
         raise HTTPException(
             status_code=404,
             detail="Subject not found."
         )
 
-    risk_score = 0
+    key = ("subject-risk", subject_id, tuple(sorted(SEVERITY_WEIGHTS.items())), tuple(studies))
+    return cached_response(shards, key, if_none_match, compute)
 
-    for sev in subject_df["AESEV"].astype(str).str.upper():
-        risk_score += SEVERITY_WEIGHTS.get(sev, 0)
 
-    # Determine risk category
-    if risk_score < 5:
-        risk_category = "Low"
-    elif 5 <= risk_score < 15:
-        risk_category = "Medium"
+def shard_subject_risk_batch(batch: SubjectRiskBatchRequest):
+    studies = _studies(batch.study_id)
+    ids = None if batch.subject_ids == "all" else list(dict.fromkeys(batch.subject_ids))
+    tables = shards.map(lambda study, snap: get_risk_table(snap).lookup_many(ids), studies)
+
+    if ids is None:
+        rows = [
+            (study, subject, score, category)
+            for study, (found, scores, categories, _) in zip(studies, tables)
+            for subject, score, category in zip(found, scores, categories)
+        ]
+        missing = []
     else:
-        risk_category = "High"
+        # Input order; each subject from the first study holding it
+        first = {}
+        for study, (found, scores, categories, _) in zip(studies, tables):
+            for subject, score, category in zip(found, scores, categories):
+                first.setdefault(subject, (study, subject, score, category))
+        rows = [first[s] for s in ids if s in first]
+        missing = [s for s in ids if s not in first]
+
+    def results():
+        for study, subject_id, risk_score, risk_category in rows:
+            yield {
+                "subject_id": subject_id,
+                "study_id": study,
+                "risk_score": risk_score,
+                "risk_category": risk_category,
+            }
+
+    if batch.stream:
+        not_found = ({"subject_id": s, "error": "Subject not found."} for s in missing)
+        return StreamingResponse(
+            _ndjson(itertools.chain(results(), not_found)),
+            media_type="application/x-ndjson",
+            headers={"X-Dataset-Version": str(shards.version)},
+        )
+    return {
+        "results": list(results()),
+        "not_found": missing,
+        "dataset_version": shards.version,
+    }
+
+
+def shard_ae_summary(
+    group_by: List[str],
+    filters: Dict[str, str],
+    study_id: Optional[List[str]],
+    if_none_match: Optional[str],
+) -> Response:
+    studies = _studies(study_id)
+
+    def compute():
+        snaps = shards.map(lambda study, snap: snap, studies)
+        unknown = sorted({
+            d for snap in snaps for d in [*group_by, *filters] if d not in snap.cube.dimensions
+        })
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown or unavailable summary dimension(s): {unknown}"
+            )
+        parts = shards.map(lambda study, snap: snap.cube.query(group_by, filters), studies)
+        return {
+            "group_by": group_by,
+            "filters": filters,
+            "groups": merge_summaries(parts, group_by),
+            "dataset_version": shards.version,
+        }
+
+    key = ("ae-summary", tuple(group_by), tuple(sorted((d, v.strip().upper()) for d, v in filters.items())),
+           tuple(studies))
+    return cached_response(shards, key, if_none_match, compute)
+
+
+def _reload_shards(full: bool) -> Dict[str, int]:
+    """shards.reload, timed for /metrics; caller holds _reload_lock."""
+    previous = shards.version
+    started = time.perf_counter()
+    try:
+        appended = shards.reload(full=full)
+    except Exception:
+        dataset_reloads.inc(1, "failed")
+        raise
+    _record_reload(time.perf_counter() - started, shards.version != previous, sum(appended.values()))
+    return appended
 
+
+def shard_reload(full: bool) -> Dict[str, Any]:
+    previous = shards.version
+    try:
+        with _reload_lock:
+            appended = _reload_shards(full)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Reload failed: {e}")
     return {
-        "subject_id": subject_id,
-        "risk_score": risk_score,
-        "risk_category": risk_category
+        "reloaded": shards.version != previous,
+        "dataset_version": shards.version,
+        "studies": shards.studies(),
+        "appended_rows": appended,
     }
+
+
+@app.get("/admin/shards")
+def shard_stats():
+    if shards is None:
+        return {"studies": 0}
+    return shards.stats()
+
+
+# ============================================================
+# 1️⃣2️⃣ Metrics
+# ============================================================
+
+# GET /metrics: Prometheus text format (see metrics.py). Request latency by route,
+# stages of each request (severity_mask, arm_mask, unique in the index; risk_table,
+# lookup for subject risk; serialize), result sizes of computed (not cached) responses,
+# dataset load/reload durations and sizes, cache and process memory figures.
+# ADAE_PROFILE_SLOW_MS > 0 samples stacks while requests run and writes a folded-stack
+# profile to ADAE_PROFILE_DIR for each request slower than that many milliseconds.
+PROFILE_SLOW_MS = float(os.getenv("ADAE_PROFILE_SLOW_MS", "0"))
+PROFILE_DIR = os.getenv("ADAE_PROFILE_DIR") or os.path.join(_here, "data", ".cache", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("ADAE_PROFILE_INTERVAL_MS", "5"))
+
+registry = Registry()
+request_duration = registry.register(Histogram(
+    "adae_http_request_duration_seconds", "Request latency until the last byte is sent.",
+    ("method", "endpoint"),
+))
+requests_total = registry.register(Counter(
+    "adae_http_requests_total", "Requests served.", ("method", "endpoint", "status"),
+))
+stage_duration = registry.register(Histogram(
+    "adae_request_stage_seconds", "Time spent in each stage of a request.",
+    ("endpoint", "stage"), STAGE_BUCKETS,
+))
+result_size = registry.register(Histogram(
+    "adae_result_size", "Records, subjects or groups per computed response.", ("endpoint", "kind"),
+    SIZE_BUCKETS,
+))
+dataset_load = registry.register(Histogram(
+    "adae_dataset_load_seconds", "Dataset load (startup) and reload durations.", ("kind",), LOAD_BUCKETS,
+))
+dataset_reloads = registry.register(Counter(
+    "adae_dataset_reloads_total", "Reload attempts by result (changed, unchanged, failed).", ("result",),
+))
+appended_rows = registry.register(Counter(
+    "adae_dataset_appended_rows_total", "Rows ingested incrementally by reloads.",
+))
+watch_failures = registry.register(Counter(
+    "adae_dataset_watch_failures_total", "Background (ADAE_WATCH_INTERVAL) reloads that failed.",
+))
+
+
+def _dataset_figures() -> Dict[str, float]:
+    if SHARDED:
+        stats = shards.stats()
+        return {"rows": stats["loaded_rows"], "version": stats["catalog_version"], "bytes": stats["loaded_bytes"]}
+    snap = _snapshot
+    return {"rows": snap.n_rows, "version": snap.version}
+
+
+def _gauge(name: str, help: str, read: Callable[[], Optional[float]]) -> None:
+    def values():
+        value = read()
+        return {} if value is None else {(): value}
+    registry.register(Gauge(name, help, read=values))
+
+
+_gauge("adae_dataset_rows", "Rows in the served dataset (loaded shards in sharded mode).",
+       lambda: _dataset_figures()["rows"])
+_gauge("adae_dataset_version", "Version of the served dataset.", lambda: _dataset_figures()["version"])
+_gauge("adae_shards_loaded_bytes", "Estimated bytes of the loaded study shards.",
+       lambda: _dataset_figures().get("bytes"))
+for _stat in ("hits", "misses", "evictions", "invalidations", "not_modified"):
+    _gauge(f"adae_response_cache_{_stat}", f"Response cache {_stat.replace('_', ' ')} since start.",
+           lambda _stat=_stat: response_cache.stats()[_stat])
+_gauge("adae_response_cache_entries", "Rendered responses held.", lambda: response_cache.stats()["entries"])
+add_process_metrics(registry)
+
+dataset_load.observe(_load_seconds, "load")
+
+
+def _record_reload(seconds: float, changed: bool, rows_appended: int) -> None:
+    dataset_load.observe(seconds, "reload")
+    dataset_reloads.inc(1, "changed" if changed else "unchanged")
+    if rows_appended:
+        appended_rows.inc(rows_appended)
+
+
+def _record_result_sizes(body: Dict[str, Any]) -> None:
+    if "matching_record_count" in body:
+        record_size("records", body["matching_record_count"])
+    if "unique_subject_count" in body:
+        record_size("subjects", body["unique_subject_count"])
+    if "groups" in body:
+        record_size("groups", len(body["groups"]))
+
+
+slow_profiler = (
+    SlowRequestProfiler(PROFILE_SLOW_MS / 1000, PROFILE_DIR, PROFILE_INTERVAL_MS / 1000)
+    if PROFILE_SLOW_MS > 0 else None
+)
+app.add_middleware(
+    MetricsMiddleware,
+    duration=request_duration,
+    requests=requests_total,
+    stages=stage_duration,
+    sizes=result_size,
+    profiler=slow_profiler,
+)
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,447 @@
+"""
+Prometheus metrics for the API, rendered in the text exposition format, without a
+client library. Counters, gauges and histograms live in a Registry; gauges can be
+read from a callback at scrape time. MetricsMiddleware times every request by route
+template, and `stage(name)` times a named step of the request being served (a no-op
+outside a request, so the same code runs in scripts). Work a request hands to other
+threads counts if it runs in a copy of the request's context (contextvars), and
+work in other processes if its collect() results are passed back to add_recorded().
+With a SlowRequestProfiler, a sampler thread records the stacks of the threads
+serving each request (bind_thread(), or any thread that runs a stage() for it),
+and a request slower than the threshold has its samples written as folded stacks
+(flamegraph.pl / speedscope input).
+"""
+
+import functools
+import math
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+SIZE_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+LOAD_BUCKETS = (0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (
+        str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for v in values
+    )
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items
+        ]
+
+
+class Gauge(_Metric):
+    """A value set by the code, or read from read() (labels -> value) at each scrape."""
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        read: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._read = read
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        if self._read is not None:
+            items = sorted(self._read().items())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}" for labels, v in items
+        ]
+
+
+class _ReadCounter(Gauge):
+    """A counter kept elsewhere (process CPU time), read at each scrape."""
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [count per bucket (non-cumulative, +Inf last), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        lines = self.header()
+        names = self.labelnames + ("le",)
+        for labels, (counts, total) in items:
+            running = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                running += count
+                le = _format_labels(names, (*labels, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{le} {running}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {running}")
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+
+# ============================================================
+# Request stages
+# ============================================================
+
+class _RequestMetrics:
+    """Seconds per stage and result sizes of the request being served."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.sizes: Dict[str, float] = {}
+        self.threads: set = set()
+        # Stages of one request can run in several threads (e.g. study shards)
+        self.lock = threading.Lock()
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+_current: ContextVar[Optional[_RequestMetrics]] = ContextVar("adae_request_metrics", default=None)
+
+# thread id -> the request it is serving, for the slow-request profiler
+_owners: Dict[int, _RequestMetrics] = {}
+_owners_lock = threading.Lock()
+
+
+def _claim_thread(current: _RequestMetrics) -> None:
+    ident = threading.get_ident()
+    if _owners.get(ident) is not current:
+        with _owners_lock:
+            _owners[ident] = current
+            current.threads.add(ident)
+
+
+def _release_threads(current: _RequestMetrics) -> None:
+    with _owners_lock:
+        for ident in current.threads:
+            if _owners.get(ident) is current:
+                del _owners[ident]
+
+
+def bind_thread(fn: Callable) -> Callable:
+    """fn, with each call marking its thread as serving the current request (if any)."""
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        current = _current.get()
+        if current is not None:
+            _claim_thread(current)
+        return fn(*args, **kwargs)
+    return bound
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Add the block's duration to stage `name` of the current request (if any)."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    _claim_thread(current)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.add_stage(name, time.perf_counter() - started)
+
+
+def record_size(kind: str, value: float) -> None:
+    """Report a result size (records, subjects, ...) of the current request (if any)."""
+    current = _current.get()
+    if current is not None:
+        current.sizes[kind] = value
+
+
+@contextmanager
+def collect() -> Iterator[_RequestMetrics]:
+    """
+    Stages and sizes recorded in the block, kept apart from any current request: for
+    work done on a request's behalf in another process, whose caller passes
+    (.stages, .sizes) back to add_recorded().
+    """
+    collected = _RequestMetrics()
+    token = _current.set(collected)
+    try:
+        yield collected
+    finally:
+        _current.reset(token)
+
+
+def add_recorded(stages: Dict[str, float], sizes: Dict[str, Any]) -> None:
+    """Add stages and sizes gathered by collect() to the current request (if any)."""
+    current = _current.get()
+    if current is None:
+        return
+    for name, seconds in stages.items():
+        current.add_stage(name, seconds)
+    current.sizes.update(sizes)
+
+
+# ============================================================
+# Process
+# ============================================================
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_START_TIME = time.time()
+
+
+def process_memory() -> Dict[str, float]:
+    """Resident and virtual bytes now (Linux /proc; elsewhere peak only), and peak resident bytes."""
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    out = {"peak_resident": float(peak)}
+    try:
+        with open("/proc/self/statm") as fh:
+            size, resident = fh.read().split()[:2]
+        out["resident"] = float(int(resident) * _PAGE_SIZE)
+        out["virtual"] = float(int(size) * _PAGE_SIZE)
+    except OSError:
+        pass
+    return out
+
+
+def _memory_reader(key: str) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    def read():
+        value = process_memory().get(key)
+        return {} if value is None else {(): value}
+    return read
+
+
+def add_process_metrics(registry: Registry) -> None:
+    memory = _memory_reader
+    registry.register(Gauge("process_resident_memory_bytes", "Resident memory size in bytes.",
+                            read=memory("resident")))
+    registry.register(Gauge("process_virtual_memory_bytes", "Virtual memory size in bytes.",
+                            read=memory("virtual")))
+    registry.register(Gauge("process_peak_resident_memory_bytes", "Peak resident memory size in bytes.",
+                            read=memory("peak_resident")))
+    registry.register(_ReadCounter("process_cpu_seconds_total", "User and system CPU time spent in seconds.",
+                                   read=lambda: {(): time.process_time()}))
+    registry.register(Gauge("process_start_time_seconds", "Start time of the process since the epoch in seconds.",
+                            read=lambda: {(): _START_TIME}))
+
+
+# ============================================================
+# Slow-request profiler
+# ============================================================
+
+class SlowRequestProfiler:
+    """
+    While any request runs, samples stacks each `interval` seconds. Each request
+    collects the samples of the threads serving it (see bind_thread), under their
+    thread names, so concurrent requests do not see each other's stacks; finish()
+    writes them as folded stacks when the request took at least threshold seconds.
+    """
+
+    def __init__(self, threshold: float, directory: str, interval: float = 0.005):
+        self.threshold = threshold
+        self.directory = directory
+        self.interval = interval
+        self.dumped = 0
+        self._active: List[Tuple[_RequestMetrics, _Tally]] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, request: _RequestMetrics) -> _Tally:
+        samples = _Tally()
+        with self._lock:
+            self._active.append((request, samples))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="adae-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return samples
+
+    def finish(self, samples: _Tally, endpoint: str, seconds: float) -> Optional[str]:
+        with self._lock:
+            self._active = [entry for entry in self._active if entry[1] is not samples]
+            if not self._active:
+                self._wake.clear()
+        if seconds < self.threshold or not samples:
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in endpoint).strip("_") or "root"
+        path = os.path.join(
+            self.directory,
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{self.dumped}-{slug}-{int(seconds * 1000)}ms.folded",
+        )
+        with open(path, "w") as fh:
+            for stack, count in samples.most_common():
+                fh.write(f"{stack} {count}\n")
+        self.dumped += 1
+        return path
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active)
+            with _owners_lock:
+                owners = dict(_owners)
+            current_frames = sys._current_frames()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks: Dict[int, List[str]] = {}
+            for ident, request in owners.items():
+                frame = current_frames.get(ident)
+                if frame is None:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                stacks.setdefault(id(request), []).append(";".join(reversed(frames)))
+            with self._lock:
+                for request, samples in active:
+                    samples.update(stacks.get(id(request), ()))
+
+
+# ============================================================
+# Middleware
+# ============================================================
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: per request, the duration until the last body byte is sent (by
+    method and route template), the status, the seconds of each stage() run and the
+    sizes passed to record_size() while serving it; optionally a profile of slow
+    requests.
+    """
+
+    def __init__(
+        self,
+        app,
+        duration: Histogram,
+        requests: Counter,
+        stages: Histogram,
+        sizes: Histogram,
+        profiler: Optional[SlowRequestProfiler] = None,
+        skip: Sequence[str] = ("/metrics",),
+    ):
+        self.app = app
+        self.duration = duration
+        self.requests = requests
+        self.stages = stages
+        self.sizes = sizes
+        self.profiler = profiler
+        self.skip = set(skip)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip:
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+        current = _RequestMetrics()
+        token = _current.set(current)
+        samples = self.profiler.start(current) if self.profiler is not None else None
+        started = time.perf_counter()
+
+        async def send_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            seconds = time.perf_counter() - started
+            _current.reset(token)
+            _release_threads(current)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            self.duration.observe(seconds, scope["method"], endpoint)
+            self.requests.inc(1, scope["method"], endpoint, str(status[0]))
+            for name, value in current.stages.items():
+                self.stages.observe(value, endpoint, name)
+            for kind, value in current.sizes.items():
+                self.sizes.observe(value, endpoint, kind)
+            if samples is not None:
+                self.profiler.finish(samples, endpoint, seconds)
@@ -0,0 +1,183 @@
+"""
+Process pool for expensive queries, with admission control.
+Each worker process attaches the shared, memory-mapped snapshot of the CSV (see
+shared_snapshot.py) and returns rendered JSON bytes, so a broad query holds a
+worker's GIL instead of the API's and lookups keep flowing meanwhile. The stages
+and sizes the job records in the worker come back with the body and are added to
+the request's metrics.
+At most `workers` jobs run and `max_queue` more wait; a job beyond that is
+rejected at once, and a queued job that does not start within queue_timeout
+seconds is dropped, so overload shows up as fast errors rather than growing
+latency. Jobs queue in the API process, for one of `workers` slots, and are only
+handed to the executor once a worker is free: its own queue cannot be cancelled
+from, so a job waiting there would hold its request past the deadline.
+"""
+
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from dataset import DatasetSnapshot
+from metrics import add_recorded, collect, stage
+from shared_snapshot import attach_snapshot
+
+
+class Overloaded(Exception):
+    """The pool cannot take the job now; retry_after is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int = 1):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class _QueueTimeout(Exception):
+    pass
+
+
+class _StaleSnapshot(Exception):
+    """The worker cannot attach the CSV state the API process is serving."""
+
+
+# ------------------------------------------------------------
+# Worker side
+# ------------------------------------------------------------
+
+_worker_csv: Optional[str] = None
+_worker_snapshot: Optional[DatasetSnapshot] = None
+
+
+def _state(snap: DatasetSnapshot) -> Tuple[int, int]:
+    return snap.source.offset, snap.source.mtime_ns
+
+
+def _init_worker(csv_path: str) -> None:
+    global _worker_csv, _worker_snapshot
+    _worker_csv = csv_path
+    _worker_snapshot = attach_snapshot(csv_path)
+
+
+def _ping() -> None:
+    pass
+
+
+def _run(state: Tuple[int, int], version: int, deadline: float, job: Callable, args: tuple) -> tuple:
+    global _worker_snapshot
+    if time.time() > deadline:
+        raise _QueueTimeout()
+    snap = _worker_snapshot
+    if snap is None or _state(snap) != state:
+        snap = _worker_snapshot = attach_snapshot(_worker_csv)
+        if _state(snap) != state:
+            raise _StaleSnapshot()
+    # Same CSV state as the API's snapshot, so report the API's version number
+    snap.version = version
+    with collect() as recorded:
+        body = job(snap, *args)
+        with stage("serialize"):
+            body = JSONResponse(body).body
+    return body, recorded.stages, recorded.sizes
+
+
+# ------------------------------------------------------------
+# API side
+# ------------------------------------------------------------
+
+class QueryPool:
+
+    def __init__(self, csv_path: str, workers: int, max_queue: int = 8, queue_timeout: float = 10.0):
+        self.csv_path = csv_path
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(workers)
+        self._executor = self._new_executor()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.fallbacks = 0
+        self.crashes = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the API process runs threads (watcher, request threadpool)
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.csv_path,),
+        )
+
+    def warm(self) -> None:
+        """Start the workers (attaching the snapshot) without waiting for them."""
+        for _ in range(self.workers):
+            self._executor.submit(_ping)
+
+    def run(self, snap: DatasetSnapshot, job: Callable[..., Dict[str, Any]], *args) -> Optional[bytes]:
+        """
+        Rendered job(snap, *args) computed by a worker, or None when no worker can
+        serve snap's CSV state (the caller then computes in-process).
+        Raises Overloaded when the queue is full or the job waited too long.
+        """
+        with self._lock:
+            if self.in_flight >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise Overloaded("Query queue is full.", retry_after=1)
+            self.in_flight += 1
+        try:
+            deadline = time.time() + self.queue_timeout
+            if not self._slots.acquire(timeout=self.queue_timeout):
+                raise _QueueTimeout()
+            with self._lock:
+                executor = self._executor
+            try:
+                future = executor.submit(_run, _state(snap), snap.version, deadline, job, args)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            body, stages, sizes = future.result()
+            add_recorded(stages, sizes)
+            with self._lock:
+                self.completed += 1
+            return body
+        except _QueueTimeout:
+            with self._lock:
+                self.timed_out += 1
+            raise Overloaded("Query waited too long in the queue.", retry_after=int(self.queue_timeout))
+        except _StaleSnapshot:
+            with self._lock:
+                self.fallbacks += 1
+            return None
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); replace the pool for later jobs
+            with self._lock:
+                self.crashes += 1
+                if self._executor is executor:
+                    self._executor = self._new_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise Overloaded("Query worker crashed.", retry_after=1)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "fallbacks": self.fallbacks,
+                "crashes": self.crashes,
+            }
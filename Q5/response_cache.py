@@ -0,0 +1,93 @@
+"""
+Bounded LRU cache of rendered API responses, tied to one dataset version.
+Entries are rendered JSON bytes, so a hit skips both the query and serialization.
+A request for a newer dataset version empties the cache; results computed
+against an older version are never stored.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+
+class ResponseCache:
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self.version: Optional[int] = None
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.not_modified = 0
+
+    def _sync_version(self, version: int) -> bool:
+        """Adopt a newer version (dropping entries); False if version is stale."""
+        if self.version is None or version > self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+        return version == self.version
+
+    def get(self, version: int, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            if self._sync_version(version) and key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, version: int, key: Hashable, body: bytes) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            if not self._sync_version(version):
+                return
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "dataset_version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "not_modified": self.not_modified,
+            }
+
+
+def make_etag(version: int, key: Hashable, source_id: str = "") -> str:
+    """
+    Responses are a pure function of (dataset version, normalized request). Versions
+    restart at 1 in every process, so the data's source identity is folded in too: a
+    tag from before a restart, or from another worker, never matches different data.
+    """
+    digest = hashlib.sha1(repr((source_id, version, key)).encode()).hexdigest()[:20]
+    return f'"v{version}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 9110 If-None-Match: '*' or a comma-separated list of (possibly weak) tags."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
@@ -0,0 +1,183 @@
+"""
+Dataset snapshots shared between uvicorn workers.
+The first process to need a given state of adae.csv builds the snapshot once,
+under a file lock, and writes it to data/.cache/<stem>.<key>.shared/: the frame
+as uncompressed Feather, and the AEIndex (with a sorted copy of the subject ids
+for lookups), the cube's pair table and roll-ups and the risk table as .npy
+arrays. Every worker then memory-maps those files read-only, so the table, index,
+summaries and scores sit once in the OS page cache instead of once per worker,
+and only one worker parses the CSV. When rows are appended, the first worker to
+notice ingests only the new rows (as refresh_snapshot does) and writes the next
+state's artifacts; the others attach them.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+from typing import Callable, Dict, Iterator
+
+from adae_store import cache_dir_for, read_snapshot, snapshot_key
+from ae_cube import AECube
+from ae_index import AEIndex, RiskTable
+from dataset import DatasetSnapshot, SourceState, load_snapshot, refresh_snapshot
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: no cross-process lock, builds may race harmlessly
+    fcntl = None
+
+
+# Bumped when the artifact layout changes, so directories written by older code are not attached
+SHARED_FORMAT = 2
+
+
+def _stem(csv_path: str) -> str:
+    return os.path.splitext(os.path.basename(csv_path))[0]
+
+
+def artifact_dir(csv_path: str, size: int, mtime_ns: int) -> str:
+    key = snapshot_key(csv_path, size, mtime_ns)
+    return os.path.join(cache_dir_for(csv_path), f"{_stem(csv_path)}.{key}.f{SHARED_FORMAT}.shared")
+
+
+@contextlib.contextmanager
+def _build_lock(csv_path: str) -> Iterator[None]:
+    os.makedirs(cache_dir_for(csv_path), exist_ok=True)
+    lock_path = os.path.join(cache_dir_for(csv_path), f"{_stem(csv_path)}.lock")
+    with open(lock_path, "a+") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def _next_generation(csv_path: str) -> int:
+    """Shared version counter, so every worker reports the same dataset_version."""
+    path = os.path.join(cache_dir_for(csv_path), f"{_stem(csv_path)}.generation")
+    try:
+        with open(path) as fh:
+            generation = int(fh.read().strip() or 0) + 1
+    except (OSError, ValueError):
+        generation = 1
+    with open(path, "w") as fh:
+        fh.write(str(generation))
+    return generation
+
+
+def _build(csv_path: str) -> str:
+    """Load csv_path, write its shared artifacts and return their directory. Call under the lock."""
+    return _write(csv_path, load_snapshot(csv_path))
+
+
+def _write(csv_path: str, snap: DatasetSnapshot) -> str:
+    """Write snap's shared artifacts (unless present) and return their directory. Call under the lock."""
+    directory = artifact_dir(csv_path, snap.source.offset, snap.source.mtime_ns)
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        return directory
+    tmp = f"{directory}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    snap.df.to_feather(os.path.join(tmp, "table.feather"), compression="uncompressed")
+    snap.index.save(tmp)
+    snap.cube.save(tmp)
+    meta = {
+        "version": _next_generation(csv_path),
+        "has_arm": snap.has_arm,
+        "offset": snap.source.offset,
+        "mtime_ns": snap.source.mtime_ns,
+        "appended_rows": snap.appended_rows,
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+    os.replace(tmp, directory)
+    # Older states can go: workers still mapping them keep their pages until they move on
+    prefix = f"{_stem(csv_path)}."
+    parent = os.path.dirname(directory)
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name.startswith(prefix) and name.endswith(".shared") and path != directory:
+            shutil.rmtree(path, ignore_errors=True)
+    return directory
+
+
+def attach_snapshot(csv_path: str, rebuild: bool = False) -> DatasetSnapshot:
+    """
+    Snapshot of csv_path's current state backed by the shared, memory-mapped artifacts,
+    building them first if no process has yet (or when rebuild is set).
+    """
+    st = os.stat(csv_path)
+    directory = artifact_dir(csv_path, st.st_size, st.st_mtime_ns)
+    if rebuild or not os.path.exists(os.path.join(directory, "meta.json")):
+        with _build_lock(csv_path):
+            # Another worker may have finished the build while we waited
+            if rebuild or not os.path.exists(os.path.join(directory, "meta.json")):
+                if rebuild:
+                    shutil.rmtree(directory, ignore_errors=True)
+                directory = _build(csv_path)
+    return _attach(csv_path, directory)
+
+
+def _attach(csv_path: str, directory: str) -> DatasetSnapshot:
+    with open(os.path.join(directory, "meta.json")) as fh:
+        meta = json.load(fh)
+    df = read_snapshot(os.path.join(directory, "table.feather"), zero_copy=True)
+    index = AEIndex.load(directory, mmap_mode="r")
+    cube = AECube.load(directory, mmap_mode="r")
+    source = SourceState.read(csv_path, meta["offset"], meta["mtime_ns"])
+    snap = DatasetSnapshot(df, meta["has_arm"], index, cube, meta["version"], source,
+                           appended_rows=meta.get("appended_rows", 0))
+    snap.shared_dir = directory
+    return snap
+
+
+def refresh_shared_snapshot(snapshot: DatasetSnapshot, full: bool = False) -> DatasetSnapshot:
+    """
+    refresh_snapshot for shared mode: attach the CSV's current state when it changed.
+    The first worker to get here ingests appended rows into snapshot (a full load
+    when the file was rewritten) and writes the new artifacts; later ones attach them.
+    """
+    if full:
+        return attach_snapshot(snapshot.source.path, rebuild=True)
+    if not snapshot.source.changed():
+        return snapshot
+    csv_path = snapshot.source.path
+    st = os.stat(csv_path)
+    directory = artifact_dir(csv_path, st.st_size, st.st_mtime_ns)
+    if not os.path.exists(os.path.join(directory, "meta.json")):
+        with _build_lock(csv_path):
+            if not os.path.exists(os.path.join(directory, "meta.json")):
+                new = refresh_snapshot(snapshot)
+                if new is snapshot:
+                    return snapshot  # only a partial line so far
+                directory = _write(csv_path, new)
+    return _attach(csv_path, directory)
+
+
+def shared_risk_table(
+    snap: DatasetSnapshot,
+    weights: Dict[str, int],
+    categorize: Callable[[int], str],
+) -> RiskTable:
+    """
+    snap's RiskTable, memory-mapped from its artifact directory; the first worker to
+    need it for these weights builds and saves it there.
+    """
+    name = "risk." + hashlib.sha1(repr(sorted(weights.items())).encode()).hexdigest()[:12]
+    table = RiskTable.load(snap.shared_dir, name, snap.index, weights, categorize)
+    if table is not None:
+        return table
+    with _build_lock(snap.source.path):
+        table = RiskTable.load(snap.shared_dir, name, snap.index, weights, categorize)
+        if table is None:
+            table = RiskTable(snap.index, weights, categorize)
+            try:
+                table.save(snap.shared_dir, name)
+            except OSError:  # directory already replaced by a newer state: keep a private copy
+                return table
+            table = RiskTable.load(snap.shared_dir, name, snap.index, weights, categorize)
+    return table
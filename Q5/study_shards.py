@@ -0,0 +1,241 @@
+"""
+Many studies' ADAE datasets served by one API process.
+A catalog maps study ids to CSV files: every *.csv of a directory (study id = file
+name without extension) or the entries of a JSON manifest. Each study is one shard
+with its own snapshot (frame, index, cube, risk table), loaded on its first request
+and kept in an LRU; when the shards held exceed the memory cap, the least recently
+used ones are dropped and loaded again when next asked for. Cross-study queries run
+on every involved shard in parallel and are merged by the caller; counts add up and
+subject lists concatenate in catalog order, since a USUBJID belongs to one study.
+The catalog has one version for all shards, bumped whenever any study's data (or
+the set of studies) changes, so cached responses and ETags stay valid across
+evictions and reloads; ETags also carry the catalog's file states (source_id), as
+the version restarts at 1 in every process.
+"""
+
+import contextvars
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from dataset import DatasetSnapshot, load_snapshot, refresh_snapshot
+
+# Risk table bytes per subject (score, category, dict entry), counted before it is built
+RISK_BYTES_PER_SUBJECT = 200
+
+
+def discover_studies(data_dir: Optional[str] = None, manifest: Optional[str] = None) -> Dict[str, str]:
+    """
+    study id -> CSV path, in catalog order. manifest: JSON object {study id: path}, paths
+    relative to the manifest's folder; data_dir: every *.csv in it, sorted by name.
+    """
+    if manifest:
+        with open(manifest) as fh:
+            entries = json.load(fh)
+        if not isinstance(entries, dict):
+            raise ValueError(f"{manifest} must be a JSON object of study id -> ADAE CSV path.")
+        base = os.path.dirname(os.path.abspath(manifest))
+        return {str(study): os.path.join(base, path) for study, path in entries.items()}
+    if data_dir:
+        return {
+            os.path.splitext(os.path.basename(path))[0]: path
+            for path in sorted(glob.glob(os.path.join(data_dir, "*.csv")))
+        }
+    raise ValueError("A study directory or manifest is required.")
+
+
+def snapshot_nbytes(snap: DatasetSnapshot) -> int:
+    """Approximate memory held by a snapshot: frame, index arrays, cube arrays and the risk table."""
+    index = snap.index
+    n = int(snap.df.memory_usage(deep=True, index=True).sum())
+    n += index.subject_codes.nbytes
+    n += sum(rows.nbytes for table in (index.severity, index.arm) for rows in table.values())
+    n += snap.cube.nbytes
+    return n + len(index.subject_ids) * RISK_BYTES_PER_SUBJECT
+
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+class StudyShards:
+    """
+    Lazily loaded, LRU-evicted snapshots of the studies of one catalog. get() loads
+    a study once however many requests ask for it at the same time; map() runs a
+    function on several studies' snapshots in parallel.
+    """
+
+    def __init__(
+        self,
+        data_dir: Optional[str] = None,
+        manifest: Optional[str] = None,
+        memory_cap_bytes: int = 0,
+        workers: int = 4,
+        loader: Callable[[str], DatasetSnapshot] = load_snapshot,
+    ):
+        self.data_dir = data_dir
+        self.manifest = manifest
+        self.memory_cap_bytes = memory_cap_bytes
+        self.loader = loader
+        self.paths = discover_studies(data_dir, manifest)
+        self.version = 1
+        self._seen = {study: _file_state(path) for study, path in self.paths.items()}
+        self._loaded: "OrderedDict[str, DatasetSnapshot]" = OrderedDict()
+        self._nbytes: Dict[str, int] = {}
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max(1, workers), thread_name_prefix="study-shard")
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def studies(self) -> List[str]:
+        return list(self.paths)
+
+    @property
+    def source_id(self) -> str:
+        """The catalog and the file state of every study, as of the current version."""
+        with self._lock:
+            state = sorted((study, os.path.abspath(self.paths[study]), self._seen.get(study)) for study in self.paths)
+        return hashlib.sha1(repr(state).encode()).hexdigest()
+
+    def get(self, study: str) -> DatasetSnapshot:
+        """Snapshot of study (KeyError if it is not in the catalog), loading it if needed."""
+        with self._lock:
+            path = self.paths[study]
+            snap = self._loaded.get(study)
+            if snap is not None:
+                self._loaded.move_to_end(study)
+                self.hits += 1
+                return snap
+            pending = self._loading.get(study)
+            owner = pending is None
+            if owner:
+                pending = self._loading[study] = Future()
+        if not owner:
+            return pending.result()
+        try:
+            state = _file_state(path)
+            snap = self.loader(path)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[study]
+            pending.set_exception(e)
+            raise
+        size = snapshot_nbytes(snap)
+        with self._lock:
+            if state != self._seen.get(study):
+                # Changed since the catalog last looked: responses cached for it are stale
+                self._seen[study] = state
+                self.version += 1
+            self._loaded[study] = snap
+            self._nbytes[study] = size
+            self.loads += 1
+            self._evict(keep=study)
+            del self._loading[study]
+        pending.set_result(snap)
+        return snap
+
+    def _evict(self, keep: str) -> None:
+        """Drop least recently used shards (never keep) while over the memory cap. Caller holds the lock."""
+        if self.memory_cap_bytes <= 0:
+            return
+        while sum(self._nbytes.values()) > self.memory_cap_bytes and len(self._loaded) > 1:
+            study = next(s for s in self._loaded if s != keep)
+            del self._loaded[study]
+            del self._nbytes[study]
+            self.evictions += 1
+
+    def map(self, fn: Callable[[str, DatasetSnapshot], Any], studies: Sequence[str]) -> List[Any]:
+        """
+        [fn(study, snapshot) for each study], run on the shard pool in copies of the
+        caller's context (so per-request state such as metrics stages carries over);
+        the first error is raised.
+        """
+        if len(studies) == 1:
+            return [fn(studies[0], self.get(studies[0]))]
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, lambda s: fn(s, self.get(s)), s)
+            for s in studies
+        ]
+        return [f.result() for f in futures]
+
+    def reload(self, full: bool = False) -> Dict[str, int]:
+        """
+        Re-read the catalog and refresh loaded shards (appended rows only, as in single
+        dataset mode); unloaded shards are read fresh when next needed. Returns
+        {study: rows appended} for the shards that changed.
+        """
+        paths = discover_studies(self.data_dir, self.manifest) if (self.data_dir or self.manifest) else self.paths
+        with self._lock:
+            loaded = dict(self._loaded)
+        refreshed = {}
+        for study, snap in loaded.items():
+            if study in paths:
+                new = refresh_snapshot(snap, full=full)
+                if new is not snap:
+                    refreshed[study] = new
+        with self._lock:
+            changed = paths != self.paths
+            self.paths = paths
+            for study in list(self._loaded):
+                if study not in paths:
+                    del self._loaded[study]
+                    del self._nbytes[study]
+            for study, new in refreshed.items():
+                if study in self._loaded:
+                    self._loaded[study] = new
+                    self._nbytes[study] = snapshot_nbytes(new)
+            seen = {study: _file_state(path) for study, path in paths.items()}
+            changed = changed or bool(refreshed) or seen != self._seen
+            self._seen = seen
+            if changed:
+                self.version += 1
+            self._evict(keep="")
+        return {study: new.appended_rows for study, new in refreshed.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "studies": len(self.paths),
+                "loaded": list(self._loaded),
+                "loaded_bytes": sum(self._nbytes.values()),
+                "loaded_rows": sum(snap.n_rows for snap in self._loaded.values()),
+                "memory_cap_bytes": self.memory_cap_bytes,
+                "catalog_version": self.version,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def merge_summaries(parts: Sequence[List[Dict[str, Any]]], group_by: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    AECube.query groups of several studies added up per group, sorted as AECube.query
+    sorts them.
+    """
+    merged: Dict[tuple, Dict[str, Any]] = {}
+    for groups in parts:
+        for row in groups:
+            key = tuple(row[d] for d in group_by)
+            total = merged.get(key)
+            if total is None:
+                merged[key] = dict(row)
+            else:
+                total["event_count"] += row["event_count"]
+                total["subject_count"] += row["subject_count"]
+    out = list(merged.values())
+    out.sort(key=lambda r: (-r["subject_count"], -r["event_count"]))
+    return out
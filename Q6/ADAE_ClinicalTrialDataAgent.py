@@ -1,6 +1,8 @@
 """
 ClinicalTrialDataAgent
 Fully column-agnostic AI assistant for ADAE dataset.
+Importing this module is cheap and has no side effects: the dataset, its indexes,
+the LLM client and the chains are built on first use (see _lazy below).
 """
 
 import os
@@ -9,73 +11,151 @@ import os
 os.environ.setdefault("TRANSFORMERS_VERBOSITY", "error")
 os.environ.setdefault("TRANSFORMERS_NO_ADVISORY_WARNINGS", "1")
 
+import asyncio
+import functools
 import json
-import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from typing import Dict, Any, Tuple
+from typing import AsyncIterator, Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from adae_cache import read_csv_cached, read_url_cached
+from fast_parser import FastParser
+from filter_engine import FilterEngine
+from filter_scan import SourceProfile, scan_filters, scan_rows
+from parse_cache import ParseCache, cache_namespace
+from rate_limit import TokenBucket, call_with_retry
+from stage_timer import StageTimer
+from value_index import ValueIndex
+
+
+# Module attributes built on first use: reading e.g. `adae` or `llm_chain` runs its
+# builder once and memoizes the result; assigning one replaces it (tests, replay).
+# Attributes derived from others (filter_engine from adae) are rebuilt on the next
+# read once one of those has been assigned a different object.
+_BUILDERS: Dict[str, Callable[[], Any]] = {}
+_DEPENDS: Dict[str, Tuple[str, ...]] = {}
+# For derived attributes: the objects their memoized value was built from
+_built_from: Dict[str, Tuple[Any, ...]] = {}
+_build_lock = threading.RLock()
+
+
+def _lazy(name: str, depends: Tuple[str, ...] = ()):
+    """Register the decorated function as the builder of module attribute `name`; returns its getter."""
+    def register(build):
+        _BUILDERS[name] = build
+        if depends:
+            _DEPENDS[name] = depends
+
+        @functools.wraps(build)
+        def get():
+            return _get(name)
+        return get
+    return register
+
+
+def _stale(name: str) -> bool:
+    built_from = _built_from.get(name)
+    return built_from is not None and any(
+        globals().get(dep) is not obj for dep, obj in zip(_DEPENDS[name], built_from)
+    )
+
+
+def _get(name: str) -> Any:
+    if name in globals() and not _stale(name):
+        return globals()[name]
+    with _build_lock:
+        if name not in globals() or _stale(name):
+            globals()[name] = _BUILDERS[name]()
+            if name in _DEPENDS:
+                _built_from[name] = tuple(globals().get(dep) for dep in _DEPENDS[name])
+        return globals()[name]
 
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
+
+def __getattr__(name: str) -> Any:
+    if name in _BUILDERS:
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ============================================================
 # 1️⃣ Load ADAE
 # ============================================================
 
-DATA_PATH = "data/adae.csv"
+DATA_PATH = os.getenv("ADAE_DATA_PATH", os.path.join("data", "adae.csv"))
 PHARMAVERSE_AE_RDA_URL = "https://raw.githubusercontent.com/pharmaverse/pharmaversesdtm/main/data/ae.rda"
 
 
+def _read_rda(path: str) -> pd.DataFrame:
+    try:
+        import pyreadr
+    except ImportError:
+        raise ImportError(
+            "Reading pharmaverse ae.rda requires pyreadr. Install with: pip install pyreadr"
+        ) from None
+    obj = pyreadr.read_r(path)
+    if not obj:
+        raise ValueError("ae.rda contains no readable objects.")
+    adae_df = next(iter(obj.values()))
+    if not isinstance(adae_df, pd.DataFrame):
+        raise TypeError("ae.rda did not contain a DataFrame.")
+    return adae_df
+
+
 def _load_adae() -> Tuple[pd.DataFrame, bool]:
     """Load ADAE: use data/adae.csv if present, else download and read pharmaverse ae.rda.
     Returns (dataframe, used_pharmaverse).
+    The CSV is read through a columnar cache (data/.cache) that is rebuilt only when it changes;
+    ae.rda is downloaded once into data/.cache/downloads and re-checked daily (see adae_cache.py).
     """
     if os.path.exists(DATA_PATH):
-        return pd.read_csv(DATA_PATH), False
-    # Fallback: fetch ae.rda from pharmaverse
-    import tempfile
-    import urllib.request
+        return read_csv_cached(DATA_PATH), False
+    # Fallback: ae.rda from pharmaverse
     try:
-        with urllib.request.urlopen(PHARMAVERSE_AE_RDA_URL, timeout=30) as resp:
-            rda_bytes = resp.read()
-    except Exception as e:
+        return read_url_cached(PHARMAVERSE_AE_RDA_URL, os.path.join("data", ".cache"), _read_rda), True
+    except OSError as e:
         raise FileNotFoundError(
             f"Neither {DATA_PATH} nor pharmaverse ae.rda could be used. "
             f"Local file missing and download failed: {e}"
         ) from e
-    try:
-        import pyreadr
-    except ImportError:
-        raise ImportError(
-            "Reading pharmaverse ae.rda requires pyreadr. Install with: pip install pyreadr"
-        ) from None
-    with tempfile.NamedTemporaryFile(suffix=".rda", delete=False) as f:
-        f.write(rda_bytes)
-        tmp_path = f.name
-    try:
-        obj = pyreadr.read_r(tmp_path)
-        if not obj:
-            raise ValueError("ae.rda contains no readable objects.")
-        adae_df = next(iter(obj.values()))
-        if not isinstance(adae_df, pd.DataFrame):
-            raise TypeError("ae.rda did not contain a DataFrame.")
-        return adae_df, True
-    finally:
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-
-
-adae, _used_pharmaverse = _load_adae()
-adae.columns = adae.columns.str.upper()
-if _used_pharmaverse:
-    print(
-        "Note: Using pharmaverse default AE data (ae.rda). Local data/adae.csv was not found.",
-        file=sys.stderr,
-    )
+
+
+@_lazy("adae")
+def get_adae() -> pd.DataFrame:
+    """The ADAE dataset (columns upper-cased), loaded on first call."""
+    df, used_pharmaverse = _load_adae()
+    df.columns = df.columns.str.upper()
+    if used_pharmaverse:
+        print(
+            "Note: Using pharmaverse default AE data (ae.rda). Local data/adae.csv was not found.",
+            file=sys.stderr,
+        )
+    return df
+
+
+# ADAE_STREAMING=1: never load the table; every query scans DATA_PATH (CSV or Parquet)
+# in chunks sized to ADAE_MEMORY_BUDGET_MB (see filter_scan.py), for files larger than
+# memory. The rule parser and value index are built from one profiling pass instead.
+STREAMING = os.getenv("ADAE_STREAMING", "0") == "1"
+MEMORY_BUDGET_MB = float(os.getenv("ADAE_MEMORY_BUDGET_MB", "256"))
+
+
+@_lazy("source_profile")
+def get_source_profile() -> SourceProfile:
+    """Columns, numeric columns and value counts of DATA_PATH from one chunked pass (streaming mode)."""
+    if not os.path.exists(DATA_PATH):
+        raise FileNotFoundError(f"Streaming mode reads {DATA_PATH}, which does not exist.")
+    return SourceProfile(DATA_PATH, int(MEMORY_BUDGET_MB * 2 ** 20))
+
+
+def _is_text_column(column: str) -> bool:
+    if STREAMING:
+        profile = get_source_profile()
+        return column in profile.columns and not profile.is_numeric(column)
+    adae = get_adae()
+    return column in adae.columns and not pd.api.types.is_numeric_dtype(adae[column])
 
 
 # ============================================================
@@ -164,32 +244,110 @@ Rules:
 - Only return JSON.
 """
 
-_openai_api_key = os.getenv("OPENAI_API_KEY")
-if not _openai_api_key or not str(_openai_api_key).strip():
-    print(
-        "OPENAI_API_KEY is not set. To use this agent, set your OpenAI API key:\n\n"
-        "  Option 1 - Export in your shell (bash/zsh):\n"
-        "    export OPENAI_API_KEY='your-api-key-here'\n\n"
-        "  Option 2 - In the same terminal before running:\n"
-        "    OPENAI_API_KEY='your-api-key-here' python ADAE_ClinicalTrialDataAgent.py\n\n"
-        "Get an API key at: https://platform.openai.com/api-keys",
-        file=sys.stderr,
+API_KEY_HELP = (
+    "OPENAI_API_KEY is not set. To use this agent, set your OpenAI API key:\n\n"
+    "  Option 1 - Export in your shell (bash/zsh):\n"
+    "    export OPENAI_API_KEY='your-api-key-here'\n\n"
+    "  Option 2 - In the same terminal before running:\n"
+    "    OPENAI_API_KEY='your-api-key-here' python ADAE_ClinicalTrialDataAgent.py\n\n"
+    "Get an API key at: https://platform.openai.com/api-keys"
+)
+
+
+class MissingAPIKeyError(RuntimeError):
+    """OPENAI_API_KEY is not set; raised when the LLM is first needed."""
+
+
+LLM_MODEL = "gpt-4o-mini"
+
+# ADAE_LLM_BACKEND: "live" (default) calls OpenAI; "record" also writes every reply to
+# the ADAE_LLM_FIXTURE file; "replay" answers from that file, offline and without an
+# API key, after ADAE_LLM_REPLAY_LATENCY seconds ("recorded" = as long as recorded)
+LLM_BACKEND = os.getenv("ADAE_LLM_BACKEND", "live")
+LLM_FIXTURE = os.getenv("ADAE_LLM_FIXTURE", os.path.join("benchmarks", "llm_fixture.json"))
+
+
+@_lazy("llm")
+def get_llm():
+    """The chat model behind both chains: ChatOpenAI, or its record/replay stand-in (llm_replay.py)."""
+    if LLM_BACKEND not in ("live", "record", "replay"):
+        raise ValueError(f"ADAE_LLM_BACKEND must be live, record or replay, not {LLM_BACKEND!r}")
+    if LLM_BACKEND == "replay":
+        from llm_replay import LLMFixture, replay_llm
+        latency = os.getenv("ADAE_LLM_REPLAY_LATENCY", "0")
+        return replay_llm(LLMFixture(LLM_FIXTURE, LLM_MODEL),
+                          latency if latency == "recorded" else float(latency))
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key or not str(api_key).strip():
+        raise MissingAPIKeyError(API_KEY_HELP)
+    from langchain_openai import ChatOpenAI
+    llm = ChatOpenAI(
+        model=LLM_MODEL,
+        temperature=0,
+        api_key=api_key,
+    )
+    if LLM_BACKEND == "record":
+        from llm_replay import LLMFixture, recording_llm
+        return recording_llm(llm, LLMFixture(LLM_FIXTURE, LLM_MODEL))
+    return llm
+
+
+@_lazy("llm_chain")
+def get_llm_chain():
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", SYSTEM_PROMPT),
+        ("human", "{question}")
+    ])
+    return prompt | get_llm() | JsonOutputParser()
+
+
+# Parsed questions are kept in memory and in data/.cache/parse_cache.sqlite, so a
+# repeated question skips the LLM, also across runs. ADAE_PARSE_CACHE sets another
+# file ("off" = memory only). Changing the prompt or model starts a fresh namespace;
+# replayed parses get one per fixture file and revision, so they are never served as
+# live answers.
+@_lazy("parse_cache")
+def get_parse_cache() -> ParseCache:
+    path = os.getenv("ADAE_PARSE_CACHE", os.path.join("data", ".cache", "parse_cache.sqlite"))
+    source = ()
+    if LLM_BACKEND == "replay":
+        fixture = os.path.abspath(LLM_FIXTURE)
+        source = ("replay", fixture, os.stat(fixture).st_mtime_ns if os.path.exists(fixture) else None)
+    return ParseCache(
+        None if path == "off" else path,
+        namespace=cache_namespace(SYSTEM_PROMPT, LLM_MODEL, 0, *source),
+        max_disk_entries=int(os.getenv("ADAE_PARSE_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("ADAE_PARSE_CACHE_TTL", str(7 * 24 * 3600))),
     )
-    sys.exit(1)
 
-llm = ChatOpenAI(
-    model="gpt-4o-mini",
-    temperature=0,
-    api_key=_openai_api_key,
-)
 
-prompt = ChatPromptTemplate.from_messages([
-    ("system", SYSTEM_PROMPT),
-    ("human", "{question}")
-])
+# Rule/vocabulary parser tried before both: its parse is used when its confidence
+# (share of the question it explained) reaches ADAE_FAST_PARSE_MIN_CONFIDENCE
+FAST_PARSE_MIN_CONFIDENCE = float(os.getenv("ADAE_FAST_PARSE_MIN_CONFIDENCE", "1.0"))
+
+
+@_lazy("fast_parser", depends=("adae",))
+def get_fast_parser() -> FastParser:
+    if STREAMING:
+        counts = get_source_profile().counts
+        return FastParser(list(counts.get("AEDECOD", {})), classes=list(counts.get("AESOC", {})))
+    return FastParser.from_frame(get_adae())
 
-parser = JsonOutputParser()
-llm_chain = prompt | llm | parser
+
+# Distinct values and row counts of every text column, with a fuzzy index for the
+# zero-result fallback (section 5). The LLM is asked for an alternative value only
+# when the index has nothing close, unless ADAE_LLM_VALUE_FALLBACK=0.
+@_lazy("value_index", depends=("adae",))
+def get_value_index() -> ValueIndex:
+    if STREAMING:
+        return ValueIndex.from_counts(get_source_profile().counts, VALID_COLUMNS)
+    return ValueIndex(get_adae(), VALID_COLUMNS)
+
+
+LLM_VALUE_FALLBACK = os.getenv("ADAE_LLM_VALUE_FALLBACK", "1") == "1"
+ALTERNATIVE_CANDIDATES = 3
 
 # Fallback: when no results, ask LLM for alternative filter_value from actual column values
 ALTERNATIVE_VALUE_PROMPT = """No rows matched for column "{column}" ({column_description}) with value "{original_value}".
@@ -201,58 +359,65 @@ Suggest ONE alternative filter value that is the closest match or spelling varia
 Return ONLY valid JSON: {{ "filter_value": "your_suggested_value" }}
 """
 
-alternative_parser = JsonOutputParser()
-alternative_prompt = ChatPromptTemplate.from_messages([
-    ("human", ALTERNATIVE_VALUE_PROMPT),
-])
-llm_alternative_chain = alternative_prompt | llm | alternative_parser
+
+@_lazy("llm_alternative_chain")
+def get_llm_alternative_chain():
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+    alternative_prompt = ChatPromptTemplate.from_messages([
+        ("human", ALTERNATIVE_VALUE_PROMPT),
+    ])
+    return alternative_prompt | get_llm() | JsonOutputParser()
 
 
 # ============================================================
-# 4️⃣ Apply Filter Safely (single filter)
+# 4️⃣ Apply Filters (compiled)
 # ============================================================
 
-def _apply_single_filter(
-    target_column: str,
-    filter_operator: str,
-    filter_value: Any,
-    df: pd.DataFrame,
-) -> pd.DataFrame:
-    """Apply one filter to a dataframe. Returns filtered dataframe."""
-    if target_column not in df.columns:
-        raise ValueError(f"Invalid column selected: {target_column}")
-
-    series = df[target_column]
-
-    # Numeric columns
-    if pd.api.types.is_numeric_dtype(series):
-        val = float(filter_value)
-        if filter_operator == "greater_than":
-            return df[series > val]
-        if filter_operator == "less_than":
-            return df[series < val]
-        if filter_operator == "equals":
-            return df[series == val]
-        raise ValueError(f"Invalid operator for numeric column: {filter_operator}")
-
-    # Text columns
-    series = series.astype(str)
-    val_upper = str(filter_value).upper()
-    if filter_operator == "equals":
-        return df[series.str.upper() == val_upper]
-    if filter_operator == "contains":
-        return df[series.str.upper().str.contains(re.escape(val_upper), na=False, regex=True)]
-    raise ValueError(f"Invalid operator for text column: {filter_operator}")
-
-
-def apply_filter(parsed_json: Dict[str, Any], df: pd.DataFrame) -> Dict[str, Any]:
+class LazyResult(dict):
     """
-    Apply one or more filters (AND logic).
-    parsed_json: either { "filters": [ { target_column, filter_operator, filter_value }, ... ] }
-                 or legacy { "target_column", "filter_operator", "filter_value" }.
+    dict whose `lazy` keys are computed on first access (result["filtered_df"] or .get)
+    and then kept. `key in result` is true before that, but iteration, len(), keys(),
+    items(), values() and dict(result) see only computed entries, so copying or
+    walking a response never builds them.
     """
+
+    def __init__(self, values: Dict[str, Any], lazy: Dict[str, Callable[[], Any]]):
+        super().__init__(values)
+        self._lazy = dict(lazy)
+        self._lock = threading.Lock()
+
+    def __missing__(self, key):
+        with self._lock:
+            if not dict.__contains__(self, key):
+                if key not in self._lazy:
+                    raise KeyError(key)
+                dict.__setitem__(self, key, self._lazy.pop(key)())
+        return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self._lazy
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+# Normalized columns of adae, built on first use by each column (see filter_engine.py)
+@_lazy("filter_engine", depends=("adae",))
+def get_filter_engine() -> FilterEngine:
+    return FilterEngine(get_adae())
+
+
+FILTER_KEYS = ("target_column", "filter_operator", "filter_value")
+
+
+def _filter_list(parsed_json: Dict[str, Any]) -> List[Dict[str, Any]]:
     # Normalize to list of filters
+    if not isinstance(parsed_json, dict):
+        raise ValueError(f"Parsed filter must be a JSON object, not {type(parsed_json).__name__}.")
     if "filters" in parsed_json:
+        if not isinstance(parsed_json["filters"], list):
+            raise ValueError("'filters' must be a list.")
         filters = list(parsed_json["filters"])
     else:
         # Legacy single-filter format
@@ -260,99 +425,445 @@ def apply_filter(parsed_json: Dict[str, Any], df: pd.DataFrame) -> Dict[str, Any
 
     if not filters:
         raise ValueError("At least one filter is required.")
-
-    filtered = df
+    # A well-formed JSON reply can still be the wrong shape; fail as unparseable, not later
     for f in filters:
-        filtered = _apply_single_filter(
-            f["target_column"],
-            f["filter_operator"],
-            f["filter_value"],
-            filtered,
-        )
+        if not isinstance(f, dict):
+            raise ValueError(f"Each filter must be a JSON object, not {type(f).__name__}.")
+        missing = [k for k in FILTER_KEYS if k not in f]
+        if missing:
+            raise ValueError(f"Filter {f!r} is missing {', '.join(missing)}.")
+        if not isinstance(f["target_column"], str) or not isinstance(f["filter_operator"], str):
+            raise ValueError(f"Filter {f!r}: target_column and filter_operator must be strings.")
+        if not isinstance(f["filter_value"], (str, int, float)):
+            raise ValueError(f"Filter {f!r}: filter_value must be a string or a number.")
+    return filters
 
-    unique_subjects = filtered["USUBJID"].unique().tolist()
-    return {
-        "count_unique_subjects": len(unique_subjects),
-        "subjects": unique_subjects,
-        "filtered_df": filtered,
-    }
+
+def apply_filter(parsed_json: Dict[str, Any], df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Apply one or more filters (AND logic).
+    parsed_json: either { "filters": [ { target_column, filter_operator, filter_value }, ... ] }
+                 or legacy { "target_column", "filter_operator", "filter_value" }.
+    """
+    filters = _filter_list(parsed_json)
+
+    # Subject-level answer from the per-value subject lists when the filters allow it,
+    # else most selective filter first on rows; filtered_df is built only when asked for
+    engine = get_filter_engine() if df is globals().get("adae") else FilterEngine(df)
+    subjects = engine.match_subjects(filters)
+    if subjects is not None:
+        unique_subjects = engine.subject_ids(subjects)
+        rows = lambda: engine.match_rows(filters)  # noqa: E731
+    else:
+        matched = engine.match_rows(filters)
+        unique_subjects = engine.subjects(matched)
+        rows = lambda: matched  # noqa: E731
+    return LazyResult(
+        {"count_unique_subjects": len(unique_subjects), "subjects": unique_subjects},
+        {"filtered_df": lambda: df.iloc[rows()]},
+    )
+
+
+def apply_filter_chunked(parsed_json: Dict[str, Any], profile: SourceProfile) -> Dict[str, Any]:
+    """
+    apply_filter over profile's file, one chunk at a time (see filter_scan.py): same
+    subjects in the same order. filtered_df is a second pass that holds the matching
+    rows, so it is built only when asked for.
+    """
+    filters = _filter_list(parsed_json)
+    found = scan_filters(profile, filters)
+    return LazyResult(
+        {"count_unique_subjects": len(found["subjects"]), "subjects": found["subjects"]},
+        {"filtered_df": lambda: scan_rows(profile, filters)},
+    )
+
+
+def _apply(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """The agent's filtering step: chunked scan in streaming mode, else the loaded table."""
+    if STREAMING:
+        return apply_filter_chunked(parsed, get_source_profile())
+    return apply_filter(parsed, get_adae())
 
 
 # ============================================================
 # 5️⃣ Main Agent
 # ============================================================
 
-def _get_sample_values_for_column(column: str, df: pd.DataFrame, max_values: int = 300) -> str:
-    """Get a sample of distinct values from the column for LLM fallback."""
-    series = df[column].dropna().astype(str).str.strip()
-    uniq = series.unique().tolist()
-    if len(uniq) <= max_values:
+def _get_sample_values_for_column(
+    column: str,
+    df: Optional[pd.DataFrame],
+    max_values: int = 300,
+    near: Optional[str] = None,
+) -> str:
+    """Distinct values of the column for the LLM fallback, those closest to `near` first."""
+    value_index = get_value_index()
+    if column in value_index:
+        vocab = value_index.columns[column]
+        uniq = vocab.ranked_values(near or "", max_values)
+        total = len(vocab.values)
+    elif df is not None:
+        uniq = df[column].dropna().astype(str).str.strip().unique().tolist()
+        total = len(uniq)
+        uniq = uniq[:max_values]
+    else:
+        uniq, total = [], 0
+    if total <= max_values:
         return "\n".join(uniq)
-    return "\n".join(uniq[:max_values]) + f"\n... and {len(uniq) - max_values} more"
+    return "\n".join(uniq) + f"\n... and {total - max_values} more"
 
 
-def _normalize_parsed(parsed: Dict[str, Any]) -> Dict[str, Any]:
-    """Ensure parsed has 'filters' list (support legacy single-filter format)."""
-    if "filters" in parsed and isinstance(parsed["filters"], list):
-        return parsed
-    if "target_column" in parsed:
-        return {"filters": [parsed]}
-    raise ValueError("Parsed JSON must have 'filters' list or legacy target_column/filter_operator/filter_value.")
+def _local_alternatives(column: str, f: Dict[str, Any]) -> Optional[List[str]]:
+    """
+    Replacement values from the value index for a filter of a query that matched
+    nothing, closest first; None when the filter matches rows on its own.
+    """
+    operator = f.get("filter_operator", "contains")
+    value_index = get_value_index()
+    if value_index.count(column, str(f["filter_value"]), operator):
+        return None  # another filter emptied the result
+    original = str(f["filter_value"]).strip().upper()
+    return [
+        value
+        for value, _, _ in value_index.suggest(
+            column, str(f["filter_value"]), operator, limit=ALTERNATIVE_CANDIDATES,
+        )
+        if value.upper() != original
+    ]
 
 
-def clinical_trial_data_agent(question: str):
+def _alternative_prompt_input(column: str, f: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "column": column,
+        "column_description": COLUMN_DESCRIPTIONS.get(column, column),
+        "original_value": f["filter_value"],
+        "sample_values": _get_sample_values_for_column(column, None if STREAMING else get_adae(),
+                                                        near=str(f["filter_value"])),
+    }
 
-    parsed = llm_chain.invoke({"question": question})
-    parsed = _normalize_parsed(parsed)
-    result = apply_filter(parsed, adae)
-    alternative_value_used = None  # e.g. "Pruritus" -> "PRURITUS" when fallback was used
 
-    # If no results, try alternative filter_value for the first text filter
+def _alternative_from_reply(alt: Any) -> List[str]:
+    suggested = alt.get("filter_value") if isinstance(alt, dict) else None
+    return [str(suggested).strip()] if suggested and str(suggested).strip() else []
+
+
+def _suggest_alternatives(column: str, f: Dict[str, Any], timer: StageTimer) -> List[str]:
+    """Replacement values for a filter of a query that matched nothing, closest first."""
+    suggestions = _local_alternatives(column, f)
+    if suggestions is None or suggestions or not LLM_VALUE_FALLBACK:
+        return suggestions or []
+    try:
+        alt = _invoke_chain(get_llm_alternative_chain(), _alternative_prompt_input(column, f),
+                            timer, "fallback_search")
+    except Exception:
+        return []
+    return _alternative_from_reply(alt)
+
+
+def _fallback_filters(parsed: Dict[str, Any], result: Dict[str, Any]):
+    """(position, column, filter) of the text filters to retry with alternative values, if nothing matched."""
+    if result["count_unique_subjects"] > 0:
+        return
+    for i, f in enumerate(parsed["filters"]):
+        col = f.get("target_column")
+        if _is_text_column(col):
+            yield i, col, f
+
+
+def _with_value(parsed: Dict[str, Any], i: int, value: str) -> Dict[str, Any]:
     filters = list(parsed["filters"])
-    if result["count_unique_subjects"] == 0 and filters:
-        for i, f in enumerate(filters):
-            col = f.get("target_column")
-            if col not in adae.columns or pd.api.types.is_numeric_dtype(adae[col]):
-                continue
-            sample_values = _get_sample_values_for_column(col, adae)
-            try:
-                alt = llm_alternative_chain.invoke({
-                    "column": col,
-                    "column_description": COLUMN_DESCRIPTIONS.get(col, col),
-                    "original_value": f["filter_value"],
-                    "sample_values": sample_values,
-                })
-                suggested = (alt or {}).get("filter_value")
-                if suggested and str(suggested).strip():
-                    filters_retry = [*filters]
-                    filters_retry[i] = {**f, "filter_value": str(suggested).strip()}
-                    parsed_retry = {"filters": filters_retry}
-                    result_retry = apply_filter(parsed_retry, adae)
-                    if result_retry["count_unique_subjects"] > 0:
-                        result = result_retry
-                        parsed = parsed_retry
-                        alternative_value_used = suggested
-                        break
-            except Exception:
-                continue
-        else:
-            pass  # no alternative helped
+    filters[i] = {**filters[i], "filter_value": value}
+    return {"filters": filters}
 
-    return {
+
+def _response(question: str, parsed: Dict[str, Any], result: Dict[str, Any],
+              alternative_value_used: Optional[str], parse_source: str) -> Dict[str, Any]:
+    return LazyResult({
         "question": question,
         "parsed_filter": parsed,
         "result": result,
-        "filtered_df": result["filtered_df"],
         "alternative_value_used": alternative_value_used,
-    }
+        "parse_source": parse_source,
+    }, {"filtered_df": lambda: result["filtered_df"]})
+
+
+_chain_parts: Dict[int, Tuple[Any, Any, Any]] = {}
+
+
+def _split_chain(chain) -> Tuple[Any, Any]:
+    """(chain up to its output parser, the parser), or (chain, None) when it does not end in one."""
+    parts = _chain_parts.get(id(chain))
+    if parts is None or parts[0] is not chain:
+        steps = getattr(chain, "steps", None) or []
+        if len(steps) >= 2 and hasattr(steps[-1], "parse_result"):
+            head = steps[0]
+            for step in steps[1:-1]:
+                head = head | step
+            parts = (chain, head, steps[-1])
+        else:
+            parts = (chain, chain, None)
+        _chain_parts[id(chain)] = parts
+    return parts[1], parts[2]
+
+
+def _invoke_chain(chain, inputs: Dict[str, Any], timer: StageTimer, stage: str) -> Any:
+    """chain.invoke(inputs); the model call is timed as `stage`, parsing its reply as "json_parse"."""
+    head, output_parser = _split_chain(chain)
+    with timer.stage(stage):
+        reply = head.invoke(inputs)
+    if output_parser is None:
+        return reply
+    with timer.stage("json_parse"):
+        return output_parser.invoke(reply)
+
+
+def _normalize_parsed(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ensure parsed has a 'filters' list of well-formed filters (support legacy
+    single-filter format); ValueError otherwise, before the reply is cached.
+    """
+    if isinstance(parsed, dict) and ("filters" in parsed or "target_column" in parsed):
+        filters = _filter_list(parsed)
+        return parsed if "filters" in parsed else {"filters": filters}
+    raise ValueError("Parsed JSON must have 'filters' list or legacy target_column/filter_operator/filter_value.")
+
+
+def _parse_question(question: str, timer: Optional[StageTimer] = None) -> Tuple[Dict[str, Any], str]:
+    """Filters for question and where they came from: "rules", "memory"/"disk" (parse cache) or "llm"."""
+    timer = timer or StageTimer()
+    with timer.stage("llm_parse"):
+        parsed, confidence = get_fast_parser().parse(question)
+        if parsed is not None and confidence >= FAST_PARSE_MIN_CONFIDENCE:
+            return parsed, "rules"
+        parse_cache = get_parse_cache()
+        cached = parse_cache.get(question)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        reply = _invoke_chain(get_llm_chain(), {"question": question}, timer, "llm_parse")
+        with timer.stage("json_parse"):
+            parsed = _normalize_parsed(reply)
+        parse_cache.put(question, parsed, time.perf_counter() - start)
+        return parsed, "llm"
+
+
+def clinical_trial_data_agent(question: str):
+
+    timer = StageTimer()
+    parsed, parse_source = _parse_question(question, timer)
+    with timer.stage("filter_apply"):
+        result = _apply(parsed)
+    alternative_value_used = None  # e.g. "Pruritus" -> "PRURITUS" when fallback was used
+
+    # If no results, try alternative filter_values for the first text filter that has
+    # any: closest values from the local value index, the LLM only if none is close
+    with timer.stage("fallback_search"):
+        for i, col, f in _fallback_filters(parsed, result):
+            for suggested in _suggest_alternatives(col, f, timer):
+                parsed_retry = _with_value(parsed, i, suggested)
+                try:
+                    result_retry = _apply(parsed_retry)
+                except Exception:
+                    continue
+                if result_retry["count_unique_subjects"] > 0:
+                    result = result_retry
+                    parsed = parsed_retry
+                    alternative_value_used = suggested
+                    break
+            if alternative_value_used is not None:
+                break
+
+    with timer.stage("result_assembly"):
+        response = _response(question, parsed, result, alternative_value_used, parse_source)
+    response["timings"] = timer.as_dict()
+    return response
 
 
 # ============================================================
-# 6️⃣ CLI
+# 6️⃣ Async Batch API
+# ============================================================
+
+# Questions answered at once by clinical_trial_data_agent_many; LLM calls are spaced
+# to ADAE_LLM_RATE per second (bursts of ADAE_LLM_BURST) and retried with backoff;
+# filtering runs on ADAE_FILTER_WORKERS threads, off the event loop
+BATCH_CONCURRENCY = int(os.getenv("ADAE_BATCH_CONCURRENCY", "8"))
+LLM_RATE_LIMIT = float(os.getenv("ADAE_LLM_RATE", "5"))
+LLM_RATE_BURST = int(os.getenv("ADAE_LLM_BURST", "10"))
+LLM_MAX_RETRIES = int(os.getenv("ADAE_LLM_RETRIES", "4"))
+FILTER_WORKERS = int(os.getenv("ADAE_FILTER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+
+def _llm_give_up() -> Tuple[type, ...]:
+    """Failures a retry cannot fix: unparseable replies (ValueError) and rejected requests."""
+    import openai
+    return (
+        ValueError,
+        LookupError,  # llm_replay.ReplayMiss
+        openai.AuthenticationError,
+        openai.BadRequestError,
+        openai.NotFoundError,
+        openai.PermissionDeniedError,
+    )
+
+
+class _AsyncLimits:
+    """LLM rate limit, retry policy and filter thread pool shared by concurrent questions."""
+
+    def __init__(self, rate: float, burst: int, retries: int, filter_workers: int):
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max(1, filter_workers), thread_name_prefix="adae-filter")
+
+    async def run(self, fn, *args):
+        """fn(*args) on the filter pool."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def llm(self, chain, inputs: Dict[str, Any]):
+        return await call_with_retry(
+            chain.ainvoke, inputs, bucket=self.bucket, retries=self.retries, give_up=_llm_give_up(),
+        )
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_default_limits: Optional[_AsyncLimits] = None
+
+
+async def _ainvoke_chain(chain, inputs: Dict[str, Any], timer: StageTimer, stage: str,
+                         limits: _AsyncLimits) -> Any:
+    """_invoke_chain with the model call awaited through limits."""
+    head, output_parser = _split_chain(chain)
+    with timer.stage(stage):
+        reply = await limits.llm(head, inputs)
+    if output_parser is None:
+        return reply
+    with timer.stage("json_parse"):
+        return output_parser.invoke(reply)
+
+
+async def _aparse_question(question: str, limits: _AsyncLimits,
+                           timer: StageTimer) -> Tuple[Dict[str, Any], str]:
+    """_parse_question with a non-blocking, rate-limited LLM call."""
+    with timer.stage("llm_parse"):
+        parsed, confidence = get_fast_parser().parse(question)
+        if parsed is not None and confidence >= FAST_PARSE_MIN_CONFIDENCE:
+            return parsed, "rules"
+        parse_cache = get_parse_cache()
+        cached = parse_cache.get(question)
+        if cached is not None:
+            return cached
+        start = time.perf_counter()
+        reply = await _ainvoke_chain(get_llm_chain(), {"question": question}, timer, "llm_parse", limits)
+        with timer.stage("json_parse"):
+            parsed = _normalize_parsed(reply)
+        parse_cache.put(question, parsed, time.perf_counter() - start)
+        return parsed, "llm"
+
+
+async def _asuggest_alternatives(column: str, f: Dict[str, Any], limits: _AsyncLimits,
+                                 timer: StageTimer) -> List[str]:
+    suggestions = await limits.run(_local_alternatives, column, f)
+    if suggestions is None or suggestions or not LLM_VALUE_FALLBACK:
+        return suggestions or []
+    try:
+        inputs = await limits.run(_alternative_prompt_input, column, f)
+        alt = await _ainvoke_chain(get_llm_alternative_chain(), inputs, timer, "fallback_search", limits)
+    except Exception:
+        return []
+    return _alternative_from_reply(alt)
+
+
+async def clinical_trial_data_agent_async(question: str, limits: Optional[_AsyncLimits] = None):
+    """
+    clinical_trial_data_agent for asyncio callers: same response, LLM calls awaited
+    (ainvoke) and filtering on a worker thread. Without limits, uses one set shared by
+    all such calls in the process (ADAE_LLM_* / ADAE_FILTER_WORKERS settings).
+    """
+    global _default_limits
+    if limits is None:
+        if _default_limits is None:
+            _default_limits = _AsyncLimits(LLM_RATE_LIMIT, LLM_RATE_BURST, LLM_MAX_RETRIES, FILTER_WORKERS)
+        limits = _default_limits
+
+    await limits.run(get_fast_parser)  # first call: load the dataset off the event loop
+    timer = StageTimer()
+    parsed, parse_source = await _aparse_question(question, limits, timer)
+    with timer.stage("filter_apply"):
+        result = await limits.run(_apply, parsed)
+    alternative_value_used = None
+
+    with timer.stage("fallback_search"):
+        for i, col, f in _fallback_filters(parsed, result):
+            for suggested in await _asuggest_alternatives(col, f, limits, timer):
+                parsed_retry = _with_value(parsed, i, suggested)
+                try:
+                    result_retry = await limits.run(_apply, parsed_retry)
+                except Exception:
+                    continue
+                if result_retry["count_unique_subjects"] > 0:
+                    result = result_retry
+                    parsed = parsed_retry
+                    alternative_value_used = suggested
+                    break
+            if alternative_value_used is not None:
+                break
+
+    with timer.stage("result_assembly"):
+        response = _response(question, parsed, result, alternative_value_used, parse_source)
+    response["timings"] = timer.as_dict()
+    return response
+
+
+async def clinical_trial_data_agent_many(
+    questions: Iterable[str],
+    concurrency: int = BATCH_CONCURRENCY,
+    rate: float = LLM_RATE_LIMIT,
+    burst: int = LLM_RATE_BURST,
+    retries: int = LLM_MAX_RETRIES,
+    filter_workers: int = FILTER_WORKERS,
+) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Answer questions with up to `concurrency` in flight; yields (position in
+    questions, response) as each one completes. A question that fails yields
+    {"question": ..., "error": ...} instead of stopping the batch.
+
+        async for i, response in clinical_trial_data_agent_many(questions):
+            ...
+    """
+    questions = list(questions)
+    limits = _AsyncLimits(rate, burst, retries, filter_workers)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def answer(i: int, question: str) -> Tuple[int, Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return i, await clinical_trial_data_agent_async(question, limits)
+            except Exception as e:
+                return i, {"question": question, "error": f"{type(e).__name__}: {e}"}
+
+    tasks = [asyncio.ensure_future(answer(i, q)) for i, q in enumerate(questions)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        limits.close()
+
+
+# ============================================================
+# 7️⃣ CLI
 # ============================================================
 
 if __name__ == "__main__":
 
+    try:
+        get_llm()
+    except MissingAPIKeyError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    get_fast_parser()
+
     print("ClinicalTrialDataAgent Ready")
 
     while True:
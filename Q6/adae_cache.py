@@ -0,0 +1,192 @@
+"""
+On-disk columnar cache for the agent's ADAE data.
+A parsed CSV is saved as an uncompressed Feather file next to it (data/.cache/),
+named after the CSV's size and mtime; the agent reads that file on later runs
+and only re-parses when the CSV changes. Requires pyarrow; without it every
+load is a plain read_csv.
+A downloaded dataset (pharmaverse ae.rda) is kept under data/.cache/downloads/,
+one folder per URL holding the file named by its content hash and the converted
+frame as Feather; it is re-validated with a conditional request once it is older
+than max_age, and used as is when the network is unavailable.
+"""
+
+import hashlib
+import json
+import os
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import Callable, Optional
+
+import pandas as pd
+
+CACHE_VERSION = 1
+
+# Seconds a downloaded file is used before asking the server whether it changed
+DOWNLOAD_MAX_AGE = 24 * 3600
+
+# Text columns with fewer distinct values than this fraction of rows become categoricals
+# (the rule and name of Q5's adae_store.py)
+CATEGORY_MAX_RATIO = 0.5
+
+
+def _has_pyarrow() -> bool:
+    try:
+        import pyarrow.feather  # noqa: F401  (only checks that pyarrow is installed)
+    except ImportError:
+        return False
+    return True
+
+
+def _cache_file(csv_path: str) -> str:
+    st = os.stat(csv_path)
+    fingerprint = f"{os.path.abspath(csv_path)}:{st.st_size}:{st.st_mtime_ns}:{CACHE_VERSION}"
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    tag = hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), ".cache", f"{name}.{tag}.feather")
+
+
+def to_columnar(df: pd.DataFrame) -> pd.DataFrame:
+    """Store repetitive text columns (AESEV, AESER, AESOC, ...) as categoricals."""
+    n = len(df)
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) or isinstance(series.dtype, pd.CategoricalDtype):
+            continue
+        if series.nunique(dropna=True) < max(1, n * CATEGORY_MAX_RATIO):
+            df[col] = series.astype("category")
+    return df
+
+
+def _read_feather(path: str) -> pd.DataFrame:
+    from pyarrow import feather
+    return feather.read_table(path, memory_map=True).to_pandas(split_blocks=True, self_destruct=True)
+
+
+def save_feather(df: pd.DataFrame, path: str) -> None:
+    """Atomically write df to path as uncompressed Feather."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_feather(tmp, compression="uncompressed")
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def read_csv_cached(csv_path: str) -> pd.DataFrame:
+    """read_csv(csv_path), served from the Feather cache when it matches the CSV."""
+    if not _has_pyarrow():
+        return pd.read_csv(csv_path)
+
+    cache_path = _cache_file(csv_path)
+    if os.path.exists(cache_path):
+        try:
+            return _read_feather(cache_path)
+        except (OSError, ValueError):
+            pass  # damaged cache file; re-parse the CSV
+
+    df = to_columnar(pd.read_csv(csv_path))
+    try:
+        save_feather(df, cache_path)
+    except OSError:
+        return df
+    # Remove caches for older versions of this CSV
+    cache_dir = os.path.dirname(cache_path)
+    stem = os.path.splitext(os.path.basename(csv_path))[0] + "."
+    for name in os.listdir(cache_dir):
+        if name.startswith(stem) and name.endswith(".feather") and name != os.path.basename(cache_path):
+            try:
+                os.unlink(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+    return df
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def _fetch(url: str, entry: str, meta: Optional[dict], timeout: float) -> dict:
+    """Download url into entry (conditional on the cached copy's ETag/Last-Modified); returns its metadata."""
+    request = urllib.request.Request(url)
+    if meta is not None:
+        if meta.get("etag"):
+            request.add_header("If-None-Match", meta["etag"])
+        if meta.get("last_modified"):
+            request.add_header("If-Modified-Since", meta["last_modified"])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as resp:
+            data = resp.read()
+            headers = resp.headers
+    except urllib.error.HTTPError as e:
+        if e.code != 304 or meta is None:
+            raise
+        meta = {**meta, "fetched": time.time()}  # not modified
+    else:
+        digest = hashlib.sha256(data).hexdigest()
+        name = f"{digest[:16]}{os.path.splitext(urllib.parse.urlparse(url).path)[1]}"
+        os.makedirs(entry, exist_ok=True)
+        if not os.path.exists(os.path.join(entry, name)):
+            _write_atomic(os.path.join(entry, name), data)
+        meta = {"url": url, "sha256": digest, "file": name, "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"), "fetched": time.time()}
+        # Remove files of earlier content of this URL
+        for old in os.listdir(entry):
+            if old != "meta.json" and not old.startswith(digest[:16]):
+                os.unlink(os.path.join(entry, old))
+    _write_atomic(os.path.join(entry, "meta.json"), json.dumps(meta).encode())
+    return meta
+
+
+def read_url_cached(
+    url: str,
+    cache_dir: str,
+    reader: Callable[[str], pd.DataFrame],
+    max_age: float = DOWNLOAD_MAX_AGE,
+    timeout: float = 30,
+) -> pd.DataFrame:
+    """
+    reader(local copy of url), with the download and the converted frame cached under
+    cache_dir/downloads keyed by URL and content hash. Raises OSError only when there
+    is no cached copy and the download fails.
+    """
+    entry = os.path.join(cache_dir, "downloads", hashlib.sha1(url.encode()).hexdigest()[:16])
+    try:
+        with open(os.path.join(entry, "meta.json")) as fh:
+            meta = json.load(fh)
+        if not os.path.exists(os.path.join(entry, meta["file"])):
+            meta = None
+    except (OSError, ValueError, KeyError):
+        meta = None
+    if meta is None or time.time() - meta.get("fetched", 0) > max_age:
+        try:
+            meta = _fetch(url, entry, meta, timeout)
+        except OSError:
+            if meta is None:
+                raise
+            # offline: keep using the cached copy
+
+    if not _has_pyarrow():
+        return reader(os.path.join(entry, meta["file"]))
+    frame_path = os.path.join(entry, f"{meta['sha256'][:16]}.v{CACHE_VERSION}.feather")
+    if os.path.exists(frame_path):
+        try:
+            return _read_feather(frame_path)
+        except (OSError, ValueError):
+            pass
+    df = to_columnar(reader(os.path.join(entry, meta["file"])))
+    try:
+        save_feather(df, frame_path)
+    except (OSError, ValueError, TypeError):
+        pass  # not representable in Feather; convert again next time
+    return df
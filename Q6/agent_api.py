@@ -0,0 +1,108 @@
+"""
+HTTP endpoint for the clinical trial data agent, served next to the Q5 API:
+  cd Q6 && uvicorn agent_api:app --port 8001
+POST /agent/query answers {"question": ...} with clinical_trial_data_agent_async.
+Requests whose questions normalize to the same text (parse_cache.normalize_question:
+case, spacing, trailing punctuation) while one is being answered share that answer:
+one LLM call and one filter evaluation, fanned out to every waiter (see
+single_flight.py). GET /agent/stats reports how many requests were deduplicated.
+A model call that fails after the agent's retries answers 503 for rate limits (with
+Retry-After), timeouts and rejected credentials, 502 otherwise; a prompt the replay
+fixture has no reply for answers 502. Every waiter on that question gets the same error.
+"""
+
+from typing import Any, Dict
+
+import openai
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+
+import ADAE_ClinicalTrialDataAgent as agent
+from llm_replay import ReplayMiss
+from parse_cache import normalize_question
+from single_flight import SingleFlight
+
+# ============================================================
+# 1️⃣ App Initialization
+# ============================================================
+
+app = FastAPI(
+    title="Clinical Trial Data Agent API",
+    version="1.0.0",
+)
+
+# Questions being answered, by normalized text
+flight = SingleFlight()
+
+
+@app.get("/")
+def root():
+    return {"message": "Clinical Trial Data Agent API is running"}
+
+
+# ============================================================
+# 2️⃣ Agent Endpoint
+# ============================================================
+
+class AgentQuery(BaseModel):
+    question: str = Field(..., min_length=1)
+
+
+def _body(question: str, response: Dict[str, Any], coalesced: bool) -> Dict[str, Any]:
+    """JSON view of an agent response (no filtered_df) for one waiter, with its own question text."""
+    result = response["result"]
+    return {
+        "question": question,
+        "parsed_filter": response["parsed_filter"],
+        "result": {
+            "count_unique_subjects": result["count_unique_subjects"],
+            "subjects": result["subjects"],
+        },
+        "alternative_value_used": response["alternative_value_used"],
+        "parse_source": response["parse_source"],
+        "timings": response["timings"],
+        # True when this request waited on an identical question already in flight
+        "coalesced": coalesced,
+    }
+
+
+def _llm_error(e: openai.APIError) -> HTTPException:
+    """HTTP error for a model call that failed after the agent's retries."""
+    if isinstance(e, openai.RateLimitError):
+        retry_after = e.response.headers.get("retry-after", "1")
+        return HTTPException(
+            status_code=503,
+            detail=f"LLM rate limit reached: {e}",
+            headers={"Retry-After": retry_after if retry_after.isdigit() else "1"},
+        )
+    if isinstance(e, (openai.APITimeoutError, openai.APIConnectionError)):
+        return HTTPException(status_code=503, detail=f"LLM unavailable: {e}", headers={"Retry-After": "1"})
+    if isinstance(e, (openai.AuthenticationError, openai.PermissionDeniedError)):
+        return HTTPException(status_code=503, detail=f"LLM rejected the server's credentials: {e}")
+    return HTTPException(status_code=502, detail=f"LLM call failed: {e}")
+
+
+@app.post("/agent/query")
+async def agent_query(request: AgentQuery):
+    key = normalize_question(request.question)
+    if not key:
+        raise HTTPException(status_code=422, detail="Question is empty.")
+    try:
+        response, coalesced = await flight.do(
+            key, lambda: agent.clinical_trial_data_agent_async(request.question)
+        )
+    except agent.MissingAPIKeyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ReplayMiss as e:
+        raise HTTPException(status_code=502, detail=f"No recorded LLM reply: {e}")
+    except openai.APIError as e:
+        raise _llm_error(e)
+    except ValueError as e:  # unparseable LLM reply or invalid filter
+        raise HTTPException(status_code=422, detail=f"Could not answer the question: {e}")
+    return _body(request.question, response, coalesced)
+
+
+@app.get("/agent/stats")
+def agent_stats():
+    """Requests received, agent runs started, requests deduplicated onto a run in flight."""
+    return flight.stats()
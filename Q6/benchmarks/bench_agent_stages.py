@@ -0,0 +1,121 @@
+"""
+Benchmark: where clinical_trial_data_agent spends its time, per stage, offline.
+Run from the Q6 folder:
+  python benchmarks/bench_agent_stages.py [--llm-only] [--latency SECONDS|recorded]
+                                          [--repeat N] [--json OUT]
+  python benchmarks/bench_agent_stages.py --seed-from-labels
+Answers the labeled questions in benchmarks/labeled_questions.json with the LLM
+replayed from ADAE_LLM_FIXTURE (ADAE_LLM_BACKEND=replay, no network, no API key)
+and the parse cache cleared before each question, and prints p50/p99 milliseconds per stage
+(llm_parse, json_parse, filter_apply, fallback_search, result_assembly, total);
+--json also writes them, with the settings, for comparison between runs.
+--llm-only sends every question to the (replayed) LLM instead of trying the rule
+parser first. The fixture defaults to benchmarks/llm_fixture_synthetic.json, whose
+replies are not recordings: --seed-from-labels (re)writes them from the labels, for
+when the prompt changed and no API key is at hand. They give the stage timings of
+the agent's own code, not how the real model parses. Recording real replies
+instead (written to benchmarks/llm_fixture.json, then replayed with
+ADAE_LLM_FIXTURE=benchmarks/llm_fixture.json): ADAE_LLM_BACKEND=record
+python test_agent_queries.py --batch benchmarks/labeled_questions.json.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+
+_q6 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _q6)
+
+from stage_timer import STAGES as _STAGES  # noqa: E402
+
+STAGES = _STAGES + ("total",)
+
+# Replies seeded from the labels (source "labels"), not recorded from the model
+SYNTHETIC_FIXTURE = os.path.join("benchmarks", "llm_fixture_synthetic.json")
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def seed_from_labels(labeled):
+    import ADAE_ClinicalTrialDataAgent as agent
+    from llm_replay import LLMFixture
+
+    fixture = LLMFixture(agent.LLM_FIXTURE, agent.LLM_MODEL)
+    prompt = agent.get_llm_chain().steps[0]
+    for item in labeled:
+        messages = prompt.invoke({"question": item["question"]}).to_messages()
+        fixture.put(messages, json.dumps({"filters": item["filters"]}), 0.0, source="labels")
+    print(f"Wrote {len(labeled)} replies to {agent.LLM_FIXTURE}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--llm-only", action="store_true")
+    ap.add_argument("--latency", default="0")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--json")
+    ap.add_argument("--seed-from-labels", action="store_true")
+    args = ap.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    os.chdir(_q6)
+    os.environ["ADAE_LLM_BACKEND"] = "replay"
+    os.environ.setdefault("ADAE_LLM_FIXTURE", SYNTHETIC_FIXTURE)
+    os.environ["ADAE_LLM_REPLAY_LATENCY"] = args.latency
+    os.environ["ADAE_PARSE_CACHE"] = "off"
+    if args.llm_only:
+        os.environ["ADAE_FAST_PARSE_MIN_CONFIDENCE"] = "2"  # above any confidence
+
+    with open(os.path.join("benchmarks", "labeled_questions.json")) as fh:
+        labeled = json.load(fh)
+    if args.seed_from_labels:
+        seed_from_labels(labeled)
+        return
+
+    import ADAE_ClinicalTrialDataAgent as agent
+
+    agent.clinical_trial_data_agent(labeled[0]["question"])  # build data and indexes
+    timings = {stage: [] for stage in STAGES}
+    sources, errors = {}, 0
+    parse_cache = agent.get_parse_cache()
+    for _ in range(args.repeat):
+        for item in labeled:
+            parse_cache.clear()
+            try:
+                response = agent.clinical_trial_data_agent(item["question"])
+            except Exception as e:
+                errors += 1
+                print(f"  error: {item['question']}: {type(e).__name__}: {e}", file=sys.stderr)
+                continue
+            sources[response["parse_source"]] = sources.get(response["parse_source"], 0) + 1
+            for stage in STAGES:
+                timings[stage].append(response["timings"][stage])
+
+    n = len(timings["total"])
+    print(f"{n} answers ({len(labeled)} questions x {args.repeat}), parse sources {sources}, "
+          f"{errors} error(s), replay latency {args.latency}, fixture {agent.LLM_FIXTURE}")
+    print(f"{'stage':<16} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    summary = {}
+    for stage in STAGES:
+        values = timings[stage] or [0.0]
+        summary[stage] = {
+            "p50_ms": round(statistics.median(values), 3),
+            "p99_ms": round(_percentile(values, 0.99), 3),
+            "mean_ms": round(statistics.fmean(values), 3),
+        }
+        print(f"{stage:<16} {summary[stage]['p50_ms']:>10.3f} {summary[stage]['p99_ms']:>10.3f} "
+              f"{summary[stage]['mean_ms']:>10.3f}")
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump({"settings": vars(args), "fixture": agent.LLM_FIXTURE, "answers": n, "errors": errors,
+                       "parse_sources": sources, "stages": summary}, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
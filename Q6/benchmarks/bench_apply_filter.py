@@ -0,0 +1,124 @@
+"""
+Benchmark: apply_filter via the compiled FilterEngine vs the original filter-by-filter path.
+Run from the Q6 folder:  python benchmarks/bench_apply_filter.py [n_rows ...]
+Defaults to 100k, 1M and 10M rows sampled from data/adae.csv (text columns stored
+as categoricals, as the agent loads them). Times 1-, 3- and 5-filter queries; the
+engine's first query on a column includes normalizing that column ("cold").
+"""
+
+import os
+import re
+import sys
+import time
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+
+_q6 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _q6)
+
+from adae_cache import to_columnar  # noqa: E402
+from filter_engine import FilterEngine  # noqa: E402
+
+COLUMNS = ["USUBJID", "AETERM", "AEDECOD", "AESOC", "AESEV", "AESER", "AEREL",
+           "AESDTH", "AESHOSP", "AESTDY"]
+
+
+def _f(column, operator, value):
+    return {"target_column": column, "filter_operator": operator, "filter_value": value}
+
+
+QUERIES = {
+    1: [_f("AEDECOD", "contains", "PRURITUS")],
+    3: [_f("AESEV", "equals", "MILD"), _f("AEDECOD", "contains", "APPLICATION SITE"),
+        _f("AESTDY", "greater_than", 10)],
+    5: [_f("AESEV", "equals", "MODERATE"), _f("AESOC", "contains", "DISORDERS"),
+        _f("AEREL", "equals", "PROBABLE"), _f("AESTDY", "less_than", 60),
+        _f("AEDECOD", "contains", "ERYTHEMA")],
+}
+
+
+def synthesize(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """Rows drawn from adae.csv, with fresh USUBJIDs at adae.csv's events per subject."""
+    src = pd.read_csv(os.path.join(_q6, "data", "adae.csv"), usecols=COLUMNS)
+    rng = np.random.default_rng(seed)
+    df = src.iloc[rng.integers(0, len(src), n_rows)].reset_index(drop=True)
+    n_subjects = max(1, int(n_rows * src["USUBJID"].nunique() / len(src)))
+    codes = np.sort(rng.integers(0, n_subjects, n_rows))
+    df["USUBJID"] = pd.Categorical.from_codes(
+        pd.factorize(codes)[0], [f"SYN-{i:07d}" for i in range(len(np.unique(codes)))]
+    )
+    return to_columnar(df)
+
+
+def _legacy_single_filter(target_column: str, filter_operator: str, filter_value: Any,
+                          df: pd.DataFrame) -> pd.DataFrame:
+    """The original _apply_single_filter, kept verbatim for comparison."""
+    if target_column not in df.columns:
+        raise ValueError(f"Invalid column selected: {target_column}")
+    series = df[target_column]
+    if pd.api.types.is_numeric_dtype(series):
+        val = float(filter_value)
+        if filter_operator == "greater_than":
+            return df[series > val]
+        if filter_operator == "less_than":
+            return df[series < val]
+        if filter_operator == "equals":
+            return df[series == val]
+        raise ValueError(f"Invalid operator for numeric column: {filter_operator}")
+    series = series.astype(str)
+    val_upper = str(filter_value).upper()
+    if filter_operator == "equals":
+        return df[series.str.upper() == val_upper]
+    if filter_operator == "contains":
+        return df[series.str.upper().str.contains(re.escape(val_upper), na=False, regex=True)]
+    raise ValueError(f"Invalid operator for text column: {filter_operator}")
+
+
+def legacy_apply_filter(filters, df: pd.DataFrame) -> Dict[str, Any]:
+    filtered = df
+    for f in filters:
+        filtered = _legacy_single_filter(f["target_column"], f["filter_operator"], f["filter_value"], filtered)
+    return {"subjects": filtered["USUBJID"].unique().tolist(), "rows": len(filtered)}
+
+
+def engine_apply_filter(engine: FilterEngine, filters, df: pd.DataFrame) -> Dict[str, Any]:
+    rows = engine.match_rows(filters)
+    filtered = df.iloc[rows]
+    return {"subjects": engine.subjects(rows), "rows": len(filtered)}
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(sizes):
+    print(f"{'rows':>12} {'filters':>8} {'original ms':>12} {'engine cold ms':>15} "
+          f"{'engine ms':>10} {'speedup':>8} {'subjects':>9}")
+    for n_rows in sizes:
+        df = synthesize(n_rows)
+        engine = FilterEngine(df)
+        repeat = 3 if n_rows <= 1_000_000 else 1
+        for n_filters, filters in QUERIES.items():
+            expected = legacy_apply_filter(filters, df)
+            t0 = time.perf_counter()
+            got = engine_apply_filter(engine, filters, df)
+            cold = time.perf_counter() - t0
+            assert got == expected, f"engine result differs for {n_filters} filter(s)"
+            legacy = _time(lambda filters=filters, df=df: legacy_apply_filter(filters, df), repeat)
+            warm = _time(lambda filters=filters, df=df, engine=engine: engine_apply_filter(engine, filters, df),
+                         max(repeat, 3))
+            print(f"{n_rows:>12,} {n_filters:>8} {legacy * 1000:>12.1f} {cold * 1000:>15.1f} "
+                  f"{warm * 1000:>10.1f} {legacy / warm:>7.1f}x {len(expected['subjects']):>9,}")
+        del df, engine
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [100_000, 1_000_000, 10_000_000]
+    main(sizes)
@@ -0,0 +1,90 @@
+"""
+Benchmark: subject-level answers (posting-list intersection) vs row-level filtering.
+Run from the Q6 folder:  python benchmarks/bench_subject_index.py [n_rows ...]
+Defaults to 1M and 10M rows sampled from data/adae.csv as in bench_apply_filter.py,
+plus a subject-level STUDYID column (four studies). Times the subject list
+of each query through FilterEngine.match_subjects where it applies ("exact"; the
+other queries fall back to rows) against match_rows + subjects, checks both agree,
+and times the subject count alone, which needs no USUBJID strings.
+"Index build" is the one-off cost of the posting lists of the query's columns.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+_q6 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _q6)
+sys.path.insert(0, os.path.join(_q6, "benchmarks"))
+
+from bench_apply_filter import synthesize  # noqa: E402
+from filter_engine import FilterEngine  # noqa: E402
+
+
+def _f(column, operator, value):
+    return {"target_column": column, "filter_operator": operator, "filter_value": value}
+
+
+QUERIES = {
+    "severity": [_f("AESEV", "equals", "SEVERE")],
+    "term contains": [_f("AEDECOD", "contains", "PRURITUS")],
+    "study + serious": [_f("STUDYID", "equals", "STUDY-2"), _f("AESER", "equals", "Y")],
+    "severe + term": [_f("AESEV", "equals", "SEVERE"), _f("AEDECOD", "contains", "ERYTHEMA")],
+    "3 event filters": [_f("AESEV", "equals", "MODERATE"), _f("AEREL", "equals", "PROBABLE"),
+                        _f("AEDECOD", "contains", "APPLICATION SITE")],
+}
+
+
+def by_rows(engine, filters):
+    return engine.subjects(engine.match_rows(filters))
+
+
+def by_subjects(engine, filters):
+    subjects = engine.match_subjects(filters)
+    if subjects is not None:
+        return engine.subject_ids(subjects)
+    return engine.subjects(engine.match_rows(filters))
+
+
+def _time(fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(sizes):
+    print(f"{'rows':>12} {'query':<16} {'exact':>6} {'index build ms':>15} {'rows ms':>9} "
+          f"{'subjects ms':>12} {'speedup':>8} {'count ms':>9} {'subjects':>9}")
+    for n_rows in sizes:
+        df = synthesize(n_rows)
+        codes = pd.factorize(df["USUBJID"])[0]
+        df["STUDYID"] = pd.Categorical.from_codes(codes % 4, [f"STUDY-{i}" for i in range(4)])
+        engine = FilterEngine(df)
+        for name, filters in QUERIES.items():
+            expected = by_rows(engine, filters)
+            t0 = time.perf_counter()
+            exact = engine.match_subjects(filters) is not None
+            build = time.perf_counter() - t0
+            got = by_subjects(engine, filters)
+            assert got == expected, f"subject path differs for {name}"
+            rows = _time(lambda engine=engine, filters=filters: by_rows(engine, filters))
+            subjects = _time(lambda engine=engine, filters=filters: by_subjects(engine, filters))
+            count = (_time(lambda engine=engine, filters=filters: len(engine.match_subjects(filters)))
+                     if exact else float("nan"))
+            print(f"{n_rows:>12,} {name:<16} {str(exact):>6} {build * 1000:>15.1f} {rows * 1000:>9.2f} "
+                  f"{subjects * 1000:>12.2f} {rows / subjects:>7.1f}x {count * 1000:>9.2f} {len(expected):>9,}")
+        postings = sum(c.postings.subjects.nbytes + c.postings.offsets.nbytes
+                       for c in engine._columns.values() if getattr(c, "postings", None) is not None)
+        print(f"{'':>12} posting lists: {postings / 1e6:.1f} MB for {len(np.unique(codes)):,} subjects")
+        del df, engine
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [1_000_000, 10_000_000]
+    main(sizes)
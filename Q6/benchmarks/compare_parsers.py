@@ -0,0 +1,150 @@
+"""
+Benchmark: accuracy and latency of the rule-based fast path vs the LLM parser.
+Run from the Q6 folder:  python benchmarks/compare_parsers.py [--llm]
+Scores two labeled sets separately. benchmarks/labeled_questions.json was written
+alongside fast_parser.py and its rules were tuned on it, so its scores are not an
+accuracy estimate. benchmarks/heldout_questions.json is held out: it was frozen
+without changing the parser after it was scored, and it must not be used to tune the
+rules (add new tuning questions to the other file). A parse counts as exact when its
+filters equal the label (order- and case-insensitive) and as correct when it selects
+the same subjects from data/adae.csv as the label.
+The fast path is scored only on questions it answers confidently (coverage);
+with --llm (needs OPENAI_API_KEY) every question also goes through llm_chain, and
+the combined row is what the agent does: fast path when confident, else LLM.
+With ADAE_LLM_BACKEND=replay the LLM answers from a recorded fixture instead (no
+key needed). A fixture with replies seeded from the labels (the synthetic one of
+bench_agent_stages.py) would match them by construction, so the LLM rows are then
+left out and only the fast path is scored.
+"""
+
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+_q6 = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, _q6)
+
+import pandas as pd  # noqa: E402
+
+from adae_cache import read_csv_cached  # noqa: E402
+from fast_parser import FastParser  # noqa: E402
+
+MIN_CONFIDENCE = 1.0
+
+
+def _filter_key(filters):
+    return sorted(
+        (f["target_column"].upper(), f["filter_operator"], str(f["filter_value"]).upper())
+        for f in filters
+    )
+
+
+def _subjects(filters, df: pd.DataFrame):
+    """Subjects matching all filters, with the agent's operator semantics."""
+    mask = pd.Series(True, index=df.index)
+    for f in filters:
+        col, op, val = f["target_column"], f["filter_operator"], f["filter_value"]
+        if col not in df.columns:
+            return None
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series):
+            val = float(val)
+            mask &= {"greater_than": series > val, "less_than": series < val, "equals": series == val}[op]
+        else:
+            text = series.astype(str).str.upper()
+            val = str(val).upper()
+            mask &= text == val if op == "equals" else text.str.contains(re.escape(val), na=False)
+    return set(df.loc[mask, "USUBJID"])
+
+
+def _score(name, outcomes, total):
+    """outcomes: (exact, correct, seconds) per answered question."""
+    if not outcomes:
+        print(f"{name:<10} {0:>8} {'-':>8} {'-':>8} {'-':>10} {'-':>10}")
+        return
+    answered = len(outcomes)
+    exact = sum(o[0] for o in outcomes) / answered
+    correct = sum(o[1] for o in outcomes) / answered
+    times = sorted(o[2] * 1000 for o in outcomes)
+    p99 = times[min(len(times) - 1, int(0.99 * len(times)))]
+    print(f"{name:<10} {answered / total:>8.0%} {exact:>8.0%} {correct:>8.0%} "
+          f"{statistics.median(times):>10.2f} {p99:>10.2f}")
+
+
+def _seeded_from_labels(agent) -> bool:
+    from llm_replay import LLMFixture
+    fixture = LLMFixture(agent.LLM_FIXTURE, agent.LLM_MODEL)
+    return any(e.get("source") == "labels" for e in fixture.responses.values())
+
+
+# (name, file under benchmarks/)
+QUESTION_SETS = [
+    ("tuning", "labeled_questions.json"),
+    ("held-out", "heldout_questions.json"),
+]
+
+
+def main(use_llm: bool):
+    df = read_csv_cached(os.path.join(_q6, "data", "adae.csv"))
+    df.columns = df.columns.str.upper()
+    parser = FastParser.from_frame(df)
+
+    llm_chain = normalize = None
+    if use_llm:
+        os.chdir(_q6)
+        import ADAE_ClinicalTrialDataAgent as agent
+        if agent.LLM_BACKEND == "replay" and _seeded_from_labels(agent):
+            print(f"{agent.LLM_FIXTURE} holds replies seeded from the labels, not recorded ones: "
+                  "LLM rows left out", file=sys.stderr)
+        else:
+            from ADAE_ClinicalTrialDataAgent import llm_chain, _normalize_parsed as normalize
+
+    for set_name, filename in QUESTION_SETS:
+        with open(os.path.join(_q6, "benchmarks", filename)) as fh:
+            labeled = json.load(fh)
+        print(f"\n{set_name}: {filename}", file=sys.stderr)
+        _evaluate(set_name, labeled, df, parser, llm_chain, normalize)
+
+
+def _evaluate(set_name, labeled, df, parser, llm_chain, normalize):
+    fast, llm, combined = [], [], []
+    for item in labeled:
+        expected_key = _filter_key(item["filters"])
+        expected_subjects = _subjects(item["filters"], df)
+
+        def outcome(parsed, seconds, expected_key=expected_key, expected_subjects=expected_subjects):
+            filters = parsed["filters"]
+            return (_filter_key(filters) == expected_key,
+                    _subjects(filters, df) == expected_subjects, seconds)
+
+        start = time.perf_counter()
+        parsed, confidence = parser.parse(item["question"])
+        fast_seconds = time.perf_counter() - start
+        confident = parsed is not None and confidence >= MIN_CONFIDENCE
+        if confident:
+            fast.append(outcome(parsed, fast_seconds))
+
+        if llm_chain is not None:
+            start = time.perf_counter()
+            llm_parsed = normalize(llm_chain.invoke({"question": item["question"]}))
+            llm_seconds = time.perf_counter() - start
+            llm.append(outcome(llm_parsed, llm_seconds))
+            combined.append(fast[-1] if confident else outcome(llm_parsed, fast_seconds + llm_seconds))
+
+        status = "fast" if confident else "llm "
+        print(f"  [{status}] {item['question']}", file=sys.stderr)
+
+    total = len(labeled)
+    print(f"\n{set_name}: {len(labeled)} labeled questions")
+    print(f"{'parser':<10} {'coverage':>8} {'exact':>8} {'correct':>8} {'p50 ms':>10} {'p99 ms':>10}")
+    _score("fast path", fast, total)
+    if llm_chain is not None:
+        _score("llm", llm, total)
+        _score("combined", combined, total)
+
+
+if __name__ == "__main__":
+    main("--llm" in sys.argv[1:])
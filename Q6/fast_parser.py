@@ -0,0 +1,235 @@
+"""
+Deterministic parser for common questions, tried before the LLM.
+Keyword rules cover severity (AESEV), outcome flags (AESDTH, AESHOSP, AESER, ...)
+and study-day bounds (AESTDY). Words naming a system organ class ("cardiac
+disorders", "infections and infestations") must spell part of one AESOC value,
+which becomes an AESOC "contains" filter; the remaining words must spell a phrase
+found in the dataset's AEDECOD vocabulary, which becomes an AEDECOD "contains"
+filter. parse() returns the same {"filters": [...]} structure as llm_chain plus a
+confidence: the share of the question's content words the rules explained, or 0
+for constructs the rules cannot express (negation, "or", several severities or
+terms, organ class words outside the AESOC vocabulary or shared by several
+classes). A term phrase that may name a category rather than an event (a lone
+word of an AESOC value such as "cardiac" or "skin", a word naming an outcome flag
+such as "cancer", or words found only before a term's last word such as "site")
+still yields its filter but counts as unexplained. Callers use the LLM below their
+confidence threshold.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import pandas as pd
+
+# Outcome flags: (pattern, column); a match means column equals "Y"
+FLAG_RULES = [
+    (r"\b(?:died|dies|die|dead|deaths?|fatal(?:ly)?|deceased)\b", "AESDTH"),
+    (r"\bhospitali[sz](?:ed|ation|ations)\b|\bhospital\b", "AESHOSP"),
+    (r"\bserious(?:ly)?\b", "AESER"),
+    (r"\blife[- ]threatening\b", "AESLIFE"),
+    (r"\bdisabilit(?:y|ies)\b|\bdisabling\b|\bincapacit\w*", "AESDISAB"),
+    (r"\bcongenital\b|\bbirth defects?\b", "AESCONG"),
+    (r"\boverdos(?:e|es|ed)\b", "AESOD"),
+]
+
+SEVERITY_PATTERN = r"\b(mild|moderate|severe)(?:ly)?\b"
+
+# Study-day bounds: (pattern with the day number as group 1, operator)
+DAY_RULES = [
+    (r"\b(?:after|later than|beyond)\s+(?:study\s+)?day\s+(-?\d+)\b", "greater_than"),
+    (r"\b(?:before|earlier than|prior to)\s+(?:study\s+)?day\s+(-?\d+)\b", "less_than"),
+    (r"\bon\s+(?:study\s+)?day\s+(-?\d+)\b", "equals"),
+]
+
+# Constructs a list of AND-ed filters cannot express
+UNSUPPORTED_PATTERN = r"\b(?:not|no|non|never|without|except|excluding|or|either|neither|nor)\b"
+
+# Plural words that name MedDRA system organ classes (AESOC), not event terms
+SOC_MARKERS = {
+    "circumstances", "complications", "disorders", "infections", "infestations",
+    "investigations", "neoplasms", "poisoning", "procedures",
+}
+
+# Term words that also name an outcome flag the rules do not set (AESCAN)
+FLAG_TERM_WORDS = {"cancer", "malignancy"}
+
+STOP_WORDS = {
+    "a", "about", "across", "adverse", "ae", "aes", "all", "an", "and", "any", "are", "arm",
+    "at", "be", "been", "both", "by", "case", "cases", "did", "do", "does", "during", "effect",
+    "effects", "event", "events", "experience", "experienced", "experiencing", "find", "for",
+    "from", "get", "give", "got", "had", "has", "have", "having", "how", "in", "involving",
+    "is", "least", "list", "many", "me", "needed", "of", "one", "onset", "or", "participant",
+    "participants", "patient", "patients", "people", "reaction", "reactions", "report",
+    "reported", "reporting", "require", "required", "requiring", "show", "side", "start",
+    "started", "starting", "study", "subject", "subjects", "suffer", "suffered", "that", "the",
+    "their", "there", "those", "to", "trial", "was", "were", "what", "which", "while", "who",
+    "whom", "whose", "with",
+}
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9][a-z0-9'\-]*", text.lower())
+
+
+def _values(values: List[str]) -> List[str]:
+    return sorted({str(v).strip().upper() for v in values if str(v).strip()})
+
+
+class FastParser:
+    """Rules plus the AEDECOD (and AESOC) vocabulary of one dataset."""
+
+    def __init__(
+        self,
+        terms: List[str],
+        term_column: str = "AEDECOD",
+        classes: Optional[List[str]] = None,
+        class_column: str = "AESOC",
+    ):
+        self.term_column = term_column
+        self.terms = _values(terms)
+        # Space-padded term text, so phrases match whole words only
+        self._padded = [f" {' '.join(_words(t))} " for t in self.terms]
+        self._vocab: Set[str] = {w for t in self.terms for w in _words(t)}
+        self.class_column = class_column
+        self.classes = _values(classes or [])
+        # Content words of each class with their character span, e.g. "INJURY, POISONING AND ..."
+        self._class_words = [
+            [(m.group(0).lower(), m.start(), m.end()) for m in re.finditer(r"[A-Z0-9][A-Z0-9'\-]*", c)
+             if m.group(0).lower() not in STOP_WORDS]
+            for c in self.classes
+        ]
+        self._class_vocab: Set[str] = {w for words in self._class_words for w, _, _ in words}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, term_column: str = "AEDECOD", class_column: str = "AESOC") -> "FastParser":
+        def values(column):
+            return df[column].dropna().astype(str).unique().tolist() if column in df.columns else []
+        return cls(values(term_column), term_column, values(class_column), class_column)
+
+    def _vocab_word(self, word: str) -> Optional[str]:
+        """word, or its singular, as spelled in the vocabulary (fractures -> fracture)."""
+        for candidate in (word, word[:-1] if word.endswith("s") else None,
+                          word[:-2] if word.endswith("es") else None):
+            if candidate and candidate in self._vocab:
+                return candidate
+        return None
+
+    def _is_phrase(self, words: List[str]) -> bool:
+        needle = f" {' '.join(words)} "
+        return any(needle in term for term in self._padded)
+
+    def _term_phrases(self, words: List[str]) -> Tuple[List[str], int]:
+        """Longest vocabulary phrases covering words (left to right); returns (phrases, words explained)."""
+        phrases, explained, i = [], 0, 0
+        while i < len(words):
+            first = self._vocab_word(words[i])
+            if first is None:
+                i += 1
+                continue
+            run = [first]
+            j = i + 1
+            while j < len(words):
+                nxt = self._vocab_word(words[j])
+                if nxt is None or not self._is_phrase(run + [nxt]):
+                    break
+                run.append(nxt)
+                j += 1
+            if self._is_phrase(run):
+                phrases.append(" ".join(run).upper())
+                explained += len(run)
+            i = j
+        return phrases, explained
+
+    def _is_category(self, phrase: str) -> bool:
+        """True when a term phrase may name a group of events rather than one (see module docstring)."""
+        words = _words(phrase)
+        if len(words) == 1 and (
+            words[0] in FLAG_TERM_WORDS or words[0] in self._class_vocab or words[0] + "s" in self._class_vocab
+        ):
+            return True
+        needle = f" {' '.join(words)} "
+        return not any(term.endswith(needle) for term in self._padded)
+
+    def _class_phrase(self, words: List[str]) -> Optional[Tuple[str, int, int]]:
+        """
+        Longest run words[i:j] that is consecutive in one organ class and includes a
+        SOC_MARKERS word, as (that part of the class as spelled there, i, j); None if
+        there is none.
+        """
+        best = None
+        for cls, class_words in zip(self.classes, self._class_words):
+            for i in range(len(words)):
+                for k, (word, _, _) in enumerate(class_words):
+                    if word != words[i]:
+                        continue
+                    n = 1
+                    while (i + n < len(words) and k + n < len(class_words)
+                           and class_words[k + n][0] == words[i + n]):
+                        n += 1
+                    if SOC_MARKERS.isdisjoint(words[i:i + n]) or (best and best[2] - best[1] >= n):
+                        continue
+                    best = (cls[class_words[k][1]:class_words[k + n - 1][2]], i, i + n)
+        return best
+
+    def parse(self, question: str) -> Tuple[Optional[Dict[str, Any]], float]:
+        """({"filters": [...]}, confidence), or (None, 0.0) when no rule applies."""
+        text = " " + question.lower() + " "
+        if re.search(UNSUPPORTED_PATTERN, text) or re.search(r"\bnon-", text):
+            return None, 0.0
+
+        filters: List[Dict[str, Any]] = []
+        severities = {m.group(1).upper() for m in re.finditer(SEVERITY_PATTERN, text)}
+        if len(severities) > 1:
+            return None, 0.0
+        for sev in severities:
+            filters.append({"target_column": "AESEV", "filter_operator": "equals", "filter_value": sev})
+        text = re.sub(SEVERITY_PATTERN, " ", text)
+
+        for pattern, column in FLAG_RULES:
+            if re.search(pattern, text):
+                filters.append({"target_column": column, "filter_operator": "equals", "filter_value": "Y"})
+                text = re.sub(pattern, " ", text)
+
+        for pattern, operator in DAY_RULES:
+            for m in re.finditer(pattern, text):
+                filters.append({"target_column": "AESTDY", "filter_operator": operator,
+                                "filter_value": int(m.group(1))})
+            text = re.sub(pattern, " ", text)
+
+        explained = len(filters)
+        content = [w for w in _words(text) if w not in STOP_WORDS]
+        classes_explained = 0
+        if not SOC_MARKERS.isdisjoint(content):
+            found = self._class_phrase(content)
+            if found is None:
+                return None, 0.0
+            value, i, j = found
+            phrases, words_explained = self._term_phrases(content[i - 1:j]) if i > 0 else ([], 0)
+            if len(phrases) == 1 and words_explained == j - i + 1:
+                pass  # an event term ending in the class words ("urinary tract infections")
+            elif i > 0 or (SOC_MARKERS.issuperset(content[i:j]) and j - i < len(content)):
+                return None, 0.0  # class words qualified by others ("blood disorders", "disorders of the skin")
+            elif not SOC_MARKERS.isdisjoint(content[j:]):
+                return None, 0.0  # several organ classes
+            elif sum(value in c for c in self.classes) > 1:
+                return None, 0.0  # words shared by several classes ("disorders")
+            else:
+                filters.append({"target_column": self.class_column, "filter_operator": "contains",
+                                "filter_value": value})
+                classes_explained = j - i
+                content = content[j:]
+        phrases, words_explained = self._term_phrases(content)
+        if len(phrases) > 1:
+            return None, 0.0  # several terms: AND of "contains" on one column is rarely meant
+        for phrase in phrases:
+            filters.append({"target_column": self.term_column, "filter_operator": "contains",
+                            "filter_value": phrase})
+            if self._is_category(phrase):
+                words_explained -= len(phrase.split())  # e.g. "cardiac": leave it to the LLM
+
+        if not filters:
+            return None, 0.0
+        explained += classes_explained + words_explained
+        unexplained = len(content) - words_explained
+        return {"filters": filters}, explained / (explained + unexplained)
+
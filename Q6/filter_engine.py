@@ -0,0 +1,224 @@
+"""
+Compiled filter execution for the agent.
+Text columns are factorized once into integer codes plus their distinct values in
+upper case, so "equals" and "contains" are decided once per distinct value and
+applied to rows as a table lookup. A query's filters are checked up front, ordered
+by estimated matching rows, and evaluated on the rows that survived the previous
+filters, stopping as soon as none are left; the row table is indexed only once,
+at the end.
+When each subject's rows are contiguous, a text column can also keep, per distinct
+value, the sorted ordinals of the subjects having a row with it (CSR posting
+lists). AND-ed text filters of which at most one is on an event-level column (the
+others on columns constant within each subject, e.g. STUDYID) are answered by
+intersecting those as subject masks, without touching the rows; any other query
+needs rows, since its filters must hold on the same event.
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Rows sampled per numeric column to estimate range-filter selectivity
+NUMERIC_SAMPLE = 10_000
+
+
+class _SubjectPostings:
+    """Per distinct value of a column: sorted ordinals of the subjects having a row with it."""
+
+    def __init__(self, value_codes: np.ndarray, n_values: int, subject_codes: np.ndarray):
+        # Stable (radix for small codes) sort by value keeps each value's subjects in
+        # row order, which is ordinal order when subjects' rows are contiguous
+        small = value_codes.astype(np.int16 if n_values < 2 ** 15 else np.int32)
+        order = np.argsort(small, kind="stable")
+        values, subjects = small[order], subject_codes[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (values[1:] != values[:-1]) | (subjects[1:] != subjects[:-1])
+        self.subjects = subjects[keep].astype(np.int32)
+        self.offsets = np.searchsorted(values[keep], np.arange(n_values + 1))
+
+    def mask(self, hits: np.ndarray, n_subjects: int) -> np.ndarray:
+        """Subjects with a row holding any value marked in hits."""
+        out = np.zeros(n_subjects, dtype=bool)
+        values = np.flatnonzero(hits)
+        if len(values) <= 64:
+            for v in values:
+                out[self.subjects[self.offsets[v]:self.offsets[v + 1]]] = True
+        else:
+            out[self.subjects[np.repeat(hits, np.diff(self.offsets))]] = True
+        return out
+
+
+class _TextColumn:
+    """Row codes into the column's distinct values, as str(value).upper() (NaN -> "NAN")."""
+
+    def __init__(self, series: pd.Series):
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        self.codes = codes
+        self.upper = np.asarray([str(u).upper() for u in uniques], dtype=object)
+        self.counts = np.bincount(codes, minlength=len(self.upper))
+        self.subject_level: Optional[bool] = None
+        self.postings: Optional[_SubjectPostings] = None
+
+    def hits(self, operator: str, value: Any) -> np.ndarray:
+        """Per distinct value: does it pass the filter."""
+        needle = str(value).upper()
+        if operator == "equals":
+            return self.upper == needle
+        return np.fromiter((needle in u for u in self.upper), dtype=bool, count=len(self.upper))
+
+
+class _NumericColumn:
+
+    def __init__(self, series: pd.Series):
+        self.values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        step = max(1, len(self.values) // NUMERIC_SAMPLE)
+        sample = self.values[::step]
+        self.sample = np.sort(sample[~np.isnan(sample)])
+        self.sample_share = len(self.sample) / max(1, len(sample))
+
+    def mask(self, operator: str, value: float, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        values = self.values if rows is None else self.values[rows]
+        if operator == "greater_than":
+            return values > value
+        if operator == "less_than":
+            return values < value
+        return values == value
+
+    def estimate(self, operator: str, value: float, n_rows: int) -> float:
+        s = self.sample
+        if not len(s):
+            return 0.0
+        if operator == "greater_than":
+            share = (len(s) - np.searchsorted(s, value, side="right")) / len(s)
+        elif operator == "less_than":
+            share = np.searchsorted(s, value, side="left") / len(s)
+        else:
+            share = (np.searchsorted(s, value, side="right") - np.searchsorted(s, value, side="left")) / len(s)
+        return share * self.sample_share * n_rows
+
+
+class FilterEngine:
+    """Normalized columns of one frame, built on first use and reused by every query."""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self._columns: Dict[str, Any] = {}
+        self._subjects: Optional[Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]] = None
+        self._lock = threading.Lock()
+
+    def _column(self, name: str):
+        col = self._columns.get(name)
+        if col is None:
+            with self._lock:
+                col = self._columns.get(name)
+                if col is None:
+                    series = self.df[name]
+                    col = (_NumericColumn(series) if pd.api.types.is_numeric_dtype(series)
+                           else _TextColumn(series))
+                    self._columns[name] = col
+        return col
+
+    def _compile(self, filters: List[Dict[str, Any]]) -> List[Tuple[float, bool, Any, str, Any]]:
+        """
+        Validate every filter; returns (estimated rows, estimate is exact, column, operator,
+        argument) per filter, most selective first. Text estimates are exact row counts.
+        """
+        plan = []
+        for f in filters:
+            name, operator, value = f["target_column"], f["filter_operator"], f["filter_value"]
+            if name not in self.df.columns:
+                raise ValueError(f"Invalid column selected: {name}")
+            col = self._column(name)
+            if isinstance(col, _NumericColumn):
+                value = float(value)
+                if operator not in ("greater_than", "less_than", "equals"):
+                    raise ValueError(f"Invalid operator for numeric column: {operator}")
+                plan.append((col.estimate(operator, value, len(self.df)), False, col, operator, value))
+            else:
+                if operator not in ("equals", "contains"):
+                    raise ValueError(f"Invalid operator for text column: {operator}")
+                hits = col.hits(operator, value)
+                plan.append((float(col.counts[hits].sum()), True, col, operator, hits))
+        plan.sort(key=lambda p: p[0])
+        return plan
+
+    def _subject_table(self) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        (subject ordinal per row, USUBJID per ordinal, first row per ordinal plus the row
+        count at the end or None); ordinals follow first appearance, and the first-row
+        table exists only when each subject's rows are contiguous.
+        """
+        if self._subjects is None:
+            with self._lock:
+                if self._subjects is None:
+                    codes, uniques = pd.factorize(self.df["USUBJID"], use_na_sentinel=False)
+                    starts = None
+                    if not len(codes) or bool(np.all(codes[1:] >= codes[:-1])):
+                        starts = np.searchsorted(codes, np.arange(len(uniques) + 1))
+                    self._subjects = (codes, np.asarray(uniques, dtype=object), starts)
+        return self._subjects
+
+    def _is_subject_level(self, col: _TextColumn, starts: np.ndarray) -> bool:
+        """Does the column keep one value within each subject's (contiguous) rows."""
+        if col.subject_level is None:
+            changes = np.flatnonzero(col.codes[1:] != col.codes[:-1]) + 1
+            col.subject_level = bool(np.isin(changes, starts, assume_unique=True).all())
+        return col.subject_level
+
+    def _postings(self, col: _TextColumn) -> _SubjectPostings:
+        if col.postings is None:
+            codes, _, _ = self._subject_table()
+            with self._lock:
+                if col.postings is None:
+                    col.postings = _SubjectPostings(col.codes, len(col.upper), codes)
+        return col.postings
+
+    def match_subjects(self, filters: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """
+        Ordinals of the subjects with a row passing every filter, ascending (= order of
+        their first such row), from the subject posting lists; None when the query needs
+        rows: a numeric filter, two or more on event-level columns, or subjects' rows
+        not contiguous.
+        """
+        codes, uniques, starts = self._subject_table()
+        if starts is None:
+            return None
+        event_level = 0
+        for f in filters:
+            if f["target_column"] not in self.df.columns:
+                return None  # match_rows reports it
+            col = self._column(f["target_column"])
+            if isinstance(col, _NumericColumn):
+                return None
+            event_level += not self._is_subject_level(col, starts)
+        if event_level > 1:
+            return None
+        mask = None
+        for _, _, col, _, hits in self._compile(filters):
+            subjects = self._postings(col).mask(hits, len(uniques))
+            mask = subjects if mask is None else mask & subjects
+        return np.flatnonzero(mask)
+
+    def match_rows(self, filters: List[Dict[str, Any]]) -> np.ndarray:
+        """Ascending positions of rows passing every filter (AND)."""
+        rows: Optional[np.ndarray] = None
+        for estimate, exact, col, operator, arg in self._compile(filters):
+            if (exact and estimate == 0) or (rows is not None and not len(rows)):
+                return np.empty(0, dtype=np.int64)
+            if isinstance(col, _NumericColumn):
+                keep = col.mask(operator, arg, rows)
+            else:
+                keep = arg[col.codes if rows is None else col.codes[rows]]
+            rows = np.flatnonzero(keep) if rows is None else rows[keep]
+        return np.arange(len(self.df)) if rows is None else rows
+
+    def subjects(self, rows: np.ndarray) -> List[Any]:
+        """Distinct USUBJIDs of rows, in order of first appearance."""
+        codes, uniques, _ = self._subject_table()
+        return uniques[pd.unique(codes[rows])].tolist()
+
+    def subject_ids(self, ordinals: np.ndarray) -> List[Any]:
+        """USUBJIDs of subject ordinals from match_subjects."""
+        return self._subject_table()[1][ordinals].tolist()
@@ -0,0 +1,184 @@
+"""
+Out-of-core filtering for the agent, for ADAE files larger than memory.
+The source file (CSV, or Parquet read one row group at a time) is read in chunks
+sized so a chunk and the arrays derived from it fit a memory budget. A first pass
+profiles the file: its columns, which of them are numeric (every value parses as a
+number, as read_csv would type the whole column), and each column's value counts
+for the value index and the rule parser. A query then reads only USUBJID and its
+filter columns, evaluates the filters on each chunk with FilterEngine (the same
+equals/contains/greater_than/less_than semantics as in memory) and keeps the
+distinct matching subjects. State kept between chunks grows with distinct
+subjects and values, never with rows, and is charged against the same budget.
+Q5's ae_scan.py reads its files the same way with its own copy of the reader.
+"""
+
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from filter_engine import FilterEngine
+
+# Chunks keep at least this many rows, however large the profile's value counts grow
+MIN_CHUNK_ROWS = 10_000
+
+# Peak bytes while FilterEngine runs on a chunk, per byte of the parsed chunk: its
+# factorized and upper-cased columns and the filter masks
+CHUNK_OVERHEAD = 4
+
+# Rows of the needed columns read first to estimate what a row costs
+SAMPLE_ROWS = 1_000
+
+# Bytes of cross-chunk state per distinct subject or column value (string and dict slot)
+ENTRY_BYTES = 160
+
+
+def is_parquet(path: str) -> bool:
+    return path.lower().endswith((".parquet", ".pq"))
+
+
+def source_columns(path: str) -> List[str]:
+    """Column names of the file, as written."""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return list(pq.ParquetFile(path).schema_arrow.names)
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Non-null values as str, as read_csv(dtype=str) reads them."""
+    for col in df.columns:
+        if df[col].dtype != object:
+            text = df[col].astype(object).where(df[col].notna(), np.nan).map(str, na_action="ignore")
+            df[col] = text.astype(object)
+    return df
+
+
+def iter_chunks(
+    path: str,
+    columns: Sequence[str],
+    budget_bytes: int,
+    reserved: Callable[[], int] = lambda: 0,
+) -> Iterator[pd.DataFrame]:
+    """
+    Frames of the given (upper-case) columns of path, values as text. Each chunk is
+    sized when it is read: budget_bytes less reserved() (the caller's accumulated
+    state), over the estimated cost of a row.
+    """
+    names = {c.upper(): c for c in source_columns(path)}
+    usecols = [names[c] for c in columns]
+    rename = {names[c]: c for c in columns}
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(path)
+        batch = next(pf.iter_batches(batch_size=SAMPLE_ROWS, columns=usecols), None)
+        sample = _as_text(batch.to_pandas()) if batch is not None else pd.DataFrame(columns=usecols)
+    else:
+        sample = pd.read_csv(path, usecols=usecols, nrows=SAMPLE_ROWS, dtype=str)
+    row_bytes = CHUNK_OVERHEAD * max(1.0, sample.memory_usage(deep=True, index=False).sum() / max(1, len(sample)))
+
+    def chunk_rows() -> int:
+        return max(MIN_CHUNK_ROWS, int((budget_bytes - reserved()) / row_bytes))
+
+    if is_parquet(path):
+        for group in range(pf.num_row_groups):
+            for batch in pf.iter_batches(batch_size=chunk_rows(), row_groups=[group], columns=usecols):
+                yield _as_text(batch.to_pandas()).rename(columns=rename)
+        return
+    with pd.read_csv(path, usecols=usecols, dtype=str, iterator=True) as reader:
+        while True:
+            try:
+                chunk = reader.get_chunk(chunk_rows())
+            except StopIteration:
+                return
+            yield chunk.rename(columns=rename)
+
+
+class SourceProfile:
+    """
+    What the agent needs to know of a file it does not hold: its (upper-case) columns,
+    the numeric ones, row count, and per column the row count of each stripped text
+    value (what ColumnVocabulary.from_series counts).
+    """
+
+    def __init__(self, path: str, budget_bytes: int):
+        self.path = path
+        self.budget_bytes = budget_bytes
+        self.columns = [c.upper() for c in source_columns(path)]
+        if "USUBJID" not in self.columns:
+            raise ValueError("Missing required column: USUBJID")
+        self.numeric: Set[str] = set(self.columns)
+        self.counts: Dict[str, Counter] = {c: Counter() for c in self.columns}
+        self.n_rows = 0
+        for chunk in iter_chunks(path, self.columns, budget_bytes, lambda: self.nbytes):
+            self.n_rows += len(chunk)
+            for col in self.columns:
+                values = chunk[col].dropna()
+                if col in self.numeric and pd.to_numeric(values, errors="coerce").isna().any():
+                    self.numeric.discard(col)
+                values = values.astype(str).str.strip()
+                self.counts[col].update(values[values != ""].value_counts().to_dict())
+        for col in self.numeric:
+            del self.counts[col]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(c) for c in self.counts.values()) * ENTRY_BYTES
+
+    def is_numeric(self, column: str) -> bool:
+        return column in self.numeric
+
+
+def scan_filters(profile: SourceProfile, filters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Distinct USUBJIDs of the rows passing every filter (AND), in order of their first
+    such row, plus the matching row count; one pass reading only the filter columns.
+    """
+    columns = ["USUBJID"]
+    for f in filters:
+        name, operator = f["target_column"], f["filter_operator"]
+        if name not in profile.columns:
+            raise ValueError(f"Invalid column selected: {name}")
+        if profile.is_numeric(name):
+            float(f["filter_value"])
+            if operator not in ("greater_than", "less_than", "equals"):
+                raise ValueError(f"Invalid operator for numeric column: {operator}")
+        elif operator not in ("equals", "contains"):
+            raise ValueError(f"Invalid operator for text column: {operator}")
+        if name not in columns:
+            columns.append(name)
+
+    subjects: Dict[Any, None] = {}
+    records = 0
+    reserved = lambda: profile.nbytes + len(subjects) * ENTRY_BYTES  # noqa: E731
+    for chunk in iter_chunks(profile.path, columns, profile.budget_bytes, reserved):
+        for col in columns[1:]:
+            if profile.is_numeric(col):
+                chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+        rows = FilterEngine(chunk).match_rows(filters)
+        records += len(rows)
+        for s in pd.unique(chunk["USUBJID"].to_numpy()[rows]):
+            subjects.setdefault(s)
+    return {"subjects": list(subjects), "matching_row_count": records}
+
+
+def scan_rows(profile: SourceProfile, filters: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    All columns of the rows passing every filter, as read_csv would type them and
+    indexed by row position; holds every matching row, so only for results that fit
+    in memory.
+    """
+    parts, offset = [], 0
+    for chunk in iter_chunks(profile.path, profile.columns, profile.budget_bytes, lambda: profile.nbytes):
+        for col in profile.numeric:
+            chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+        rows = FilterEngine(chunk).match_rows(filters)
+        if len(rows):
+            part = chunk.iloc[rows]
+            part.index = offset + rows
+            parts.append(part)
+        offset += len(chunk)
+    if not parts:
+        return pd.DataFrame(columns=profile.columns)
+    return pd.concat(parts)
@@ -0,0 +1,126 @@
+"""
+Record/replay stand-in for the agent's LLM, for offline benchmarks and regression runs.
+A fixture file maps each rendered prompt (every message's role and text, hashed with
+the model name) to the reply text the model gave and how long it took. In record
+mode the real client answers and every reply is written to the fixture; in replay
+mode the fixture answers, with no network access, optionally sleeping a fixed time
+or the recorded time per call. The stand-in replaces the chat model inside
+llm_chain and llm_alternative_chain, so prompt rendering and JSON output parsing
+still run as they do live.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import RunnableLambda
+
+FIXTURE_VERSION = 1
+
+
+class ReplayMiss(LookupError):
+    """The fixture has no reply for this prompt."""
+
+
+def _messages(prompt_value: Any) -> List[BaseMessage]:
+    if hasattr(prompt_value, "to_messages"):
+        return prompt_value.to_messages()
+    if isinstance(prompt_value, str):
+        from langchain_core.messages import HumanMessage
+        return [HumanMessage(content=prompt_value)]
+    return list(prompt_value)
+
+
+class LLMFixture:
+    """Recorded replies in one JSON file, keyed by rendered prompt and model."""
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self._lock = threading.Lock()
+        self.responses: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                data = json.load(fh)
+            self.responses = data.get("responses", {})
+
+    def key(self, messages: List[BaseMessage]) -> str:
+        text = json.dumps([self.model] + [[m.type, m.content] for m in messages])
+        return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+    def get(self, messages: List[BaseMessage]) -> Dict[str, Any]:
+        entry = self.responses.get(self.key(messages))
+        if entry is None:
+            raise ReplayMiss(
+                f"No recorded LLM reply for {messages[-1].content[:80]!r} in {self.path} "
+                f"(record it with ADAE_LLM_BACKEND=record)"
+            )
+        return entry
+
+    def put(self, messages: List[BaseMessage], content: str, seconds: float, source: str = "recorded") -> None:
+        entry = {
+            "input": messages[-1].content,
+            "content": content,
+            "seconds": round(seconds, 4),
+            "source": source,
+        }
+        with self._lock:
+            self.responses[self.key(messages)] = entry
+            self._save()
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"version": FIXTURE_VERSION, "model": self.model, "responses": self.responses},
+                      fh, indent=1, sort_keys=True)
+            fh.write("\n")
+        os.replace(tmp, self.path)
+
+
+def recording_llm(llm: Any, fixture: LLMFixture) -> RunnableLambda:
+    """llm, with every reply also written to fixture."""
+
+    def invoke(prompt_value: Any) -> BaseMessage:
+        start = time.perf_counter()
+        reply = llm.invoke(prompt_value)
+        fixture.put(_messages(prompt_value), reply.content, time.perf_counter() - start)
+        return reply
+
+    async def ainvoke(prompt_value: Any) -> BaseMessage:
+        start = time.perf_counter()
+        reply = await llm.ainvoke(prompt_value)
+        fixture.put(_messages(prompt_value), reply.content, time.perf_counter() - start)
+        return reply
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="RecordingLLM")
+
+
+def replay_llm(fixture: LLMFixture, latency: Optional[Union[float, str]] = None) -> RunnableLambda:
+    """
+    Replies from fixture; raises ReplayMiss for prompts it has none for. latency:
+    None/0 answers at once, a number sleeps that many seconds per call, "recorded"
+    sleeps as long as the recorded call took.
+    """
+
+    def delay(entry: Dict[str, Any]) -> float:
+        if latency == "recorded":
+            return float(entry.get("seconds") or 0.0)
+        return float(latency or 0.0)
+
+    def invoke(prompt_value: Any) -> BaseMessage:
+        entry = fixture.get(_messages(prompt_value))
+        time.sleep(delay(entry))
+        return AIMessage(content=entry["content"])
+
+    async def ainvoke(prompt_value: Any) -> BaseMessage:
+        entry = fixture.get(_messages(prompt_value))
+        await asyncio.sleep(delay(entry))
+        return AIMessage(content=entry["content"])
+
+    return RunnableLambda(invoke, afunc=ainvoke, name="ReplayLLM")
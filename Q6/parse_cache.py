@@ -0,0 +1,158 @@
+"""
+Two-tier cache of parsed questions (question -> {"filters": [...]}) for the agent.
+An in-memory LRU sits in front of a SQLite file (data/.cache/parse_cache.sqlite by
+default), so repeated questions skip the LLM and the cache survives restarts.
+Keys combine the normalized question with a namespace that changes whenever the
+prompt, model or column list does; disk entries expire after ttl_seconds and the
+least recently used are dropped beyond max_disk_entries.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS parse_cache (
+    key TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    parsed TEXT NOT NULL,
+    llm_seconds REAL NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def normalize_question(question: str) -> str:
+    """Case, surrounding whitespace/punctuation and repeated spaces do not change the parse."""
+    q = re.sub(r"\s+", " ", question.strip().lower())
+    return q.strip(" ?!.")
+
+
+def cache_namespace(*parts: Any) -> str:
+    """Short digest of everything that shapes the LLM's answer (prompt text, model, columns)."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class ParseCache:
+
+    def __init__(
+        self,
+        path: Optional[str],
+        namespace: str,
+        max_memory_entries: int = 256,
+        max_disk_entries: int = 10000,
+        ttl_seconds: float = 7 * 24 * 3600,
+    ):
+        self.path = path
+        self.namespace = namespace
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[Dict[str, Any], float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+                self._db.execute(_SCHEMA)
+            except sqlite3.Error:
+                self._db = None  # unwritable location: memory tier only
+
+    def _key(self, question: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\n{normalize_question(question)}".encode()).hexdigest()
+
+    def _remember(self, key: str, parsed: Dict[str, Any], llm_seconds: float, created: float) -> None:
+        self._memory[key] = (parsed, llm_seconds, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, question: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """(parsed, "memory" | "disk") for a cached, unexpired question, else None."""
+        key = self._key(question)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[2] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry[1]
+                return json.loads(json.dumps(entry[0])), "memory"
+            if entry is not None:
+                del self._memory[key]
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        "SELECT parsed, llm_seconds, created FROM parse_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and now - row[2] > self.ttl_seconds:
+                        self._db.execute("DELETE FROM parse_cache WHERE key = ?", (key,))
+                        row = None
+                    if row is not None:
+                        self._db.execute("UPDATE parse_cache SET last_used = ? WHERE key = ?", (now, key))
+                        parsed = json.loads(row[0])
+                        self._remember(key, parsed, row[1], row[2])
+                        self.disk_hits += 1
+                        self.saved_seconds += row[1]
+                        return json.loads(row[0]), "disk"
+                except sqlite3.Error:
+                    pass
+            self.misses += 1
+            return None
+
+    def put(self, question: str, parsed: Dict[str, Any], llm_seconds: float) -> None:
+        """Store parsed (the LLM's answer, which took llm_seconds) for question."""
+        key = self._key(question)
+        now = time.time()
+        with self._lock:
+            self._remember(key, json.loads(json.dumps(parsed)), llm_seconds, now)
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, normalize_question(question), json.dumps(parsed), llm_seconds, now, now),
+                )
+                self._db.execute("DELETE FROM parse_cache WHERE created < ?", (now - self.ttl_seconds,))
+                self._db.execute(
+                    "DELETE FROM parse_cache WHERE key IN ("
+                    "SELECT key FROM parse_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,),
+                )
+            except sqlite3.Error:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM parse_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM parse_cache").fetchone()[0]
+            return {
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "saved_llm_seconds": round(self.saved_seconds, 3),
+            }
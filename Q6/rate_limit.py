@@ -0,0 +1,68 @@
+"""
+Client-side limits for concurrent LLM calls from the agent's async batch API.
+TokenBucket spaces requests to a steady rate with a bounded burst, so a batch of
+hundreds of questions stays under the provider's requests-per-minute limit instead
+of tripping it; call_with_retry retries transient failures (rate limiting,
+timeouts, dropped connections) with exponential backoff and jitter.
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type
+
+
+class TokenBucket:
+    """`rate` requests per second on average, up to `burst` at once. rate <= 0 disables it."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait for a token; callers are served in arrival order."""
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def call_with_retry(
+    fn: Callable[..., Awaitable[Any]],
+    *args: Any,
+    bucket: Optional[TokenBucket] = None,
+    retries: int = 4,
+    base_delay: float = 0.5,
+    max_delay: float = 20.0,
+    give_up: Tuple[Type[BaseException], ...] = (ValueError,),
+) -> Any:
+    """
+    await fn(*args), taking a token from bucket before each attempt. Exceptions in
+    give_up (a reply that could not be parsed will not parse on a second try) are
+    raised at once; others are retried up to `retries` times, the n-th after
+    base_delay * 2**n seconds (capped at max_delay) scaled by a random 0.5-1.
+    """
+    attempt = 0
+    while True:
+        if bucket is not None:
+            await bucket.acquire()
+        try:
+            return await fn(*args)
+        except give_up:
+            raise
+        except Exception:
+            if attempt >= retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            attempt += 1
@@ -0,0 +1,48 @@
+"""
+Single-flight coalescing of identical concurrent requests for the agent's HTTP API.
+The first request for a key starts the work as its own task; requests for the same
+key that arrive while it runs wait on that task instead of starting another, and
+every waiter gets the same result (or exception). The work is shielded, so a
+waiter that disconnects does not cancel it for the others. Keys are forgotten as
+soon as the work finishes: this deduplicates requests in flight, it does not cache.
+One instance serves one event loop (one uvicorn worker process).
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.executions = 0
+        self.deduplicated = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """(result of fn(), whether it came from a call already in flight for key)."""
+        self.calls += 1
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self.deduplicated += 1
+        else:
+            self.executions += 1
+            task = self._tasks[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here too, in case every waiter has gone
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._tasks),
+        }
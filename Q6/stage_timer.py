@@ -0,0 +1,43 @@
+"""
+Per-stage latency of one agent request, reported in each response under "timings".
+Stages nest: while an inner stage runs (e.g. JSON parsing of an LLM reply inside
+the fallback search) its time counts for the inner stage only, so the stages add
+up to the request's total apart from untimed glue.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+# Reported for every request, 0 when the stage did not run
+STAGES = ("llm_parse", "json_parse", "filter_apply", "fallback_search", "result_assembly")
+
+
+class StageTimer:
+    """Milliseconds per stage since creation; the stages of one request run one at a time."""
+
+    def __init__(self):
+        self.ms: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+        self._created = time.perf_counter()
+        self._stack: List[List] = []  # [stage, started] of the open stages, innermost last
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        now = time.perf_counter()
+        if self._stack:
+            outer = self._stack[-1]
+            self.ms[outer[0]] += (now - outer[1]) * 1000
+        self._stack.append([name, now])
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            _, started = self._stack.pop()
+            self.ms[name] = self.ms.get(name, 0.0) + (now - started) * 1000
+            if self._stack:
+                self._stack[-1][1] = now
+
+    def as_dict(self) -> Dict[str, float]:
+        timings = {name: round(ms, 3) for name, ms in self.ms.items()}
+        timings["total"] = round((time.perf_counter() - self._created) * 1000, 3)
+        return timings
@@ -1,13 +1,29 @@
 """
 Simple test script: runs 3 example queries against the Clinical Trial Data Agent.
 Run from the Q6 folder:  python test_agent_queries.py
+
+Batch mode answers many questions concurrently through the async API and reports
+throughput:
+  python test_agent_queries.py --batch [FILE] [--concurrency N]
+FILE holds one question per line, or is a JSON list of questions or of
+{"question": ...} items (e.g. benchmarks/labeled_questions.json); default: the examples.
 """
 
+import asyncio
+import json
 import sys
+import time
 
 # Ensure we can import the agent (run from Q6 directory)
 try:
-    from ADAE_ClinicalTrialDataAgent import clinical_trial_data_agent
+    from ADAE_ClinicalTrialDataAgent import (
+        BATCH_CONCURRENCY,
+        MissingAPIKeyError,
+        clinical_trial_data_agent,
+        clinical_trial_data_agent_many,
+        get_llm,
+        get_parse_cache,
+    )
 except ImportError as e:
     print("Error: Run this script from the Q6 folder.", file=sys.stderr)
     print("  cd Q6 && python test_agent_queries.py", file=sys.stderr)
@@ -21,36 +37,104 @@ EXAMPLE_QUERIES = [
 ]
 
 
+def _print_response(response):
+    parsed = response.get("parsed_filter", {})
+    filters = parsed.get("filters", [])
+    result = response.get("result", {})
+    count = result.get("count_unique_subjects", 0)
+    subjects = result.get("subjects", [])
+
+    print(f"  Parsed filters: {len(filters)} criterion/criteria (from {response.get('parse_source')})")
+    for j, f in enumerate(filters, 1):
+        print(f"    {j}. {f.get('target_column')} {f.get('filter_operator')} {f.get('filter_value')!r}")
+    if response.get("alternative_value_used"):
+        print(f"  (Used alternative value from data: {response['alternative_value_used']!r})")
+    print(f"  Unique subjects: {count}")
+    if subjects:
+        display = subjects if len(subjects) <= 15 else subjects[:15] + [f"... and {len(subjects) - 15} more"]
+        print(f"  Subjects: {display}")
+    timings = response.get("timings")
+    if timings:
+        print("  Timings (ms): " + ", ".join(f"{stage} {ms:.1f}" for stage, ms in timings.items()))
+
+
+def _require_api_key():
+    try:
+        get_llm()
+    except MissingAPIKeyError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+
+def _print_cache_stats():
+    stats = get_parse_cache().stats()
+    print(f"Parse cache: hit rate {stats['hit_rate']:.0%} "
+          f"({stats['memory_hits']} memory, {stats['disk_hits']} disk, {stats['misses']} LLM calls), "
+          f"~{stats['saved_llm_seconds']:.2f}s of LLM time saved")
+
+
 def main():
+    _require_api_key()
     print("Running 3 example queries with ClinicalTrialDataAgent\n")
     print("=" * 70)
 
     for i, question in enumerate(EXAMPLE_QUERIES, 1):
         print(f"\n--- Query {i}: {question} ---")
         try:
-            response = clinical_trial_data_agent(question)
-            parsed = response.get("parsed_filter", {})
-            filters = parsed.get("filters", [])
-            result = response.get("result", {})
-            count = result.get("count_unique_subjects", 0)
-            subjects = result.get("subjects", [])
-
-            print(f"  Parsed filters: {len(filters)} criterion/criteria")
-            for j, f in enumerate(filters, 1):
-                print(f"    {j}. {f.get('target_column')} {f.get('filter_operator')} {f.get('filter_value')!r}")
-            if response.get("alternative_value_used"):
-                print(f"  (Used alternative value from data: {response['alternative_value_used']!r})")
-            print(f"  Unique subjects: {count}")
-            if subjects:
-                display = subjects if len(subjects) <= 15 else subjects[:15] + [f"... and {len(subjects) - 15} more"]
-                print(f"  Subjects: {display}")
+            _print_response(clinical_trial_data_agent(question))
         except Exception as e:
             print(f"  Error: {e}")
         print()
 
     print("=" * 70)
+    _print_cache_stats()
     print("Done.")
 
 
+def _load_questions(path):
+    with open(path) as fh:
+        text = fh.read()
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return [line.strip() for line in text.splitlines() if line.strip()]
+    return [item["question"] if isinstance(item, dict) else str(item) for item in items]
+
+
+async def run_batch(questions, concurrency):
+    print(f"Running {len(questions)} queries, up to {concurrency} at a time\n")
+    print("=" * 70)
+    errors = 0
+    start = time.perf_counter()
+    async for i, response in clinical_trial_data_agent_many(questions, concurrency=concurrency):
+        print(f"\n--- Query {i + 1} ({time.perf_counter() - start:.2f}s): {questions[i]} ---")
+        if "error" in response:
+            errors += 1
+            print(f"  Error: {response['error']}")
+        else:
+            _print_response(response)
+    elapsed = time.perf_counter() - start
+
+    print("\n" + "=" * 70)
+    print(f"{len(questions)} queries in {elapsed:.2f}s: {len(questions) / elapsed:.1f} queries/s, "
+          f"{errors} error(s)")
+    _print_cache_stats()
+    print("Done.")
+
+
+def main_batch(argv):
+    concurrency = BATCH_CONCURRENCY
+    if "--concurrency" in argv:
+        k = argv.index("--concurrency")
+        concurrency = int(argv[k + 1])
+        del argv[k:k + 2]
+    questions = _load_questions(argv[0]) if argv else EXAMPLE_QUERIES
+    _require_api_key()
+    asyncio.run(run_batch(questions, concurrency))
+
+
 if __name__ == "__main__":
-    main()
+    if "--batch" in sys.argv[1:]:
+        main_batch([a for a in sys.argv[1:] if a != "--batch"])
+    else:
+        main()
@@ -0,0 +1,196 @@
+"""
+Per-column vocabularies and a local fuzzy index over them, for the agent's
+zero-result fallback.
+Each text column's distinct values and row counts are collected once at load. On a
+column's first lookup, every value and every run of consecutive words inside it
+("segment") is indexed by character trigrams after spelling normalization (upper
+case, UK -> US spellings such as DIARRHOEA -> DIARRHEA). A suggestion is then a
+trigram lookup re-ranked by edit distance, not a column scan or an LLM call.
+"""
+
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import pandas as pd
+
+# UK -> US spelling rewrites, applied to data values and questions alike
+_SPELLING = [
+    (r"OE", "E"),                 # DIARRHOEA, OEDEMA, OESOPHAGITIS
+    (r"AE", "E"),                 # HAEMORRHAGE, ANAEMIA, ISCHAEMIC
+    (r"IS(ATION|ED|ING|ES)\b", r"IZ\1"),  # LOCALISED, GENERALISATION
+    (r"ISE\b", "IZE"),
+    (r"OUR", "OR"),               # DISCOLOURATION, ODOUR, TUMOUR
+    (r"TRE\b", "TER"),            # CENTRE
+]
+
+# Scores below this are not offered as suggestions
+MIN_SIMILARITY = 0.5
+
+# Trigram candidates re-ranked by edit distance per lookup
+RERANK_CANDIDATES = 30
+
+
+def normalize_value(value: str) -> str:
+    """Upper-case, single-spaced, US-spelled form used for matching."""
+    text = re.sub(r"\s+", " ", str(value).strip().upper())
+    for pattern, repl in _SPELLING:
+        text = re.sub(pattern, repl, text)
+    return text
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_similarity(a: str, b: str) -> float:
+    """1 - Levenshtein distance / longer length."""
+    if a == b:
+        return 1.0
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        prev = cur
+    return 1.0 - prev[-1] / max(len(a), len(b))
+
+
+class ColumnVocabulary:
+    """Distinct values of one column with row counts, plus the trigram index over their segments."""
+
+    def __init__(self, column: str, counts: Dict[str, int]):
+        self.column = column
+        self.counts = counts                       # value -> rows holding exactly that value
+        self.values = list(counts)
+        self._indexed = False
+        self._lock = threading.Lock()
+
+    def _build_index(self) -> None:
+        counts = self.counts
+        # segment (normalized) -> data spelling of the segment and the values containing it
+        self._segment_text: Dict[str, str] = {}
+        self._segment_values: Dict[str, Set[str]] = defaultdict(set)
+        self._whole: Dict[str, List[str]] = defaultdict(list)  # normalized value -> values
+        for value in self.values:
+            self._whole[normalize_value(value)].append(value)
+            words = value.upper().split()
+            for i in range(len(words)):
+                for j in range(i + 1, len(words) + 1):
+                    text = " ".join(words[i:j])
+                    seg = normalize_value(text)
+                    self._segment_text.setdefault(seg, text)
+                    self._segment_values[seg].add(value)
+        self._grams: Dict[str, Set[str]] = defaultdict(set)
+        for seg in self._segment_values:
+            for gram in _trigrams(seg):
+                self._grams[gram].add(seg)
+        self._segment_rows = {
+            seg: sum(counts[v] for v in values) for seg, values in self._segment_values.items()
+        }
+        self._indexed = True
+
+    @classmethod
+    def from_series(cls, column: str, series: pd.Series) -> "ColumnVocabulary":
+        values = series.dropna().astype(str).str.strip()
+        counts = values[values != ""].value_counts()
+        return cls(column, {str(k): int(v) for k, v in counts.items()})
+
+    def _similar_segments(self, query: str) -> List[Tuple[str, float]]:
+        """
+        Segments most similar to the normalized query, best first: candidates by shared
+        trigrams (Dice), scored by edit similarity, ties broken by row count.
+        """
+        if not self._indexed:
+            with self._lock:
+                if not self._indexed:
+                    self._build_index()
+        grams = _trigrams(query)
+        shared: Counter = Counter()
+        for gram in grams:
+            for seg in self._grams.get(gram, ()):
+                shared[seg] += 1
+        dice = sorted(
+            ((seg, 2 * n / (len(grams) + len(_trigrams(seg)))) for seg, n in shared.items()),
+            key=lambda s: -s[1],
+        )[:RERANK_CANDIDATES]
+        scored = [(seg, max(_edit_similarity(query, seg), d)) for seg, d in dice]
+        scored.sort(key=lambda s: (-s[1], -self._segment_rows[s[0]]))
+        return scored
+
+    def suggest(self, value: str, operator: str = "contains", limit: int = 5) -> List[Tuple[str, float, int]]:
+        """
+        Closest values for `value` as (filter value, similarity 0-1, matching rows), best first.
+        For "contains" a suggestion may be a segment (e.g. PRURITUS for "pruritis"), matching
+        every value that includes it; for "equals" it is always a whole value.
+        """
+        query = normalize_value(value)
+        best: Dict[str, Tuple[float, int]] = {}
+        for seg, score in self._similar_segments(query):
+            if score < MIN_SIMILARITY:
+                break
+            if operator == "contains":
+                candidates = [(self._segment_text[seg], self._segment_rows[seg])]
+            else:
+                candidates = [(v, self.counts[v]) for v in self._whole.get(seg, ())]
+            for text, rows in candidates:
+                if text not in best or best[text][0] < score:
+                    best[text] = (score, rows)
+        ranked = sorted(best.items(), key=lambda kv: (-kv[1][0], -kv[1][1], kv[0]))
+        return [(text, score, rows) for text, (score, rows) in ranked[:limit]]
+
+    def count(self, value: str, operator: str = "contains") -> int:
+        """Rows a text filter on this column alone would match (agent semantics: case-insensitive)."""
+        needle = str(value).strip().upper()
+        if operator == "equals":
+            return sum(n for v, n in self.counts.items() if v.upper() == needle)
+        return sum(n for v, n in self.counts.items() if needle in v.upper())
+
+    def ranked_values(self, value: str, limit: int) -> List[str]:
+        """Up to limit distinct values, those most similar to `value` first (for prompts)."""
+        query = normalize_value(value)
+        ordered: Dict[str, None] = {}
+        for seg, _ in self._similar_segments(query):
+            for v in sorted(self._segment_values[seg], key=lambda v: -self.counts[v]):
+                ordered.setdefault(v)
+            if len(ordered) >= limit:
+                break
+        for v in self.values:
+            if len(ordered) >= limit:
+                break
+            ordered.setdefault(v)
+        return list(ordered)[:limit]
+
+
+class ValueIndex:
+    """ColumnVocabulary for every text column of a frame, built once per loaded dataset."""
+
+    def __init__(self, df: pd.DataFrame, columns: Optional[Iterable[str]] = None):
+        columns = df.columns if columns is None else [c for c in columns if c in df.columns]
+        self.columns: Dict[str, ColumnVocabulary] = {
+            col: ColumnVocabulary.from_series(col, df[col])
+            for col in columns
+            if not pd.api.types.is_numeric_dtype(df[col])
+        }
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, Dict[str, int]], columns: Optional[Iterable[str]] = None) -> "ValueIndex":
+        """Index over per-column value counts gathered elsewhere (e.g. chunk by chunk, see filter_scan.py)."""
+        index = cls.__new__(cls)
+        columns = counts if columns is None else [c for c in columns if c in counts]
+        index.columns = {col: ColumnVocabulary(col, dict(counts[col])) for col in columns}
+        return index
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.columns
+
+    def count(self, column: str, value: str, operator: str = "contains") -> Optional[int]:
+        vocab = self.columns.get(column)
+        return vocab.count(value, operator) if vocab is not None else None
+
+    def suggest(self, column: str, value: str, operator: str = "contains",
+                limit: int = 5) -> List[Tuple[str, float, int]]:
+        vocab = self.columns.get(column)
+        return vocab.suggest(value, operator, limit) if vocab is not None else []